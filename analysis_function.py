@@ -1,32 +1,339 @@
-from typing import Any, Dict, List
+from functools import partial
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from dataclasses import dataclass, replace
+from datetime import datetime
+import copy
+import json
 import logging
+import os
+import re
+import sqlite3
+import time
+import openai
 import streamlit as st
 
+import cache_deteccao
+import coalescencia
+import custos
+import duplicatas
+import nota_especulativa
+import ortografia_local
+import orcamento_tokens
+import persistencia
+import prompts
+import rastreamento
+import regras_crase
+import roteamento_modelos
+import tarefas_correcao
+from indice_texto import IndiceTexto
+from armazem_resultados import chave_redacao, obter_armazem
+
 
 # Configuração básica do logger
-logging.basicConfig(level=logging.DEBUG)
+logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Agora você pode usar o logger no seu código
-logger.debug("Mensagem de debug")
-logger.info("Mensagem de informação")
-logger.warning("Mensagem de aviso")
-
+# Modelos fine-tuned usados em cada competência
+MODELO_COMP1 = "ft:gpt-4o-2024-08-06:personal:competencia-1:AHDQQucG"
+MODELO_REVISAO_COMP1 = "ft:gpt-4o-2024-08-06:personal:competencia-1:AHDQQucG"
+MODELO_REVISAO_COMP2 = "ft:gpt-4o-2024-08-06:personal:competencia-2:AHDT84HO"
+MODELO_REVISAO_COMP3 = "ft:gpt-4o-2024-08-06:personal:competencia-3:AHDUfZRb"
+MODELO_REVISAO_COMP4 = "ft:gpt-4o-2024-08-06:personal:competencia-4:AHDXewU3"
+MODELO_REVISAO_COMP5 = "ft:gpt-4o-2024-08-06:personal:competencia-5:AHGVPnJG"
+
+# Consultas usadas para recuperar documentos da base RAG em cada competência
+CONSULTAS_RAG = {
+    "competency1_nota": "Critérios de Avaliação Competência 1 ENEM",
+    "competency2": "Compreensão do Tema ENEM",
+    "competency3": "Seleção e Organização das Informações ENEM",
+    "competency4": "Conhecimento dos Mecanismos Linguísticos ENEM",
+    "competency5": "Proposta de Intervenção ENEM",
+}
+
+MODELOS_REVISAO = {
+    "competency1": MODELO_REVISAO_COMP1,
+    "competency2": MODELO_REVISAO_COMP2,
+    "competency3": MODELO_REVISAO_COMP3,
+    "competency4": MODELO_REVISAO_COMP4,
+    "competency5": MODELO_REVISAO_COMP5,
+}
+
+# Critérios da detecção da Competência 1, um template de prompt por critério (prompts.py)
+CRITERIOS_DETECCAO_COMP1 = ("ortografia", "pontuacao", "concordancia", "regencia")
+
+# Correções em andamento por redação e tema, compartilhadas por submissões simultâneas
+_correcoes_em_andamento = coalescencia.Coalescedor("correcao")
+
+NOMES_COMPETENCIAS = {
+    "competency2": "Compreensão do Tema",
+    "competency3": "Seleção e Organização das Informações",
+    "competency4": "Conhecimento dos Mecanismos Linguísticos",
+    "competency5": "Proposta de Intervenção",
+}
+
+# Número máximo de tentativas para erros transitórios (rede, 429, 5xx)
+MAX_TENTATIVAS_MODELO = 3
+
+# Posição do trecho anotada no erro (indice_texto); fica fora do JSON enviado nos prompts
+CAMPOS_POSICAO = ('inicio', 'fim', 'sentenca', 'paragrafo')
+
+# Contexto da redação enviado em cada prompt de revisão (ver IndiceTexto.contexto).
+# Erros da Competência 1 são locais à frase; nas demais a tese ajuda a julgar o parágrafo.
+POLITICAS_CONTEXTO_REVISAO = {
+    "competency1": "paragrafo",
+    "competency2": "paragrafo_tese",
+    "competency3": "paragrafo_tese",
+    "competency4": "paragrafo",
+    "competency5": "paragrafo_tese",
+}
+
+# Detecção da Competência 1 por sentença, com cache persistente (ver cache_deteccao)
+DETECCAO_COMP1_POR_SENTENCA = os.getenv("DETECCAO_COMP1_POR_SENTENCA", "0") == "1"
+
+# Uma geração por competência com erros, análise e nota juntos (ver analisar_competency1_fundido
+# e chamar_rag_analise); as revisões de erro continuam separadas
+CHAMADA_FUNDIDA = os.getenv("CHAMADA_FUNDIDA", "0") == "1"
+
+# Referência à análise nos prompts de nota quando eles são anexados ao prompt de análise
+REFERENCIA_ANALISE_FUNDIDA = "[a análise que você escreveu acima, nesta mesma resposta]"
+
+
+def chamar_modelo(modelo: str, prompt: str, temperature: float, etapa: str) -> str:
+    """
+    Envia um prompt ao modelo e retorna o conteúdo da resposta.
+    
+    Todas as chamadas diretas ao modelo passam por aqui para que latência, tokens
+    e tentativas fiquem registrados no rastro da redação. Com o roteamento ativo
+    (roteamento_modelos), detecção e revisão vão primeiro ao modelo rápido e só
+    voltam a `modelo` se a resposta for malformada ou de baixa confiança.
+    
+    Args:
+        modelo: ID do modelo
+        prompt: Prompt do usuário
+        temperature: Temperatura de amostragem
+        etapa: Nome da etapa do pipeline (usado como nome do span)
+    
+    Dentro de uma tarefa (tarefas_correcao.checkpoints) a resposta é gravada e,
+    numa nova execução da mesma tarefa, lida do checkpoint sem chamar o modelo.
+    """
+    return tarefas_correcao.repetir_ou_chamar(
+        (modelo, prompt, temperature), lambda: _chamar_modelo_roteado(modelo, prompt, temperature, etapa))
 
-def processar_redacao_completa(redacao_texto: str, tema_redacao: Dict[str, Any]) -> Dict[str, Any]:
+def _chamar_modelo_roteado(modelo: str, prompt: str, temperature: float, etapa: str) -> str:
+    politica = roteamento_modelos.politica_para(rastreamento.atributo_atual('competencia'), etapa)
+    if politica is None:
+        return _requisitar_modelo(modelo, prompt, temperature, etapa).choices[0].message.content
+    
+    resposta = _requisitar_modelo(politica.modelo_rapido, prompt, temperature, etapa, logprobs=True, rota="rapido")
+    motivo = roteamento_modelos.motivo_escalonamento(politica, etapa, resposta)
+    if motivo is None:
+        return resposta.choices[0].message.content
+    logger.info(f"Escalonando {etapa} para {modelo}: {motivo}")
+    return _requisitar_modelo(modelo, prompt, temperature, etapa, rota="escalonado", motivo=motivo).choices[0].message.content
+
+def _requisitar_modelo(modelo: str, prompt: str, temperature: float, etapa: str, logprobs: bool = False, **atributos):
+    """Executa a chamada com novas tentativas em erros transitórios e registra uso e custo."""
+    parametros = {"logprobs": True} if logprobs else {}
+    with rastreamento.span(etapa, tipo="modelo", modelo=modelo, cache_hit=False, **atributos) as span:
+        for tentativa in range(1, MAX_TENTATIVAS_MODELO + 1):
+            span.atributos['tentativas'] = tentativa
+            try:
+                resposta = client.chat.completions.create(
+                    model=modelo,
+                    messages=[{"role": "user", "content": prompt}],
+                    temperature=temperature,
+                    **parametros
+                )
+                break
+            except Exception as e:
+                if tentativa == MAX_TENTATIVAS_MODELO or not _erro_transitorio(e):
+                    raise
+                logger.warning(f"Falha transitória em {etapa} (tentativa {tentativa}): {e}")
+                time.sleep(2 ** (tentativa - 1))
+        rastreamento.registrar_uso(span, resposta)
+        custos.contabilizar(resposta, modelo, etapa, span.atributos.get('competencia'))
+    return resposta
+
+def _erro_transitorio(erro: Exception) -> bool:
+    # Só falhas de rede, limite de taxa e erros do servidor; erros de programação e requisições
+    # inválidas sobem na hora (o SDK já faz as próprias retentativas)
+    if isinstance(erro, (openai.APIConnectionError, openai.APITimeoutError, openai.RateLimitError)):
+        return True
+    return isinstance(erro, openai.APIStatusError) and erro.status_code >= 500
+
+def chamar_rag(prompt: str, chave: str, consulta: Optional[str] = None) -> str:
+    """Gera uma resposta via RAG, recuperando documentos de `consulta` quando informada."""
+    with rastreamento.span(f"rag:{chave}", tipo="rag") as span:
+        def gerar():
+            docs_relevantes = retrieve_relevant_docs(consulta) if consulta else []
+            span.atributos['documentos'] = len(docs_relevantes)
+            return generate_rag_response(prompt, docs_relevantes, chave)
+        return tarefas_correcao.repetir_ou_chamar(("rag", prompt, chave, consulta), gerar)
+
+
+def fila_persistencia() -> persistencia.FilaPersistencia:
+    """
+    Retorna a fila de persistência. Se a aplicação não configurou destinos em lote
+    (persistencia.configurar), usa save_redacao_es e save_redacao, um documento por vez.
+    """
+    def gravar_es(doc):
+        save_redacao_es(doc['user_id'], doc['redacao_texto'], doc['tema_redacao'], doc['notas'], doc['analises_detalhadas'])
+
+    def gravar_supabase(doc):
+        save_redacao(doc['user_id'], doc['redacao_texto'], doc['tema_redacao'], doc['notas'], doc['analises_detalhadas'])
+
+    return persistencia.obter_fila(lambda: [
+        persistencia.EscritorPorDocumento("elasticsearch", gravar_es),
+        persistencia.EscritorPorDocumento("supabase", gravar_supabase),
+    ])
+
+
+def buscar_duplicata(redacao_texto: str, tema_redacao: Any) -> Tuple[Optional[duplicatas.Duplicata], Optional[Dict[str, Any]]]:
+    """Procura uma redação igual ou quase igual já corrigida; retorna (duplicata, resultados anteriores)."""
+    try:
+        armazem = obter_armazem()
+        duplicata = duplicatas.obter_indice(armazem).consultar(redacao_texto, tema_redacao)
+        anteriores = armazem.carregar(duplicata.chave) if duplicata else None
+    except sqlite3.Error as e:
+        logger.error(f"Erro ao consultar duplicatas: {e}")
+        return None, None
+    if anteriores and not prompts.mesma_versao(anteriores):
+        # Correções feitas com outros prompts não são reaproveitadas
+        logger.info(f"Duplicata {duplicata.chave} corrigida com outra versão dos prompts; corrigindo de novo")
+        return None, None
+    return (duplicata, anteriores) if anteriores else (None, None)
+
+
+def registrar_resultado_local(redacao_texto: str, tema_redacao: Any, resultados: Dict[str, Any], user_id: Any):
+    """Grava o resultado no armazém local e no índice de duplicatas."""
+    try:
+        armazem = obter_armazem()
+        chave = armazem.salvar(redacao_texto, tema_redacao, resultados, user_id)
+        duplicatas.obter_indice(armazem).adicionar(chave, redacao_texto, tema_redacao, user_id)
+    except sqlite3.Error as e:
+        logger.error(f"Erro ao salvar resultado local: {e}")
+
+
+def processar_redacao_completa(redacao_texto: str, tema_redacao: Dict[str, Any],
+                               ao_atualizar_nota: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
   """
   Processa a redação completa e gera todos os resultados necessários.
   
   Args:
       redacao_texto: Texto da redação
       tema_redacao: Tema da redação
+      ao_atualizar_nota: Recebe a faixa de nota provisória (nota_especulativa) a cada
+          detecção e revisão concluída, antes da nota final
       
   Returns:
       Dict contendo todos os resultados da análise
   """
   logger.info("Iniciando processamento da redação")
   logger.info(f"Estados presentes: {st.session_state.keys()}")
+  user_id = st.session_state.get('user_id')
+
+  # Um rerun do Streamlit no meio da correção não perde as chamadas já feitas: a próxima
+  # execução da mesma redação retoma dos checkpoints
+  id_tarefa = tarefas_correcao.id_tarefa(redacao_texto, tema_redacao, user_id)
+  with tarefas_correcao.checkpoints(id_tarefa) as execucao:
+    resultados, rastro = executar_pipeline(redacao_texto, tema_redacao, user_id, ao_atualizar_nota)
+  persistir_resultados(redacao_texto, tema_redacao, resultados, user_id)
+  execucao.armazem.limpar_checkpoints(id_tarefa)
+  guardar_na_sessao(redacao_texto, tema_redacao, resultados, rastro)
+  
+  logger.info("Processamento concluído. Resultados gerados.")
+  logger.info(f"Estados após processamento: {st.session_state.keys()}")
+  
+  return resultados
 
+@dataclass
+class CorrecaoCompartilhada:
+  """
+  Correção de uma redação antes de ser entregue a um aluno.
+  
+  Uma correção feita uma vez pode servir a várias submissões simultâneas (coalescencia);
+  cada uma recebe a sua cópia com para_usuario.
+  """
+  redacao_texto: str
+  tema_redacao: Any
+  resultados: Dict[str, Any]
+  rastro: rastreamento.Rastro
+  duplicata: Optional[duplicatas.Duplicata]
+  # Aluno da submissão que executou a correção
+  autor: Any = None
+  # True para quem entrou na correção de outra submissão em andamento
+  coalescida: bool = False
+  
+  def para_usuario(self, user_id: Any) -> Dict[str, Any]:
+    """
+    Resultados de `user_id`, com a duplicata avaliada para ele.
+    
+    Uma submissão coalescida leva a marca 'coalescida' (o uso de modelo só é consolidado
+    pela que executou) e, sem duplicata anterior, é duplicata exata da submissão que
+    executou, como seria se tivesse chegado logo depois dela.
+    """
+    resultados = copy.deepcopy(self.resultados)
+    duplicata = self.duplicata
+    if self.coalescida:
+      resultados['coalescida'] = True
+      if duplicata is None:
+        duplicata = duplicatas.Duplicata(chave_redacao(self.redacao_texto, self.tema_redacao), 1.0, True,
+                                         None if self.autor is None else str(self.autor))
+    if duplicata:
+      resultados['duplicata'] = duplicata.para_dict(user_id)
+    return resultados
+
+def executar_pipeline(redacao_texto: str, tema_redacao: Any, user_id: Any = None,
+                      ao_atualizar_nota: Optional[Callable[[Dict[str, Any]], None]] = None,
+                      reaproveitar: bool = True, metricas: Optional[Dict[str, Any]] = None
+                      ) -> Tuple[Dict[str, Any], rastreamento.Rastro]:
+  """
+  Núcleo da correção, sem Streamlit: detecção, revisão e nota de cada competência.
+  
+  Usado por processar_redacao_completa e pelas filas de tarefas.
+  Não grava nada; a gravação fica com persistir_resultados.
+  
+  Args:
+      reaproveitar: False corrige do zero, sem duplicatas nem coalescência (benchmark)
+      metricas: Métricas Coh-Metrix da redação; sem elas, usa o global cohmetrix_results
+          que a aplicação injeta (filas e serviço passam as da tarefa, já que o global é
+          compartilhado entre threads)
+  
+  Returns:
+      Tupla (resultados, rastro da correção)
+  """
+  if not reaproveitar:
+    resultados, rastro, _ = _corrigir_redacao(redacao_texto, tema_redacao, ao_atualizar_nota, metricas,
+                                              reaproveitar=False)
+    return resultados, rastro
+  correcao = corrigir_compartilhada(redacao_texto, tema_redacao, user_id, ao_atualizar_nota, metricas)
+  return correcao.para_usuario(user_id), correcao.rastro
+
+def corrigir_compartilhada(redacao_texto: str, tema_redacao: Any, user_id: Any = None,
+                           ao_atualizar_nota: Optional[Callable[[Dict[str, Any]], None]] = None,
+                           metricas: Optional[Dict[str, Any]] = None) -> CorrecaoCompartilhada:
+  """
+  Corrige a redação, ou entra na correção em andamento da mesma redação e tema.
+  
+  Submissões simultâneas iguais compartilham uma única correção (coalescencia) e
+  acompanham a nota provisória dela. Os processos do servico_correcao usam esta
+  função direto, para entregar a correção às tarefas iguais anexadas.
+  """
+  executou = []
+  
+  def corrigir(notificar):
+    executou.append(True)
+    resultados, rastro, duplicata = _corrigir_redacao(redacao_texto, tema_redacao, notificar, metricas)
+    return CorrecaoCompartilhada(redacao_texto, tema_redacao, resultados, rastro, duplicata, user_id)
+  
+  correcao = _correcoes_em_andamento.executar(chave_redacao(redacao_texto, tema_redacao), corrigir,
+                                              ao_atualizar_nota)
+  return correcao if executou else replace(correcao, coalescida=True)
+
+def _corrigir_redacao(redacao_texto: str, tema_redacao: Any,
+                      ao_atualizar_nota: Optional[Callable[[Dict[str, Any]], None]] = None,
+                      metricas: Optional[Dict[str, Any]] = None, reaproveitar: bool = True
+                      ) -> Tuple[Dict[str, Any], rastreamento.Rastro, Optional[duplicatas.Duplicata]]:
   resultados = {
       'analises_detalhadas': {},
       'notas': {},
@@ -35,47 +342,114 @@ def processar_redacao_completa(redacao_texto: str, tema_redacao: Dict[str, Any])
       'justificativas': {},
       'total_erros_por_competencia': {},
       'sugestoes_estilo': {},
-      'texto_original': redacao_texto
+      'texto_original': redacao_texto,
+      'versoes_prompts': prompts.versoes()
   }
   
+  # Redações iguais ou quase iguais a outras já corrigidas reaproveitam a análise anterior
+  duplicata, anteriores = buscar_duplicata(redacao_texto, tema_redacao) if reaproveitar else (None, None)
+  reaproveitamento_comp1 = None
+  if metricas is None:
+    metricas = cohmetrix_results
+  if duplicata:
+    logger.info(f"Redação parecida com {duplicata.chave} (similaridade {duplicata.similaridade:.2f})")
+    if not duplicata.exata:
+      reaproveitamento_comp1 = duplicatas.reaproveitar_competency1(redacao_texto, anteriores)
+  
+  competencias_a_corrigir = competencies
+  if duplicata and duplicata.exata:
+    competencias_a_corrigir = {}
+    for chave in ('analises_detalhadas', 'notas', 'erros_especificos', 'justificativas',
+                  'total_erros_por_competencia', 'sugestoes_estilo'):
+      resultados[chave] = copy.deepcopy(anteriores.get(chave, {}))
+  
   # Processar cada competência
-  for comp, descricao in competencies.items():
-      # Obter funções de análise e atribuição de nota para a competência
-      analise_func = globals()[f"analisar_{comp}"]
-      atribuir_nota_func = globals()[f"atribuir_nota_{comp}"]
-      
-      # Realizar análise da competência
-      resultado_analise = analise_func(redacao_texto, tema_redacao, cohmetrix_results)
-      
-      # Garantir que erros existam, mesmo que vazio
-      erros_revisados = resultado_analise.get('erros', [])
-      
-      # Atribuir nota baseado na análise completa e erros
-      resultado_nota = atribuir_nota_func(resultado_analise['analise'], erros_revisados)
-      nota = resultado_nota['nota']
-      justificativa = resultado_nota['justificativa']
-      
-      # Preencher resultados para esta competência
-      resultados['analises_detalhadas'][comp] = resultado_analise['analise']
-      resultados['notas'][comp] = nota
-      resultados['justificativas'][comp] = justificativa
-      resultados['erros_especificos'][comp] = erros_revisados
-      resultados['total_erros_por_competencia'][comp] = len(erros_revisados)
-      
-      # Incluir sugestões de estilo se existirem
-      if 'sugestoes_estilo' in resultado_analise:
-          resultados['sugestoes_estilo'][comp] = resultado_analise['sugestoes_estilo']
+  regras_especulacao = {'competency1': lambda erros: calcular_nota_base_competency1(contar_erros_competency1(erros))}
+  with rastreamento.iniciar_rastro("redacao", caracteres=len(redacao_texto)) as rastro, \
+       custos.registrar_uso_redacao() as registro_uso, \
+       nota_especulativa.acompanhar_redacao(list(competencias_a_corrigir), ao_atualizar_nota, regras_especulacao):
+    for comp, descricao in competencias_a_corrigir.items():
+      with rastreamento.span(comp, competencia=comp):
+        # Obter funções de análise e atribuição de nota para a competência
+        analise_func = globals()[f"analisar_{comp}"]
+        atribuir_nota_func = globals()[f"atribuir_nota_{comp}"]
+        
+        # Realizar análise da competência
+        if comp == 'competency1' and reaproveitamento_comp1:
+          resultado_analise = analise_func(redacao_texto, tema_redacao, metricas,
+                                           reaproveitamento=reaproveitamento_comp1)
+        else:
+          resultado_analise = analise_func(redacao_texto, tema_redacao, metricas)
+        
+        # Garantir que erros existam, mesmo que vazio
+        erros_revisados = resultado_analise.get('erros', [])
+        
+        # Atribuir nota baseado na análise completa e erros (no modo fundido a nota já veio na análise)
+        resultado_nota = resultado_analise.get('nota')
+        if resultado_nota is None:
+          with rastreamento.span("nota"):
+            resultado_nota = atribuir_nota_func(resultado_analise['analise'], erros_revisados)
+        nota = resultado_nota['nota']
+        justificativa = resultado_nota['justificativa']
+        nota_especulativa.nota_concluida(nota)
+        
+        # Preencher resultados para esta competência
+        resultados['analises_detalhadas'][comp] = resultado_analise['analise']
+        resultados['notas'][comp] = nota
+        resultados['justificativas'][comp] = justificativa
+        resultados['erros_especificos'][comp] = erros_revisados
+        resultados['total_erros_por_competencia'][comp] = len(erros_revisados)
+        
+        # Incluir sugestões de estilo se existirem
+        if 'sugestoes_estilo' in resultado_analise:
+            resultados['sugestoes_estilo'][comp] = resultado_analise['sugestoes_estilo']
 
   # Calcular nota total
   resultados['nota_total'] = sum(resultados['notas'].values())
+  resultados['rastro_id'] = rastro.id
+  resultados['truncamentos'] = orcamento_tokens.truncamentos_do_rastro(rastro)
+  resultados['uso'] = registro_uso.resumo()
   
-  # Salvar no session_state
+  return resultados, rastro, duplicata
+
+def persistir_resultados(redacao_texto: str, tema_redacao: Any, resultados: Dict[str, Any], user_id: Any):
+  """Consolida o uso do dia, grava no armazém local e enfileira a persistência externa."""
+  # Numa correção coalescida o uso é o da submissão que executou, já consolidado por ela
+  if not resultados.get('coalescida'):
+    try:
+        custos.consolidar_dia(resultados['uso'])
+    except OSError as e:
+        logger.error(f"Erro ao consolidar uso diário: {e}")
+  
+  # Uma duplicata exata já está no armazém com o autor original
+  if not resultados.get('duplicata', {}).get('exata'):
+      registrar_resultado_local(redacao_texto, tema_redacao, resultados, user_id)
+  
+  # Persistência fora do caminho da requisição: Elasticsearch e Supabase são gravados em lote pela fila
+  try:
+      fila_persistencia().enfileirar({
+          'user_id': user_id,
+          'redacao_texto': redacao_texto,
+          'tema_redacao': tema_redacao,
+          'notas': resultados['notas'],
+          'analises_detalhadas': resultados['analises_detalhadas'],
+          'nota_total': resultados['nota_total'],
+          'duplicata': resultados.get('duplicata'),
+      })
+  except Exception as e:
+      logger.error(f"Erro ao enfileirar redação para persistência: {str(e)}")
+
+def guardar_na_sessao(redacao_texto: str, tema_redacao: Any, resultados: Dict[str, Any],
+                      rastro: Optional[rastreamento.Rastro] = None):
+  """Publica os resultados no session_state lido pelas páginas."""
   st.session_state.analise_realizada = True
   st.session_state.resultados = resultados
   st.session_state.redacao_texto = redacao_texto
   st.session_state.tema_redacao = tema_redacao
   st.session_state.erros_especificos_todas_competencias = resultados['erros_especificos']
   st.session_state.notas_atualizadas = resultados['notas'].copy()
+  if rastro is not None:
+      st.session_state.ultimo_rastro = rastro
   
   # Adicionar timestamp da análise em formato ISO
   try:
@@ -83,31 +457,23 @@ def processar_redacao_completa(redacao_texto: str, tema_redacao: Dict[str, Any])
   except Exception as e:
       logger.error(f"Erro ao salvar timestamp: {e}")
       st.session_state.ultima_analise_timestamp = None
-  
-  # Salvar no Elasticsearch
-  try:
-      save_redacao_es(, redacao_texto, tema_redacao, resultados['notas'], resultados['analises_detalhadas'])
-  except Exception as e:
-      logger.error(f"Erro ao salvar no Elasticsearch: {str(e)}")
-  
-  # Salvar no Supabase
-  try:
-      save_redacao(
-          ,
-          redacao_texto,
-          tema_redacao,
-          resultados['notas'],
-          resultados['analises_detalhadas']
-      )
-  except Exception as e:
-      logger.error(f"Erro ao salvar no Supabase: {str(e)}")
-  
-  logger.info("Processamento concluído. Resultados gerados.")
-  logger.info(f"Estados após processamento: {st.session_state.keys()}")
-  
-  return resultados
 
-def analisar_competency1(redacao_texto: str, tema_redacao: str, cohmetrix_results: Dict[str, int]) -> Dict[str, Any]:
+def montar_prompts_deteccao_competency1(redacao_texto: str) -> Dict[str, str]:
+    """
+    Monta os prompts de detecção da Competência 1, um por critério.
+    
+    Args:
+        redacao_texto: Texto da redação
+        
+    Returns:
+        Dict com o prompt formatado de cada critério
+    """
+    return {criterio: orcamento_tokens.enquadrar("deteccao", partial(prompts.formatar, f"deteccao_{criterio}"),
+                                                 redacao_texto=redacao_texto)
+            for criterio in CRITERIOS_DETECCAO_COMP1}
+
+def analisar_competency1(redacao_texto: str, tema_redacao: str, cohmetrix_results: Dict[str, int],
+                         reaproveitamento: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
     """
     Análise da Competência 1: Domínio da Norma Culta.
     Identifica apenas erros reais que devem penalizar a nota, separando sugestões estilísticas.
@@ -116,139 +482,246 @@ def analisar_competency1(redacao_texto: str, tema_redacao: str, cohmetrix_result
         redacao_texto: Texto da redação
         tema_redacao: Tema da redação
         cohmetrix_results: Métricas textuais do Coh-Metrix
+        reaproveitamento: Erros já revisados de uma redação quase idêntica e o trecho
+            alterado (ver duplicatas.reaproveitar_competency1); só o trecho alterado
+            passa pela detecção
         
     Returns:
         Dict contendo análise, erros, sugestões e total de erros
     """
+    if CHAMADA_FUNDIDA and not reaproveitamento:
+        return analisar_competency1_fundido(redacao_texto)
     
-    MODELO_COMP1 = "ft:gpt-4o-2024-08-06:personal:competencia-1:AHDQQucG"
+    texto_deteccao = reaproveitamento['texto_alterado'] if reaproveitamento else redacao_texto
+    erros_por_criterio = {}
+    with rastreamento.span("deteccao", reaproveitado=bool(reaproveitamento),
+                           por_sentenca=DETECCAO_COMP1_POR_SENTENCA):
+        # Ortografia: pré-filtro local quando houver léxico; o modelo vê só os casos ambíguos
+        erros_ortografia = detectar_ortografia_local(texto_deteccao) if texto_deteccao.strip() else None
+        if erros_ortografia is not None:
+            erros_por_criterio['ortografia'] = erros_ortografia
+        if DETECCAO_COMP1_POR_SENTENCA:
+            erros_por_criterio.update(detectar_erros_por_sentenca_competency1(texto_deteccao, ignorar=erros_por_criterio))
+        else:
+            for criterio, prompt_formatado in (montar_prompts_deteccao_competency1(texto_deteccao).items()
+                                               if texto_deteccao.strip() else []):
+                if criterio in erros_por_criterio:
+                    continue
+                resposta = chamar_modelo(MODELO_COMP1, prompt_formatado, 0.3, f"deteccao:{criterio}")
+                erros_por_criterio[criterio] = extrair_erros_do_resultado(resposta)
     
-    criterios = {
-        "ortografia": """
-        Analise o texto linha por linha quanto à ortografia, identificando APENAS ERROS REAIS em:
-        1. Palavras escritas incorretamente
-        2. Problemas de acentuação
-        3. Uso incorreto de maiúsculas/minúsculas
-        4. Grafia de estrangeirismos
-        5. Abreviações inadequadas
-        
-        NÃO inclua sugestões de melhoria ou preferências estilísticas.
-        Inclua apenas desvios claros da norma culta.
-        
-        Texto para análise: {redacao_texto}
-        
-        Para cada ERRO REAL encontrado, forneça:
-        ERRO
-        Descrição: [Descrição objetiva do erro ortográfico]
-        Trecho: "[Trecho exato do texto]"
-        Explicação: [Explicação técnica do erro]
-        Sugestão: [Correção necessária]
-        FIM_ERRO
-        """,
-        
-        "pontuacao": """
-        Analise o texto linha por linha quanto à pontuação, identificando APENAS ERROS REAIS em:
-        1. Uso incorreto de vírgulas em:
-           - Enumerações
-           - Orações coordenadas
-           - Orações subordinadas
-           - Apostos e vocativos
-           - Adjuntos adverbiais deslocados
-        2. Uso inadequado de ponto e vírgula
-        3. Uso incorreto de dois pontos
-        4. Problemas com pontos finais
-        5. Uso inadequado de reticências
-        6. Problemas com travessões e parênteses
-        
-        NÃO inclua sugestões de melhoria ou pontuação opcional.
-        Inclua apenas desvios claros das regras de pontuação.
-        
-        Texto para análise: {redacao_texto}
+    todos_erros = []
+    for erros in erros_por_criterio.values():
+        todos_erros.extend(erros)
+    
+    # Crase: casos decididos pelas regras locais não passam pela revisão do modelo
+    crase_confirmados, todos_erros = triar_crase_competency1(todos_erros, redacao_texto)
+   
+    erros_reais, sugestoes_estilo = classificar_erros_competency1(todos_erros)
+    nota_especulativa.deteccao_concluida(erros_reais, crase_confirmados + (reaproveitamento['erros'] if reaproveitamento else []))
+    
+    # Revisão final dos erros reais
+    with rastreamento.span("revisao", erros=len(erros_reais)):
+        erros_revisados = revisar_erros_competency1(erros_reais, redacao_texto) + crase_confirmados
+    if reaproveitamento:
+        erros_revisados = reaproveitamento['erros'] + erros_revisados
+    
+    # Gerar análise final apenas com erros confirmados
+    prompt_analise = montar_prompt_analise_competency1(erros_revisados)
+    analise_geral = chamar_modelo(MODELO_COMP1, prompt_analise, 0.3, "analise")
+    
+    return {
+        'analise': analise_geral,
+        'erros': erros_revisados,
+        'sugestoes_estilo': sugestoes_estilo,
+        'total_erros': len(erros_revisados)
+    }
+
+def detectar_ortografia_local(redacao_texto: str) -> Optional[List[Dict]]:
+    """
+    Detecção do critério "ortografia" com o verificador local (ortografia_local).
+    
+    Erros de acentuação e de maiúscula (nome próprio ou início de sentença em
+    minúscula) são resolvidos localmente; palavras desconhecidas vão ao modelo num único prompt com apenas as sentenças em que aparecem.
+    
+    Returns:
+        Erros no mesmo formato de extrair_erros_do_resultado, ou None se não
+        houver léxico disponível (a detecção fica com o modelo)
+    """
+    verificador = ortografia_local.obter_verificador()
+    if verificador is None:
+        return None
+    
+    with rastreamento.span("ortografia_local") as span:
+        resultado = verificador.verificar(redacao_texto)
+        erros = extrair_erros_do_resultado(resultado.como_texto_erros())
+        span.atributos.update({'erros_locais': len(erros), 'ambiguas': len(resultado.ambiguas)})
+    
+    if resultado.ambiguas:
+        indice = IndiceTexto(redacao_texto)
+        ids = sorted({indice.sentenca_em(inicio) for _, inicio, _ in resultado.ambiguas})
+        trecho_ambiguo = "\n".join(indice.texto_sentenca(i) for i in ids)
+        prompt = montar_prompts_deteccao_competency1(trecho_ambiguo)['ortografia']
+        resposta = chamar_modelo(MODELO_COMP1, prompt, 0.3, "deteccao:ortografia")
+        erros.extend(extrair_erros_do_resultado(resposta))
+    return erros
+
+def detectar_erros_por_sentenca_competency1(redacao_texto: str, ignorar=()) -> Dict[str, List[Dict]]:
+    """
+    Detecção da Competência 1 sentença a sentença.
+    
+    Para cada critério, consulta o cache de detecção por sentença e envia ao
+    modelo, num único prompt (uma sentença por linha), apenas as sentenças que
+    faltam. Cada erro recebe 'inicio' e 'fim': a posição do trecho na redação.
+    
+    Args:
+        redacao_texto: Texto da redação
+        ignorar: Critérios já detectados por outro meio
         
-        Para cada ERRO REAL encontrado, forneça:
-        ERRO
-        Descrição: [Descrição objetiva do erro de pontuação]
-        Trecho: "[Trecho exato do texto]"
-        Explicação: [Explicação técnica do erro]
-        Sugestão: [Correção necessária]
-        FIM_ERRO
-        """,
-       
-       "concordancia": """
-        Analise o texto linha por linha quanto à concordância, identificando APENAS ERROS REAIS em:
-        1. Concordância verbal
-           - Sujeito e verbo
-           - Casos especiais (coletivos, expressões partitivas)
-        2. Concordância nominal
-           - Substantivo e adjetivo
-           - Casos especiais (é necessário, é proibido)
-        3. Concordância ideológica
-        4. Silepse (de gênero, número e pessoa)
+    Returns:
+        Dict critério -> erros detectados, na ordem das sentenças
+    """
+    cache = cache_deteccao.obter_cache()
+    intervalos = IndiceTexto(redacao_texto).sentencas
+    sentencas = [redacao_texto[inicio:fim] for inicio, fim in intervalos]
+    versoes = {criterio: prompts.obter(f"deteccao_{criterio}").versao
+               for criterio in CRITERIOS_DETECCAO_COMP1 if criterio not in ignorar}
+    
+    erros_por_criterio = {}
+    for criterio, versao in versoes.items():
+        chaves = [cache_deteccao.chave_sentenca(s, criterio, MODELO_COMP1, versao) for s in sentencas]
+        em_cache = cache.buscar(chaves)
+        pendentes = [i for i, chave in enumerate(chaves) if chave not in em_cache]
+        logger.info(f"Detecção {criterio}: {len(chaves) - len(pendentes)}/{len(chaves)} sentenças no cache")
         
-        NÃO inclua sugestões de melhoria ou preferências de concordância.
-        Inclua apenas desvios claros das regras de concordância.
+        erros_por_sentenca = {}
+        if pendentes:
+            texto_pendente = "\n".join(sentencas[i] for i in pendentes)
+            prompt = montar_prompts_deteccao_competency1(texto_pendente)[criterio]
+            resposta = chamar_modelo(MODELO_COMP1, prompt, 0.3, f"deteccao:{criterio}")
+            erros = extrair_erros_do_resultado(resposta)
+            atribuidos = cache_deteccao.atribuir_erros_a_sentencas(erros, [sentencas[i] for i in pendentes])
+            if atribuidos is None:
+                # Algum trecho não está em nenhuma sentença: mantém os erros sem cachear o lote
+                logger.info(f"Detecção {criterio}: trecho fora das sentenças, lote não cacheado")
+                erros_por_criterio[criterio] = erros
+                continue
+            erros_por_sentenca = {pendentes[j]: lista for j, lista in atribuidos.items()}
+            cache.gravar(criterio, {chaves[i]: erros_por_sentenca[i] for i in pendentes})
         
+        erros_criterio = []
+        for i, (inicio, _) in enumerate(intervalos):
+            for erro in erros_por_sentenca.get(i, em_cache.get(chaves[i], [])):
+                erro = dict(erro)
+                posicao = erro.pop('posicao', 0)
+                # A sentença em cache é a normalizada; recalcula a posição no texto atual
+                if erro.get('trecho') and erro['trecho'] in sentencas[i]:
+                    posicao = sentencas[i].index(erro['trecho'])
+                erro['inicio'] = inicio + posicao
+                erro['fim'] = erro['inicio'] + len(erro.get('trecho', ''))
+                erros_criterio.append(erro)
+        erros_por_criterio[criterio] = erros_criterio
+    
+    return erros_por_criterio
+
+def montar_prompt_fundido_competency1(redacao_texto: str) -> str:
+    """Monta o prompt único da Competência 1: erros de todos os critérios, análise geral e nota."""
+    return orcamento_tokens.enquadrar("fundido", lambda redacao_texto: f"""
+        Corrija a redação abaixo quanto à Competência 1 (Domínio da Norma Culta) numa única resposta,
+        em três partes: erros, análise e nota.
+
+        PARTE 1 - ERROS. Analise o texto linha por linha e identifique APENAS ERROS REAIS de:
+        1. Ortografia: palavras escritas incorretamente, acentuação, maiúsculas/minúsculas,
+           estrangeirismos e abreviações inadequadas
+        2. Pontuação: vírgulas (enumerações, orações coordenadas e subordinadas, apostos, vocativos,
+           adjuntos deslocados), ponto e vírgula, dois pontos, pontos finais, reticências,
+           travessões e parênteses
+        3. Concordância verbal, nominal e ideológica, e silepse
+        4. Regência verbal e nominal e crase. Só marque crase se houver junção da preposição 'a'
+           com o artigo definido feminino 'a', palavra feminina em sentido definido ou locução
+           adverbial feminina; analise o contexto completo da frase e a regência dos termos
+
+        NÃO inclua sugestões de melhoria ou preferências estilísticas.
+
         Texto para análise: {redacao_texto}
-        
+
         Para cada ERRO REAL encontrado, forneça:
         ERRO
-        Descrição: [Descrição objetiva do erro de concordância]
+        Descrição: [Descrição objetiva do erro, citando o critério]
         Trecho: "[Trecho exato do texto]"
         Explicação: [Explicação técnica do erro]
         Sugestão: [Correção necessária]
         FIM_ERRO
-        """,
-        
-        "regencia": """
-        Analise o texto linha por linha quanto à regência, identificando APENAS ERROS REAIS em:
-        1. Regência verbal
-           - Uso inadequado de preposições com verbos
-           - Ausência de preposição necessária
-        2. Regência nominal
-           - Uso inadequado de preposições com nomes
-        3. Uso da crase: Verifique CUIDADOSAMENTE se há:
-           - Junção de preposição 'a' com artigo definido feminino 'a'
-           - Palavra feminina usada em sentido definido
-           - Locuções adverbiais femininas
-           
-        IMPORTANTE: Analise cada caso considerando:
-        - O contexto completo da frase
-        - A função sintática das palavras
-        - O sentido pretendido (definido/indefinido)
-        - A regência dos verbos e nomes envolvidos
-        
-        NÃO marque como erro casos onde:
-        - Não há artigo definido feminino
-        - A palavra está sendo usada em sentido indefinido
-        - Há apenas preposição 'a' sem artigo
-        
-        Texto para análise: {redacao_texto}
-        
-        Para cada ERRO REAL encontrado, forneça:
-        ERRO
-        Descrição: [Descrição objetiva do erro de regência]
-        Trecho: "[Trecho exato do texto]"
-        Explicação: [Explicação técnica DETALHADA do erro, incluindo análise sintática]
-        Sugestão: [Correção necessária com justificativa]
-        FIM_ERRO
-        """
-    }
+
+        PARTE 2 - ANÁLISE. Com base apenas nos erros reais, escreva entre ANALISE e FIM_ANALISE:
+        ANALISE
+        Análise Geral: [Domínio geral da norma culta]
+        Erros Principais: [Erros mais relevantes]
+        Impacto na Compreensão: [Impacto dos erros]
+        Consistência: [Consistência no uso da norma]
+        Conclusão: [Visão geral da qualidade técnica]
+        FIM_ANALISE
+
+        PARTE 3 - NOTA. Atribua 0, 40, 80, 120, 160 ou 200:
+        200: no máximo uma falha de estrutura sintática, até dois desvios gramaticais, nenhum
+             registro informal e no máximo um erro ortográfico
+        160: até três desvios que não comprometem a compreensão; bom domínio geral
+        120: até cinco desvios gramaticais; domínio mediano
+        80: estrutura sintática deficitária, erros frequentes de concordância, pontuação ou ortografia
+        40: domínio precário, desvios diversos e frequentes
+        0: desconhecimento da norma culta
+        NOTA
+        Nota: [NOTA FINAL]
+        Justificativa: [Justificativa relacionando os erros aos critérios]
+        FIM_NOTA
+        """, redacao_texto=redacao_texto)
+
+def analisar_competency1_fundido(redacao_texto: str) -> Dict[str, Any]:
+    """
+    Competência 1 no modo fundido: uma geração devolve erros, análise e nota.
     
-    erros_por_criterio = {}
-    for criterio, prompt in criterios.items():
-        prompt_formatado = prompt.format(redacao_texto=redacao_texto)
-        resposta = client.chat.completions.create(
-            model=MODELO_COMP1,
-            messages=[{"role": "user", "content": prompt_formatado}],
-            temperature=0.3
-        )
-        erros_por_criterio[criterio] = extrair_erros_do_resultado(resposta.choices[0].message.content)
+    Os erros passam pela mesma triagem e revisão do fluxo normal. A nota do
+    modelo é ajustada pela nota base calculada com os erros revisados
+    (ajustar_nota_competency1), como no fluxo de várias chamadas. O pré-filtro
+    local de ortografia e a detecção por sentença não se aplicam neste modo.
+    """
+    with rastreamento.span("deteccao", fundido=True):
+        resposta = chamar_modelo(MODELO_COMP1, montar_prompt_fundido_competency1(redacao_texto), 0.3,
+                                 "deteccao:fundido")
+    resposta, nota = separar_nota_da_resposta(resposta)
+    todos_erros = extrair_erros_do_resultado(resposta)
+    bloco_analise = re.search(r'ANALISE\n(.*?)FIM_ANALISE', resposta, re.DOTALL)
+    analise_geral = bloco_analise.group(1).strip() if bloco_analise else limpar_analise(resposta).strip()
     
-    todos_erros = []
-    for erros in erros_por_criterio.values():
-        todos_erros.extend(erros)
-   
-   # Separar erros reais de sugestões estilísticas
+    crase_confirmados, todos_erros = triar_crase_competency1(todos_erros, redacao_texto)
+    erros_reais, sugestoes_estilo = classificar_erros_competency1(todos_erros)
+    nota_especulativa.deteccao_concluida(erros_reais, crase_confirmados)
+    with rastreamento.span("revisao", erros=len(erros_reais)):
+        erros_revisados = revisar_erros_competency1(erros_reais, redacao_texto) + crase_confirmados
+    
+    if nota is not None:
+        nota_base = calcular_nota_base_competency1(contar_erros_competency1(erros_revisados))
+        nota = ajustar_nota_competency1(nota, nota_base)
+    
+    return {
+        'analise': analise_geral,
+        'erros': erros_revisados,
+        'sugestoes_estilo': sugestoes_estilo,
+        'total_erros': len(erros_revisados),
+        'nota': nota
+    }
+
+def classificar_erros_competency1(todos_erros: List[Dict]) -> Tuple[List[Dict], List[Dict]]:
+    """
+    Separa os erros detectados na Competência 1 em erros reais e sugestões estilísticas.
+    
+    Args:
+        todos_erros: Erros extraídos das respostas de detecção de todos os critérios
+        
+    Returns:
+        Tupla (erros_reais, sugestoes_estilo)
+    """
+    # Separar erros reais de sugestões estilísticas
     erros_reais = []
     sugestoes_estilo = []
     
@@ -299,18 +772,64 @@ def analisar_competency1(redacao_texto: str, tema_redacao: str, cohmetrix_result
             else:
                 erros_reais.append(erro)
     
-    # Revisão final dos erros reais
-    erros_revisados = revisar_erros_competency1(erros_reais, redacao_texto)
+    return erros_reais, sugestoes_estilo
+
+def triar_crase_competency1(todos_erros: List[Dict], redacao_texto: str,
+                            indice: Optional[IndiceTexto] = None) -> Tuple[List[Dict], List[Dict]]:
+    """
+    Julga localmente os erros de crase detectados com as regras de regras_crase.
     
-    # Gerar análise final apenas com erros confirmados
-    prompt_analise = f"""
+    Os rejeitados (o texto já segue a regra) são descartados e os confirmados
+    saem já revisados, sem chamada ao modelo de revisão; os ambíguos e os demais
+    erros seguem o fluxo normal de classificação e revisão.
+    
+    Args:
+        todos_erros: Erros extraídos das respostas de detecção de todos os critérios
+        redacao_texto: Texto completo da redação
+        indice: Índice do texto, compartilhado entre os erros da mesma redação
+        
+    Returns:
+        Tupla (erros_confirmados, erros_restantes)
+    """
+    indice = indice or IndiceTexto(redacao_texto)
+    confirmados, restantes = [], []
+    rejeitados = 0
+    for erro in todos_erros:
+        if "crase" not in erro.get('descrição', '').lower():
+            restantes.append(erro)
+            continue
+        local = indice.localizar(erro.get('trecho', ''), erro.get('inicio'), reservar=False)
+        decisao = regras_crase.julgar_trecho(redacao_texto, local.inicio, local.fim) if local else None
+        if decisao is None or decisao.veredito == regras_crase.AMBIGUO:
+            restantes.append(erro)
+        elif decisao.veredito == regras_crase.REJEITADO:
+            rejeitados += 1
+        else:
+            erro_revisado = {**erro, **local.como_dict()}
+            erro_revisado.update({
+                'análise_sintática': decisao.regra,
+                'regra_aplicável': decisao.regra,
+                'explicação': f"{decisao.regra} O trecho {'não deveria' if decisao.tem_crase else 'deveria'} levar acento grave.",
+                'sugestão': decisao.correcao,
+                'considerações_enem': "Desvio de crase pela norma-padrão, confirmado por regra gramatical objetiva.",
+                'contexto_expandido': indice.janela(local, 100),
+                'revisao_local': True
+            })
+            confirmados.append(erro_revisado)
+    if confirmados or rejeitados:
+        logger.info(f"Crase: {len(confirmados)} confirmados e {rejeitados} rejeitados pelas regras locais")
+    return confirmados, restantes
+
+def montar_prompt_analise_competency1(erros_revisados: List[Dict]) -> str:
+    """Monta o prompt da análise geral da Competência 1 a partir dos erros confirmados."""
+    return orcamento_tokens.enquadrar("analise", lambda erros: f"""
     Com base nos seguintes ERROS CONFIRMADOS no texto (excluindo sugestões de melhoria estilística),
     gere uma análise detalhada da Competência 1 (Domínio da Norma Culta):
     
     Total de erros confirmados: {len(erros_revisados)}
     
     Detalhamento dos erros confirmados:
-    {json.dumps(erros_revisados, indent=2)}
+    {json.dumps(erros, indent=2)}
     
     Observação: Analisar apenas os erros reais que prejudicam a nota, ignorando sugestões de melhoria.
     
@@ -327,21 +846,7 @@ def analisar_competency1(redacao_texto: str, tema_redacao: str, cohmetrix_result
     Impacto na Compreensão: [Análise do impacto dos erros]
     Consistência: [Avaliação da consistência no uso da norma]
     Conclusão: [Visão geral da qualidade técnica]
-    """
-    
-    resposta_analise = client.chat.completions.create(
-        model=MODELO_COMP1,
-        messages=[{"role": "user", "content": prompt_analise}],
-        temperature=0.3
-    )
-    analise_geral = resposta_analise.choices[0].message.content
-    
-    return {
-        'analise': analise_geral,
-        'erros': erros_revisados,
-        'sugestoes_estilo': sugestoes_estilo,
-        'total_erros': len(erros_revisados)
-    }
+    """, erros=erros_revisados)
 
 def revisar_erros_competency1(erros_identificados: List[Dict], redacao_texto: str) -> List[Dict]:
     """
@@ -354,32 +859,71 @@ def revisar_erros_competency1(erros_identificados: List[Dict], redacao_texto: st
     Returns:
         Lista de erros validados e revisados
     """
-    MODELO_REVISAO_COMP1 = "ft:gpt-4o-2024-08-06:personal:competencia-1:AHDQQucG"
     erros_revisados = []
+    indice = IndiceTexto(redacao_texto)
     
     for erro in erros_identificados:
-        # Extrair contexto expandido do erro
-        trecho = erro.get('trecho', '')
-        inicio_trecho = redacao_texto.find(trecho)
-        if inicio_trecho != -1:
-            # Pegar até 100 caracteres antes e depois para contexto
-            inicio_contexto = max(0, inicio_trecho - 100)
-            fim_contexto = min(len(redacao_texto), inicio_trecho + len(trecho) + 100)
-            contexto_expandido = redacao_texto[inicio_contexto:fim_contexto]
-        else:
-            contexto_expandido = trecho
+        prompt_revisao, contexto_expandido = montar_prompt_revisao_competency1(erro, redacao_texto, indice)
+        
+        try:
+            resposta_revisao = chamar_modelo(MODELO_REVISAO_COMP1, prompt_revisao, 0.2, "revisao:erro")
             
-        prompt_revisao = f"""
+            revisao = extrair_revisao_do_resultado(resposta_revisao)
+            erro_revisado = aplicar_revisao_competency1(erro, revisao, contexto_expandido)
+            if erro_revisado is not None:
+                erros_revisados.append(erro_revisado)
+            nota_especulativa.revisao_concluida(erro, erro_revisado is not None)
+                    
+        except Exception as e:
+            logging.error(f"Erro ao revisar: {str(e)}")
+            nota_especulativa.revisao_concluida(erro, False)
+            continue
+    
+    return erros_revisados
+
+def montar_prompt_revisao_competency1(erro: Dict, redacao_texto: str, indice: Optional[IndiceTexto] = None,
+                                      politica: Optional[str] = None) -> Tuple[str, str]:
+    """
+    Monta o prompt de revisão de um erro da Competência 1.
+    
+    Resolve o trecho no índice do texto e anota no erro a posição encontrada
+    (início, fim, sentença e parágrafo).
+    
+    Args:
+        erro: Erro identificado na etapa de detecção
+        redacao_texto: Texto completo da redação para análise contextual
+        indice: Índice do texto, compartilhado entre os erros da mesma redação
+        politica: Política de contexto; padrão em POLITICAS_CONTEXTO_REVISAO
+        
+    Returns:
+        Tupla (prompt_revisao, contexto_expandido)
+    """
+    # Extrair contexto expandido do erro
+    indice = indice or IndiceTexto(redacao_texto)
+    trecho = erro.get('trecho', '')
+    local = indice.localizar(trecho, erro.get('inicio'))
+    if local is not None:
+        erro.update(local.como_dict())
+        # Pegar até 100 caracteres antes e depois para contexto
+        contexto_expandido = indice.janela(local, 100)
+    else:
+        contexto_expandido = trecho
+    erro_prompt = {chave: valor for chave, valor in erro.items() if chave not in CAMPOS_POSICAO}
+    politica = politica or POLITICAS_CONTEXTO_REVISAO["competency1"]
+    referencia = indice.contexto(local, politica)
+    rotulo_referencia = "Texto completo para referência:" if referencia == redacao_texto else "Trecho da redação para referência:"
+        
+    prompt_revisao = orcamento_tokens.enquadrar("revisao", lambda referencia: f"""
         Revise rigorosamente o seguinte erro identificado na Competência 1 (Domínio da Norma Culta).
         
         Erro original:
-        {json.dumps(erro, indent=2)}
+        {json.dumps(erro_prompt, indent=2)}
 
         Contexto expandido do erro:
         "{contexto_expandido}"
 
-        Texto completo para referência:
-        {redacao_texto}
+        {rotulo_referencia}
+        {referencia}
 
         Analise cuidadosamente:
         1. CONTEXTO SINTÁTICO:
@@ -417,51 +961,45 @@ def revisar_erros_competency1(erros_identificados: List[Dict], redacao_texto: st
         Sugestão Revisada: [Correção com justificativa]
         Considerações ENEM: [Relevância para a avaliação]
         FIM_REVISAO
-        """
+        """, referencia=referencia)
+    return prompt_revisao, contexto_expandido
+
+def aplicar_revisao_competency1(erro: Dict, revisao: Dict[str, str], contexto_expandido: str) -> Optional[Dict]:
+    """
+    Aplica a revisão do modelo a um erro da Competência 1.
+    
+    Returns:
+        O erro revisado, ou None se a revisão não confirmar o erro
+    """
+    # Validação rigorosa da revisão
+    if (revisao['Erro Confirmado'] == 'Sim' and
+        'Análise Sintática' in revisao and
+        'Regra Aplicável' in revisao and
+        len(revisao.get('Explicação Revisada', '')) > 50):  # Garantir explicação substancial
         
-        try:
-            resposta_revisao = client.chat.completions.create(
-                model=MODELO_REVISAO_COMP1,
-                messages=[{"role": "user", "content": prompt_revisao}],
-                temperature=0.2
-            )
-            
-            revisao = extrair_revisao_do_resultado(resposta_revisao.choices[0].message.content)
+        erro_revisado = erro.copy()
+        erro_revisado.update({
+            'análise_sintática': revisao['Análise Sintática'],
+            'regra_aplicável': revisao['Regra Aplicável'],
+            'explicação': revisao['Explicação Revisada'],
+            'sugestão': revisao['Sugestão Revisada'],
+            'considerações_enem': revisao['Considerações ENEM'],
+            'contexto_expandido': contexto_expandido
+        })
+        
+        # Validação adicional para erros de crase
+        if "crase" in erro.get('descrição', '').lower():
+            explicacao = revisao['Explicação Revisada'].lower()
+            analise = revisao['Análise Sintática'].lower()
             
-            # Validação rigorosa da revisão
-            if (revisao['Erro Confirmado'] == 'Sim' and
-                'Análise Sintática' in revisao and
-                'Regra Aplicável' in revisao and
-                len(revisao.get('Explicação Revisada', '')) > 50):  # Garantir explicação substancial
-                
-                erro_revisado = erro.copy()
-                erro_revisado.update({
-                    'análise_sintática': revisao['Análise Sintática'],
-                    'regra_aplicável': revisao['Regra Aplicável'],
-                    'explicação': revisao['Explicação Revisada'],
-                    'sugestão': revisao['Sugestão Revisada'],
-                    'considerações_enem': revisao['Considerações ENEM'],
-                    'contexto_expandido': contexto_expandido
-                })
-                
-                # Validação adicional para erros de crase
-                if "crase" in erro.get('descrição', '').lower():
-                    explicacao = revisao['Explicação Revisada'].lower()
-                    analise = revisao['Análise Sintática'].lower()
-                    
-                    # Só aceita se houver análise técnica completa
-                    if ('artigo definido' in explicacao and
-                        'preposição' in explicacao and
-                        any(termo in analise for termo in ['função sintática', 'regência', 'complemento'])):
-                        erros_revisados.append(erro_revisado)
-                else:
-                    erros_revisados.append(erro_revisado)
-                    
-        except Exception as e:
-            logging.error(f"Erro ao revisar: {str(e)}")
-            continue
-    
-    return erros_revisados
+            # Só aceita se houver análise técnica completa
+            if ('artigo definido' in explicacao and
+                'preposição' in explicacao and
+                any(termo in analise for termo in ['função sintática', 'regência', 'complemento'])):
+                return erro_revisado
+        else:
+            return erro_revisado
+    return None
 
 def extrair_revisao_do_resultado(texto):
     revisao = {}
@@ -473,9 +1011,9 @@ def extrair_revisao_do_resultado(texto):
     return revisao
 
 
-def analisar_competency2(redacao_texto: str, tema_redacao: str, cohmetrix_results: Dict[str, int]) -> Dict[str, Any]:
-    """Análise da Competência 2: Compreensão do Tema"""
-    prompt_analise = f"""
+def montar_prompt_analise_competency2(redacao_texto: str, tema_redacao: str, cohmetrix_results: Dict[str, int]) -> str:
+    """Monta o prompt de análise da Competência 2."""
+    return orcamento_tokens.enquadrar("analise", lambda redacao_texto: f"""
     Analise a compreensão do tema na seguinte redação, considerando:
     1. Texto da redação: {redacao_texto}
     2. Tema proposto: {tema_redacao}
@@ -510,20 +1048,75 @@ def analisar_competency2(redacao_texto: str, tema_redacao: str, cohmetrix_result
     Vínculo Repertório-Discussão: [Sua análise aqui]
     Originalidade: [Sua análise aqui]
     Citação de Fontes: [Sua análise aqui]
-    """
-    docs_relevantes = retrieve_relevant_docs("Compreensão do Tema ENEM")
-    analise_geral = generate_rag_response(prompt_analise, docs_relevantes, "competency2")
+    """, redacao_texto=redacao_texto)
+
+def analisar_competency2(redacao_texto: str, tema_redacao: str, cohmetrix_results: Dict[str, int]) -> Dict[str, Any]:
+    """Análise da Competência 2: Compreensão do Tema"""
+    prompt_analise = montar_prompt_analise_competency2(redacao_texto, tema_redacao, cohmetrix_results)
+    analise_geral, nota = chamar_rag_analise("competency2", prompt_analise)
     
     # Remover blocos de ERRO do texto da análise
-    analise_limpa = re.sub(r'ERRO\n.*?FIM_ERRO', '', analise_geral, flags=re.DOTALL)
+    analise_limpa = limpar_analise(analise_geral)
     
     erros_identificados = extrair_erros_do_resultado(analise_geral)
-    erros_revisados = revisar_erros_competency2(erros_identificados, redacao_texto)
+    with rastreamento.span("revisao", erros=len(erros_identificados)):
+        erros_revisados = revisar_erros_competency2(erros_identificados, redacao_texto)
 
     return {
         'analise': analise_limpa,
-        'erros': erros_revisados
+        'erros': erros_revisados,
+        'nota': nota
     }
+
+def chamar_rag_analise(comp: str, prompt_analise: str) -> Tuple[str, Optional[Dict[str, Any]]]:
+    """
+    Gera a análise de uma competência (2 a 5) via RAG.
+    
+    No modo fundido (CHAMADA_FUNDIDA) os critérios de nota da competência vão no
+    mesmo prompt e a nota volta na mesma resposta, dispensando a chamada de
+    atribuir_nota_competencyN.
+    
+    Returns:
+        Tupla (analise_geral, nota); nota é None fora do modo fundido ou se a
+        resposta não trouxer um bloco NOTA válido
+    """
+    if not CHAMADA_FUNDIDA:
+        return chamar_rag(prompt_analise, comp, CONSULTAS_RAG[comp]), None
+    prompt_nota = globals()[f"montar_prompt_nota_{comp}"](REFERENCIA_ANALISE_FUNDIDA)
+    resposta = chamar_rag(anexar_nota_ao_prompt(prompt_analise, prompt_nota), comp, CONSULTAS_RAG[comp])
+    return separar_nota_da_resposta(resposta)
+
+def anexar_nota_ao_prompt(prompt_analise: str, prompt_nota: str) -> str:
+    """Acrescenta ao prompt de análise o pedido de nota, respondido num bloco NOTA/FIM_NOTA."""
+    return f"""{prompt_analise}
+
+    Depois da análise e dos blocos de erro, atribua a nota da competência nesta mesma resposta,
+    seguindo as instruções abaixo:
+    {prompt_nota}
+
+    Escreva a nota e a justificativa entre as linhas NOTA e FIM_NOTA:
+    NOTA
+    Nota: [NOTA FINAL]
+    Justificativa: [Justificativa da nota]
+    FIM_NOTA
+    """
+
+def separar_nota_da_resposta(resposta: str) -> Tuple[str, Optional[Dict[str, Any]]]:
+    """Separa o bloco NOTA/FIM_NOTA da resposta fundida. Retorna (resposta_sem_nota, nota)."""
+    bloco = re.search(r'NOTA\n(.*?)FIM_NOTA', resposta, re.DOTALL)
+    if bloco is None:
+        return resposta, None
+    try:
+        nota = extrair_nota_e_justificativa(bloco.group(1))
+    except ValueError as e:
+        logger.warning(f"Nota inválida na resposta fundida: {e}")
+        nota = None
+    return resposta[:bloco.start()] + resposta[bloco.end():], nota
+
+def limpar_analise(analise_geral: str) -> str:
+    """Remove os blocos ERRO/FIM_ERRO do texto da análise."""
+    return re.sub(r'ERRO\n.*?FIM_ERRO', '', analise_geral, flags=re.DOTALL)
+
 def extrair_erros_do_resultado(resultado: str) -> List[Dict[str, str]]:
     erros = []
     padrao_erro = re.compile(r'ERRO\n(.*?)\nFIM_ERRO', re.DOTALL)
@@ -545,9 +1138,9 @@ def extrair_erros_do_resultado(resultado: str) -> List[Dict[str, str]]:
     return erros
 
 
-def analisar_competency3(redacao_texto: str, tema_redacao: str, cohmetrix_results: Dict[str, int]) -> Dict[str, Any]:
-    """Análise da Competência 3: Seleção e Organização das Informações"""
-    prompt_analise = f"""
+def montar_prompt_analise_competency3(redacao_texto: str, tema_redacao: str, cohmetrix_results: Dict[str, int]) -> str:
+    """Monta o prompt de análise da Competência 3."""
+    return orcamento_tokens.enquadrar("analise", lambda redacao_texto: f"""
     Analise a seleção e organização das informações na seguinte redação, considerando:
     1. Texto da redação: {redacao_texto}
     2. Tema: {tema_redacao}
@@ -583,25 +1176,30 @@ def analisar_competency3(redacao_texto: str, tema_redacao: str, cohmetrix_result
     Autoria e Originalidade: [Sua análise aqui]
     Encadeamento entre Parágrafos: [Sua análise aqui]
     Estrutura dos Parágrafos: [Sua análise aqui]
-    """
-    docs_relevantes = retrieve_relevant_docs("Seleção e Organização das Informações ENEM")
-    analise_geral = generate_rag_response(prompt_analise, docs_relevantes, "competency3")
+    """, redacao_texto=redacao_texto)
+
+def analisar_competency3(redacao_texto: str, tema_redacao: str, cohmetrix_results: Dict[str, int]) -> Dict[str, Any]:
+    """Análise da Competência 3: Seleção e Organização das Informações"""
+    prompt_analise = montar_prompt_analise_competency3(redacao_texto, tema_redacao, cohmetrix_results)
+    analise_geral, nota = chamar_rag_analise("competency3", prompt_analise)
 
     # Remover blocos de ERRO do texto da análise
-    analise_limpa = re.sub(r'ERRO\n.*?FIM_ERRO', '', analise_geral, flags=re.DOTALL)
+    analise_limpa = limpar_analise(analise_geral)
 
     erros_identificados = extrair_erros_do_resultado(analise_geral)
-    erros_revisados = revisar_erros_competency3(erros_identificados, redacao_texto)
+    with rastreamento.span("revisao", erros=len(erros_identificados)):
+        erros_revisados = revisar_erros_competency3(erros_identificados, redacao_texto)
 
     return {
         'analise': analise_limpa,
-        'erros': erros_revisados
+        'erros': erros_revisados,
+        'nota': nota
     }
 
 
-def analisar_competency4(redacao_texto: str, tema_redacao: str, cohmetrix_results: Dict[str, int]) -> Dict[str, Any]:
-    """Análise da Competência 4: Conhecimento dos Mecanismos Linguísticos"""
-    prompt_analise = f"""
+def montar_prompt_analise_competency4(redacao_texto: str, tema_redacao: str, cohmetrix_results: Dict[str, int]) -> str:
+    """Monta o prompt de análise da Competência 4."""
+    return orcamento_tokens.enquadrar("analise", lambda redacao_texto: f"""
     Analise o conhecimento dos mecanismos linguísticos na seguinte redação, considerando:
     1. Texto da redação: {redacao_texto}
     2. Tema: {tema_redacao}
@@ -636,24 +1234,29 @@ def analisar_competency4(redacao_texto: str, tema_redacao: str, cohmetrix_result
     Referenciação: [Sua análise aqui]
     Transições de Ideias: [Sua análise aqui]
     Estrutura de Períodos: [Sua análise aqui]
-    """
-    docs_relevantes = retrieve_relevant_docs("Conhecimento dos Mecanismos Linguísticos ENEM")
-    analise_geral = generate_rag_response(prompt_analise, docs_relevantes, "competency4")
+    """, redacao_texto=redacao_texto)
+
+def analisar_competency4(redacao_texto: str, tema_redacao: str, cohmetrix_results: Dict[str, int]) -> Dict[str, Any]:
+    """Análise da Competência 4: Conhecimento dos Mecanismos Linguísticos"""
+    prompt_analise = montar_prompt_analise_competency4(redacao_texto, tema_redacao, cohmetrix_results)
+    analise_geral, nota = chamar_rag_analise("competency4", prompt_analise)
 
     # Remover blocos de ERRO do texto da análise
-    analise_limpa = re.sub(r'ERRO\n.*?FIM_ERRO', '', analise_geral, flags=re.DOTALL)
+    analise_limpa = limpar_analise(analise_geral)
 
     erros_identificados = extrair_erros_do_resultado(analise_geral)
-    erros_revisados = revisar_erros_competency4(erros_identificados, redacao_texto)
+    with rastreamento.span("revisao", erros=len(erros_identificados)):
+        erros_revisados = revisar_erros_competency4(erros_identificados, redacao_texto)
 
     return {
         'analise': analise_limpa,
-        'erros': erros_revisados
+        'erros': erros_revisados,
+        'nota': nota
     }
 
-def analisar_competency5(redacao_texto: str, tema_redacao: str, cohmetrix_results: Dict[str, int]) -> Dict[str, Any]:
-    """Análise da Competência 5: Proposta de Intervenção"""
-    prompt_analise = f"""
+def montar_prompt_analise_competency5(redacao_texto: str, tema_redacao: str, cohmetrix_results: Dict[str, int]) -> str:
+    """Monta o prompt de análise da Competência 5."""
+    return orcamento_tokens.enquadrar("analise", lambda redacao_texto: f"""
     Analise a proposta de intervenção na seguinte redação, considerando:
     1. Texto da redação: {redacao_texto}
     2. Tema: {tema_redacao}
@@ -684,64 +1287,90 @@ def analisar_competency5(redacao_texto: str, tema_redacao: str, cohmetrix_result
     Viabilidade e Direitos Humanos: [Sua análise aqui]
     Retomada do Contexto: [Sua análise aqui]
     Coerência com o Tema: [Sua análise aqui]
-    """
-    docs_relevantes = retrieve_relevant_docs("Proposta de Intervenção ENEM")
-    analise_geral = generate_rag_response(prompt_analise, docs_relevantes, "competency5")
+    """, redacao_texto=redacao_texto)
+
+def analisar_competency5(redacao_texto: str, tema_redacao: str, cohmetrix_results: Dict[str, int]) -> Dict[str, Any]:
+    """Análise da Competência 5: Proposta de Intervenção"""
+    prompt_analise = montar_prompt_analise_competency5(redacao_texto, tema_redacao, cohmetrix_results)
+    analise_geral, nota = chamar_rag_analise("competency5", prompt_analise)
 
     # Remover blocos de ERRO do texto da análise
-    analise_limpa = re.sub(r'ERRO\n.*?FIM_ERRO', '', analise_geral, flags=re.DOTALL)
+    analise_limpa = limpar_analise(analise_geral)
 
     erros_identificados = extrair_erros_do_resultado(analise_geral)
-    erros_revisados = revisar_erros_competency5(erros_identificados, redacao_texto)
+    with rastreamento.span("revisao", erros=len(erros_identificados)):
+        erros_revisados = revisar_erros_competency5(erros_identificados, redacao_texto)
 
     return {
         'analise': analise_limpa,
-        'erros': erros_revisados
+        'erros': erros_revisados,
+        'nota': nota
     }
 def revisar_erros_competency2(erros_identificados, redacao_texto):
     """Revisa os erros identificados na Competência 2 usando um modelo FT e base RAG do ENEM"""
     
-    MODELO_REVISAO_COMP2 = "ft:gpt-4o-2024-08-06:personal:competencia-2:AHDT84HO"
-    
-    return revisar_erros_generico(erros_identificados, redacao_texto, MODELO_REVISAO_COMP2, "Compreensão do Tema")
+    return revisar_erros_generico(erros_identificados, redacao_texto, MODELO_REVISAO_COMP2, NOMES_COMPETENCIAS["competency2"])
 
 def revisar_erros_competency3(erros_identificados, redacao_texto):
     """Revisa os erros identificados na Competência 3 usando um modelo FT e base RAG do ENEM"""
     
-    MODELO_REVISAO_COMP3 = "ft:gpt-4o-2024-08-06:personal:competencia-3:AHDUfZRb"
-    
-    return revisar_erros_generico(erros_identificados, redacao_texto, MODELO_REVISAO_COMP3, "Seleção e Organização das Informações")
+    return revisar_erros_generico(erros_identificados, redacao_texto, MODELO_REVISAO_COMP3, NOMES_COMPETENCIAS["competency3"])
 
 def revisar_erros_competency4(erros_identificados, redacao_texto):
     """Revisa os erros identificados na Competência 4 usando um modelo FT e base RAG do ENEM"""
     
-    MODELO_REVISAO_COMP4 = "ft:gpt-4o-2024-08-06:personal:competencia-4:AHDXewU3"
-    
-    return revisar_erros_generico(erros_identificados, redacao_texto, MODELO_REVISAO_COMP4, "Conhecimento dos Mecanismos Linguísticos")
+    return revisar_erros_generico(erros_identificados, redacao_texto, MODELO_REVISAO_COMP4, NOMES_COMPETENCIAS["competency4"])
 
 def revisar_erros_competency5(erros_identificados, redacao_texto):
     """Revisa os erros identificados na Competência 5 usando um modelo FT e base RAG do ENEM"""
     
-    MODELO_REVISAO_COMP5 = "ft:gpt-4o-2024-08-06:personal:competencia-5:AHGVPnJG"
-    
-    return revisar_erros_generico(erros_identificados, redacao_texto, MODELO_REVISAO_COMP5, "Proposta de Intervenção")
+    return revisar_erros_generico(erros_identificados, redacao_texto, MODELO_REVISAO_COMP5, NOMES_COMPETENCIAS["competency5"])
 
 
-def revisar_erros_generico(erros_identificados, redacao_texto, modelo_revisao, nome_competencia):
+def revisar_erros_generico(erros_identificados, redacao_texto, modelo_revisao, nome_competencia, politica=None):
     """Função genérica para revisar erros de qualquer competência"""
     
     erros_revisados = []
+    indice = IndiceTexto(redacao_texto)
+    nota_especulativa.deteccao_concluida(erros_identificados)
     
     for erro in erros_identificados:
-        prompt_revisao = f"""
+        prompt_revisao = montar_prompt_revisao_generico(erro, redacao_texto, nome_competencia, indice, politica)
+        
+        resposta_revisao = chamar_modelo(modelo_revisao, prompt_revisao, 0.2, "revisao:erro")
+        
+        revisao = extrair_revisao_do_resultado(resposta_revisao)
+        erro_revisado = aplicar_revisao_generica(erro, revisao)
+        if erro_revisado is not None:
+            erros_revisados.append(erro_revisado)
+        nota_especulativa.revisao_concluida(erro, erro_revisado is not None)
+    
+    return erros_revisados
+
+def montar_prompt_revisao_generico(erro: Dict, redacao_texto: str, nome_competencia: str,
+                                   indice: Optional[IndiceTexto] = None, politica: Optional[str] = None) -> str:
+    """
+    Monta o prompt de revisão de um erro das Competências 2 a 5.
+    
+    O texto de referência segue `politica` (padrão: a da competência em
+    POLITICAS_CONTEXTO_REVISAO); se o trecho não for localizado, vai a redação inteira.
+    """
+    if politica is None:
+        competencia = next((c for c, nome in NOMES_COMPETENCIAS.items() if nome == nome_competencia), None)
+        politica = POLITICAS_CONTEXTO_REVISAO.get(competencia, "completo")
+    indice = indice or IndiceTexto(redacao_texto)
+    local = indice.localizar(erro.get('trecho', ''), erro.get('inicio'))
+    referencia = indice.contexto(local, politica)
+    rotulo_referencia = "Texto da redação:" if referencia == redacao_texto else "Trecho da redação:"
+    return orcamento_tokens.enquadrar("revisao", lambda referencia: f"""
         Revise o seguinte erro identificado na Competência {nome_competencia} 
         de acordo com os critérios específicos do ENEM:
 
         Erro original:
         {json.dumps(erro, indent=2)}
 
-        Texto da redação:
-        {redacao_texto}
+        {rotulo_referencia}
+        {referencia}
 
         Com base nos critérios do ENEM e na base de conhecimento RAG, determine:
         1. Se o erro está corretamente identificado
@@ -755,26 +1384,19 @@ def revisar_erros_generico(erros_identificados, redacao_texto, modelo_revisao, n
         Sugestão Revisada: [Nova sugestão, se necessário]
         Considerações ENEM: [Observações específicas sobre o erro no contexto do ENEM]
         FIM_REVISAO
-        """
-        
-        resposta_revisao = client.chat.completions.create(
-            model=modelo_revisao,
-            messages=[{"role": "user", "content": prompt_revisao}],
-            temperature=0.2
-        )
-        
-        revisao = extrair_revisao_do_resultado(resposta_revisao.choices[0].message.content)
-        
-        if revisao['Erro Confirmado'] == 'Sim':
-            erro_revisado = erro.copy()
-            if 'Explicação Revisada' in revisao:
-                erro_revisado['explicação'] = revisao['Explicação Revisada']
-            if 'Sugestão Revisada' in revisao:
-                erro_revisado['sugestão'] = revisao['Sugestão Revisada']
-            erro_revisado['considerações_enem'] = revisao['Considerações ENEM']
-            erros_revisados.append(erro_revisado)
-    
-    return erros_revisados
+        """, referencia=referencia)
+
+def aplicar_revisao_generica(erro: Dict, revisao: Dict[str, str]) -> Optional[Dict]:
+    """Aplica a revisão do modelo a um erro; retorna None se o erro não for confirmado."""
+    if revisao['Erro Confirmado'] == 'Sim':
+        erro_revisado = erro.copy()
+        if 'Explicação Revisada' in revisao:
+            erro_revisado['explicação'] = revisao['Explicação Revisada']
+        if 'Sugestão Revisada' in revisao:
+            erro_revisado['sugestão'] = revisao['Sugestão Revisada']
+        erro_revisado['considerações_enem'] = revisao['Considerações ENEM']
+        return erro_revisado
+    return None
 
 def atribuir_nota_competency1(analise: str, erros: List[Dict[str, str]]) -> Dict[str, Any]:
    """
@@ -787,6 +1409,18 @@ def atribuir_nota_competency1(analise: str, erros: List[Dict[str, str]]) -> Dict
    Returns:
        Dict contendo a nota atribuída (0-200) e sua justificativa
    """
+   prompt_nota, nota_base = montar_prompt_nota_competency1(analise, erros)
+   
+   # Gerar resposta usando RAG
+   resposta_nota = chamar_rag(prompt_nota, "competency1_nota", CONSULTAS_RAG["competency1_nota"])
+   
+   # Extrair nota e justificativa
+   resultado = extrair_nota_e_justificativa(resposta_nota)
+   
+   return ajustar_nota_competency1(resultado, nota_base)
+
+def contar_erros_competency1(erros: List[Dict[str, str]]) -> Dict[str, int]:
+   """Conta os erros da Competência 1 por categoria."""
    # Contar erros por categoria
    contagem_erros = {
        'sintaxe': 0,
@@ -798,7 +1432,8 @@ def atribuir_nota_competency1(analise: str, erros: List[Dict[str, str]]) -> Dict
    }
    
    for erro in erros:
-       desc = erro.get('explicacao', '').lower()
+       # A categoria vem da 'explicação' do erro; sem ela, da 'descrição'
+       desc = (erro.get('explicação') or erro.get('descrição', '')).lower()
        if 'sintax' in desc or 'estrutura' in desc:
            contagem_erros['sintaxe'] += 1
        if 'ortograf' in desc or 'accent' in desc or 'escrita' in desc:
@@ -812,16 +1447,10 @@ def atribuir_nota_competency1(analise: str, erros: List[Dict[str, str]]) -> Dict
        if 'coloquial' in desc or 'registro' in desc or 'informal' in desc:
            contagem_erros['registro'] += 1
 
-   # Formatar erros para apresentação
-   erros_formatados = ""
-   for erro in erros:
-       erros_formatados += f"""
-       Erro encontrado:
-       Trecho: "{erro.get('trecho', '')}"
-       Explicação: {erro.get('explicacao', '')}"
-       Sugestão: {erro.get('sugestao', '')}
-       """
+   return contagem_erros
 
+def calcular_nota_base_competency1(contagem_erros: Dict[str, int]) -> int:
+   """Determina a nota base da Competência 1 pelos critérios objetivos de contagem de erros."""
    # Determinar nota base pelos critérios objetivos
    total_erros = sum(contagem_erros.values())
    if (total_erros <= 3 and 
@@ -843,81 +1472,51 @@ def atribuir_nota_competency1(analise: str, erros: List[Dict[str, str]]) -> Dict
    else:
        nota_base = 0
 
-   # Construir prompt para validação da nota
-   prompt_nota = f"""
-   Com base na seguinte análise da Competência 1 (Domínio da Norma Culta) e na contagem de erros identificados,
-   confirme se a nota {nota_base} está adequada.
-   
-   ANÁLISE DETALHADA:
-   {analise}
-   
-   CONTAGEM DE ERROS:
-   - Erros de sintaxe/estrutura: {contagem_erros['sintaxe']}
-   - Erros de ortografia/acentuação: {contagem_erros['ortografia']}
-   - Erros de concordância: {contagem_erros['concordancia']}
-   - Erros de pontuação: {contagem_erros['pontuacao']}
-   - Erros de crase: {contagem_erros['crase']}
-   - Desvios de registro formal: {contagem_erros['registro']}
-   Total de erros: {total_erros}
-   
-   ERROS ESPECÍFICOS:
-   {erros_formatados}
-   
-   Critérios para cada nota:
-   
-   200 pontos:
-   - No máximo uma falha de estrutura sintática
-   - No máximo dois desvios gramaticais
-   - Nenhum uso de linguagem informal/coloquial
-   - No máximo um erro ortográfico
-   - Coerência e coesão impecáveis
-   - Sem repetição de erros
-   
-   160 pontos:
-   - Até três desvios gramaticais que não comprometem a compreensão
-   - Poucos erros de pontuação/acentuação
-   - No máximo três erros ortográficos
-   - Bom domínio geral da norma culta
-   
-   120 pontos:
-   - Até cinco desvios gramaticais
-   - Domínio mediano da norma culta
-   - Alguns problemas de coesão pontuais
-   - Erros não sistemáticos
-   
-   80 pontos:
-   - Estrutura sintática deficitária
-   - Erros frequentes de concordância
-   - Uso ocasional de registro inadequado
-   - Muitos erros de pontuação/ortografia
-   
-   40 pontos:
-   - Domínio precário da norma culta
-   - Diversos desvios gramaticais frequentes
-   - Problemas graves de coesão
-   - Registro frequentemente inadequado
-   
-   0 pontos:
-   - Desconhecimento total da norma culta
-   - Erros graves e sistemáticos
-   - Texto incompreensível
-   
-   Com base nesses critérios e na análise apresentada, forneça:
-   1. Confirmação ou ajuste da nota base {nota_base}
-   2. Justificativa detalhada relacionando os erros encontrados com os critérios
-   
-   Formato da resposta:
-   Nota: [NOTA FINAL]
-   Justificativa: [Justificativa detalhada da nota, explicando como os erros e acertos se relacionam com os critérios]
+   return nota_base
+
+def montar_prompt_nota_competency1(analise: str, erros: List[Dict[str, str]]) -> Tuple[str, int]:
    """
+   Monta o prompt de validação da nota da Competência 1.
    
-   # Gerar resposta usando RAG
-   docs_relevantes = retrieve_relevant_docs("Critérios de Avaliação Competência 1 ENEM")
-   resposta_nota = generate_rag_response(prompt_nota, docs_relevantes, "competency1_nota")
-   
-   # Extrair nota e justificativa
-   resultado = extrair_nota_e_justificativa(resposta_nota)
-   
+   Returns:
+       Tupla (prompt_nota, nota_base)
+   """
+   contagem_erros = contar_erros_competency1(erros)
+   total_erros = sum(contagem_erros.values())
+   nota_base = calcular_nota_base_competency1(contagem_erros)
+
+   # Formatar erros para apresentação
+   erros_formatados = ""
+   for erro in erros:
+       erros_formatados += f"""
+       Erro encontrado:
+       Trecho: "{erro.get('trecho', '')}"
+       Explicação: {erro.get('explicação') or erro.get('descrição', '')}"
+       Sugestão: {erro.get('sugestão', '')}
+       """
+
+   # Construir prompt para validação da nota
+   prompt_nota = orcamento_tokens.enquadrar(
+       "nota",
+       partial(
+           prompts.formatar, "nota_competency1",
+           nota_base=nota_base,
+           erros_sintaxe=contagem_erros['sintaxe'],
+           erros_ortografia=contagem_erros['ortografia'],
+           erros_concordancia=contagem_erros['concordancia'],
+           erros_pontuacao=contagem_erros['pontuacao'],
+           erros_crase=contagem_erros['crase'],
+           erros_registro=contagem_erros['registro'],
+           total_erros=total_erros
+       ),
+       analise=analise,
+       erros_formatados=erros_formatados
+   )
+
+   return prompt_nota, nota_base
+
+def ajustar_nota_competency1(resultado: Dict[str, Any], nota_base: int) -> Dict[str, Any]:
+   """Garante que a nota da Competência 1 seja válida e coerente com a nota base."""
    # Validar se a nota está nos valores permitidos
    if resultado['nota'] not in [0, 40, 80, 120, 160, 200]:
        resultado['nota'] = nota_base
@@ -931,205 +1530,40 @@ def atribuir_nota_competency1(analise: str, erros: List[Dict[str, str]]) -> Dict
    return resultado
 
     
-def atribuir_nota_competency2(analise: str, erros: List[Dict[str, Any]]) -> Dict[str, Any]:
-    prompt_nota = f"""
-    Com base na seguinte análise da Competência 2 (Compreensão do Tema) do ENEM, atribua uma nota de 0 a 200 em intervalos de 40 pontos (0, 40, 80, 120, 160 ou 200).
-
-    Análise:
-    {analise}
-
-    Considere cuidadosamente os seguintes critérios para atribuir a nota:
-
-    Nota 200:
-    - Excelente domínio do tema proposto.
-    - Citação das palavras principais do tema ou sinônimos em cada parágrafo.
-    - Argumentação consistente com repertório sociocultural produtivo.
-    - Uso de exemplos históricos, frases, músicas, textos, autores famosos, filósofos, estudos, artigos ou publicações como repertório.
-    - Excelente domínio do texto dissertativo-argumentativo, incluindo proposição, argumentação e conclusão.
-    - Não copia trechos dos textos motivadores e demonstra clareza no ponto de vista adotado.
-    - Estabelece vínculo de ideias entre a referência ao repertório e a discussão proposta.
-    - Cita a fonte do repertório (autor, obra, data de criação, etc.).
-    - Inclui pelo menos um repertório no segundo e terceiro parágrafo.
-
-    Nota 160:
-    - Bom desenvolvimento do tema com argumentação consistente, mas sem repertório sociocultural tão produtivo.
-    - Completa as 3 partes do texto dissertativo-argumentativo (nenhuma delas é embrionária).
-    - Bom domínio do texto dissertativo-argumentativo, com proposição, argumentação e conclusão claras, mas sem aprofundamento.
-    - Utiliza informações pertinentes, mas sem extrapolar significativamente sua justificativa.
-
-    Nota 120:
-    - Abordagem completa do tema, com as 3 partes do texto dissertativo-argumentativo (podendo 1 delas ser embrionária).
-    - Repertório baseado nos textos motivadores e/ou repertório não legitimado e/ou repertório legitimado, mas não pertinente ao tema.
-    - Desenvolvimento do tema de forma previsível, com argumentação mediana, sem grandes inovações.
-    - Domínio mediano do texto dissertativo-argumentativo, com proposição, argumentação e conclusão, mas de forma superficial.
-
-    Nota 80:
-    - Abordagem completa do tema, mas com problemas relacionados ao tipo textual e presença de muitos trechos de cópia sem aspas.
-    - Domínio insuficiente do texto dissertativo-argumentativo, faltando a estrutura completa de proposição, argumentação e conclusão.
-    - Não desenvolve um ponto de vista claro e não consegue conectar as ideias argumentativas adequadamente.
-    - Duas partes embrionárias ou com conclusão finalizada por frase incompleta.
-
-    Nota 40:
-    - Tangencia o tema, sem abordar diretamente o ponto central proposto.
-    - Domínio precário do texto dissertativo-argumentativo, com traços de outros tipos textuais.
-    - Não constrói uma argumentação clara e objetiva, resultando em confusão ou desvio do gênero textual.
-
-    Nota 0:
-    - Fuga completa do tema proposto, abordando um assunto irrelevante ou não relacionado.
-    - Não atende à estrutura dissertativo-argumentativa, sendo classificado como outro gênero textual.
-    - Não apresenta proposição, argumentação e conclusão, ou o texto é anulado por não atender aos critérios básicos de desenvolvimento textual.
-
-    Forneça a nota e uma justificativa detalhada, relacionando diretamente com a análise fornecida. Certifique-se de que a justificativa esteja completamente alinhada com a nota atribuída e os critérios específicos.
+def montar_prompt_nota_competency2(analise: str) -> str:
+    """Monta o prompt de atribuição de nota da Competência 2."""
+    return orcamento_tokens.enquadrar("nota", partial(prompts.formatar, "nota_competency2"), analise=analise)
 
-    Formato da resposta:
-    Nota: [NOTA ATRIBUÍDA]
-    Justificativa: [Justificativa detalhada da nota, explicando como cada aspecto da análise se relaciona com os critérios de pontuação]
-    """
-    resposta_nota = generate_rag_response(prompt_nota, [], "competency2")
+def atribuir_nota_competency2(analise: str, erros: List[Dict[str, Any]]) -> Dict[str, Any]:
+    prompt_nota = montar_prompt_nota_competency2(analise)
+    resposta_nota = chamar_rag(prompt_nota, "competency2")
     return extrair_nota_e_justificativa(resposta_nota)
 
-def atribuir_nota_competency3(analise: str, erros: List[Dict[str, Any]]) -> Dict[str, Any]:
-    prompt_nota = f"""
-    Com base na seguinte análise da Competência 3 (Seleção e Organização das Informações) do ENEM, atribua uma nota de 0 a 200 em intervalos de 40 pontos (0, 40, 80, 120, 160 ou 200).
-
-    Análise:
-    {analise}
-
-    Considere cuidadosamente os seguintes critérios para atribuir a nota:
-
-    Nota 200:
-    - Ideias progressivas e argumentos bem selecionados, revelando um planejamento claro do texto.
-    - Apresenta informações, fatos e opiniões relacionados ao tema proposto e aos seus argumentos, de forma consistente e organizada, em defesa de um ponto de vista.
-    - Demonstra autoria, com informações e argumentos originais que reforçam o ponto de vista do aluno.
-    - Mantém o encadeamento das ideias, com cada parágrafo apresentando informações coerentes com o anterior, sem repetições desnecessárias ou saltos temáticos.
-    - Apresenta poucas falhas, e essas falhas não prejudicam a progressão do texto.
-
-    Nota 160:
-    - Apresenta informações, fatos e opiniões relacionados ao tema, de forma organizada, com indícios de autoria em defesa de um ponto de vista.
-    - Ideias claramente organizadas, mas não tão consistentes quanto o esperado para uma argumentação mais sólida.
-    - Organização geral das ideias é boa, mas algumas informações e opiniões não estão bem desenvolvidas.
-
-    Nota 120:
-    - Apresenta informações, fatos e opiniões relacionados ao tema, mas limitados aos argumentos dos textos motivadores e pouco organizados, em defesa de um ponto de vista.
-    - Ideias previsíveis, sem desenvolvimento profundo ou originalidade, com pouca evidência de autoria.
-    - Argumentos simples, sem clara progressão de ideias, e baseado principalmente nas sugestões dos textos motivadores.
-
-    Nota 80:
-    - Apresenta informações, fatos e opiniões relacionados ao tema, mas de forma desorganizada ou contraditória, e limitados aos argumentos dos textos motivadores.
-    - Ideias não estão bem conectadas, demonstrando falta de coerência e organização no desenvolvimento do texto.
-    - Argumentos inconsistentes ou contraditórios, prejudicando a defesa do ponto de vista.
-    - Perde linhas com informações irrelevantes, repetidas ou excessivas.
+def montar_prompt_nota_competency3(analise: str) -> str:
+    """Monta o prompt de atribuição de nota da Competência 3."""
+    return orcamento_tokens.enquadrar("nota", partial(prompts.formatar, "nota_competency3"), analise=analise)
 
-    Nota 40:
-    - Apresenta informações, fatos e opiniões pouco relacionados ao tema, com incoerências, e sem defesa clara de um ponto de vista.
-    - Falta de organização e ideias dispersas, sem desenvolvimento coerente.
-    - Não apresenta um ponto de vista claro, e os argumentos são fracos ou desconexos.
-
-    Nota 0:
-    - Apresenta informações, fatos e opiniões não relacionados ao tema, sem coerência, e sem defesa de um ponto de vista.
-    - Ideias totalmente desconexas, sem organização ou relação com o tema proposto.
-    - Não desenvolve qualquer argumento relevante ou coerente, demonstrando falta de planejamento.
-
-    Forneça a nota e uma justificativa detalhada, relacionando diretamente com a análise fornecida. Certifique-se de que a justificativa esteja completamente alinhada com a nota atribuída e os critérios específicos.
-
-    Formato da resposta:
-    Nota: [NOTA ATRIBUÍDA]
-    Justificativa: [Justificativa detalhada da nota, explicando como cada aspecto da análise se relaciona com os critérios de pontuação]
-    """
-    resposta_nota = generate_rag_response(prompt_nota, [], "competency3")
+def atribuir_nota_competency3(analise: str, erros: List[Dict[str, Any]]) -> Dict[str, Any]:
+    prompt_nota = montar_prompt_nota_competency3(analise)
+    resposta_nota = chamar_rag(prompt_nota, "competency3")
     return extrair_nota_e_justificativa(resposta_nota)
 
-def atribuir_nota_competency4(analise: str, erros: List[Dict[str, Any]]) -> Dict[str, Any]:
-    prompt_nota = f"""
-    Com base na seguinte análise da Competência 4 (Conhecimento dos Mecanismos Linguísticos) do ENEM, atribua uma nota de 0 a 200 em intervalos de 40 pontos (0, 40, 80, 120, 160 ou 200).
-
-    Análise:
-    {analise}
-
-    Considere cuidadosamente os seguintes critérios para atribuir a nota:
-
-    Nota 200:
-    - Utiliza conectivos em todo início de período.
-    - Articula bem as partes do texto e apresenta um repertório diversificado de recursos coesivos, conectando parágrafos e períodos de forma fluida.
-    - Utiliza referenciação adequada, com pronomes, sinônimos e advérbios, garantindo coesão e clareza.
-    - Apresenta transições claras e bem estruturadas entre as ideias de causa/consequência, comparação e conclusão, sem falhas.
-    - Demonstra excelente organização de períodos complexos, com uma articulação eficiente entre orações.
-    - Não repete muitos conectivos ao longo do texto.
-
-    Nota 160:
-    - Deixa de usar uma ou duas vezes conectivos ao longo do texto.
-    - Articula as partes do texto, mas com poucas inadequações ou problemas pontuais na conexão de ideias.
-    - Apresenta um repertório diversificado de recursos coesivos, mas com algumas falhas no uso de pronomes, advérbios ou sinônimos.
-    - As transições entre parágrafos e ideias são adequadas, mas com pequenos deslizes na estruturação dos períodos complexos.
-    - Mantém boa coesão e coerência, mas com algumas falhas na articulação entre causas, consequências e exemplos.
-
-    Nota 120:
-    - Não usa muitos conectivos ao longo dos parágrafos.
-    - Repete várias vezes o mesmo conectivo ao longo do parágrafo.
-    - Articula as partes do texto de forma mediana, apresentando inadequações frequentes na conexão de ideias.
-    - O repertório de recursos coesivos é pouco diversificado, com uso repetitivo de pronomes.
-    - Apresenta transições previsíveis e pouco elaboradas, prejudicando o encadeamento lógico das ideias.
-    - A organização dos períodos é mediana, com algumas orações mal articuladas, comprometendo a fluidez do texto.
-
-    Nota 80:
-    - Articula as partes do texto de forma insuficiente, com muitas inadequações no uso de conectivos e outros recursos coesivos.
-    - O repertório de recursos coesivos é limitado, resultando em repetição excessiva ou uso inadequado de pronomes e advérbios.
-    - Apresenta conexões falhas entre os parágrafos, com transições abruptas e pouco claras entre as ideias.
-    - Os períodos complexos estão mal estruturados, com orações desconectadas ou confusas.
-
-    Nota 40:
-    - Articula as partes do texto de forma precária, com sérias falhas na conexão de ideias.
-    - O repertório de recursos coesivos é praticamente inexistente, sem o uso adequado de pronomes, conectivos ou advérbios.
-    - Apresenta parágrafos desarticulados, sem relação clara entre as ideias.
-    - Os períodos são curtos e desconectados, sem estruturação adequada ou progressão de ideias.
-
-    Nota 0:
-    - Não articula as informações e as ideias parecem desconexas e sem coesão.
-    - O texto não apresenta recursos coesivos, resultando em total falta de conexão entre as partes.
-    - Os parágrafos e períodos são desorganizados, sem qualquer lógica na apresentação das ideias.
-    - O texto não utiliza mecanismos de coesão (pronomes, conectivos, advérbios), tornando-o incompreensível.
-
-    Forneça a nota e uma justificativa detalhada, relacionando diretamente com a análise fornecida. Certifique-se de que a justificativa esteja completamente alinhada com a nota atribuída e os critérios específicos.
+def montar_prompt_nota_competency4(analise: str) -> str:
+    """Monta o prompt de atribuição de nota da Competência 4."""
+    return orcamento_tokens.enquadrar("nota", partial(prompts.formatar, "nota_competency4"), analise=analise)
 
-    Formato da resposta:
-    Nota: [NOTA ATRIBUÍDA]
-    Justificativa: [Justificativa detalhada da nota, explicando como cada aspecto da análise se relaciona com os critérios de pontuação]
-    """
-    resposta_nota = generate_rag_response(prompt_nota, [], "competency4")
+def atribuir_nota_competency4(analise: str, erros: List[Dict[str, Any]]) -> Dict[str, Any]:
+    prompt_nota = montar_prompt_nota_competency4(analise)
+    resposta_nota = chamar_rag(prompt_nota, "competency4")
     return extrair_nota_e_justificativa(resposta_nota)
 
-def atribuir_nota_competency5(analise: str, erros: List[Dict[str, Any]]) -> Dict[str, Any]:
-    prompt_nota = f"""
-    Com base na seguinte análise detalhada da Competência 5 (Proposta de Intervenção) do ENEM, atribua uma nota de 0 a 200 em intervalos de 40 pontos (0, 40, 80, 120, 160 ou 200).
-
-    Análise detalhada:
-    {analise}
-
-    Considere os seguintes critérios para atribuir a nota:
-
-    Nota 200:
-    - Elabora proposta de intervenção completa com todos os 5 elementos (agente, ação, modo/meio, detalhamento e finalidade).
-
-    Nota 160:
-    - Elabora bem a proposta de intervenção, mas com apenas 4 elementos presentes.
-
-    Nota 120:
-    - Elabora uma proposta de intervenção mediana, com apenas 3 elementos presentes.
-
-    Nota 80:
-    - Elabora uma proposta de intervenção insuficiente, com apenas 2 elementos presentes, ou se a proposta for mal articulada ao tema.
+def montar_prompt_nota_competency5(analise: str) -> str:
+    """Monta o prompt de atribuição de nota da Competência 5."""
+    return orcamento_tokens.enquadrar("nota", partial(prompts.formatar, "nota_competency5"), analise=analise)
 
-    Nota 40:
-    - Apresenta uma proposta de intervenção vaga ou precária, apresentando apenas 1 de todos os elementos exigidos.
-
-    Nota 0:
-    - Não apresenta proposta de intervenção ou a proposta é completamente desconectada do tema.
-
-    Formato da resposta:
-    Nota: [NOTA ATRIBUÍDA]
-    Justificativa: [Breve justificativa da nota baseada na análise]
-    """
-    resposta_nota = generate_rag_response(prompt_nota, [], "competency5")
+def atribuir_nota_competency5(analise: str, erros: List[Dict[str, Any]]) -> Dict[str, Any]:
+    prompt_nota = montar_prompt_nota_competency5(analise)
+    resposta_nota = chamar_rag(prompt_nota, "competency5")
     return extrair_nota_e_justificativa(resposta_nota)
 
 def extrair_nota_e_justificativa(resposta: str) -> Dict[str, Any]:
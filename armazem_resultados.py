@@ -0,0 +1,161 @@
+"""
+Armazenamento local (SQLite) dos resultados de correção.
+
+Os resultados de processar_redacao_completa são gravados com a chave
+sha256(texto normalizado + tema), de modo que reabrir uma redação ou recarregar
+a página recupera a nota sem rodar o pipeline de novo. Há índices por aluno,
+data e nota total para consultas do histórico.
+
+A normalização só uniformiza espaços, quebras de linha e a forma Unicode:
+maiúsculas e pontuação afetam a nota da Competência 1 e fazem parte da chave.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import unicodedata
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+ARQUIVO_BANCO = os.getenv("RESULTADOS_DB", os.path.join(".dados", "resultados.sqlite3"))
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS resultados (
+    chave TEXT PRIMARY KEY,
+    hash_texto TEXT NOT NULL,
+    tema TEXT NOT NULL,
+    user_id TEXT,
+    criado_em TEXT NOT NULL,
+    nota_total INTEGER NOT NULL,
+    resultados TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_resultados_user_id ON resultados (user_id, criado_em);
+CREATE INDEX IF NOT EXISTS idx_resultados_criado_em ON resultados (criado_em);
+CREATE INDEX IF NOT EXISTS idx_resultados_nota_total ON resultados (nota_total);
+"""
+
+
+def normalizar_texto(texto: str) -> str:
+    """Uniformiza forma Unicode, quebras de linha e espaços repetidos."""
+    texto = unicodedata.normalize("NFC", texto).replace("\r\n", "\n").replace("\r", "\n")
+    texto = re.sub(r"[ \t\u00a0]+", " ", texto)
+    texto = re.sub(r" *\n *", "\n", texto)
+    texto = re.sub(r"\n{3,}", "\n\n", texto)
+    return texto.strip()
+
+
+def hash_texto(texto: str) -> str:
+    return hashlib.sha256(normalizar_texto(texto).encode("utf-8")).hexdigest()
+
+
+def chave_tema(tema: Any) -> str:
+    tema_normalizado = normalizar_texto(tema if isinstance(tema, str) else json.dumps(tema, sort_keys=True))
+    return hashlib.sha256(tema_normalizado.encode("utf-8")).hexdigest()
+
+
+def chave_redacao(texto: str, tema: Any) -> str:
+    """Chave de busca: hash do texto normalizado combinado com o tema."""
+    return hashlib.sha256(f"{hash_texto(texto)}\x1f{chave_tema(tema)}".encode("utf-8")).hexdigest()
+
+
+class ArmazemResultados:
+    """Resultados de correção em SQLite; seguro para uso entre threads do Streamlit."""
+
+    def __init__(self, caminho: str = ARQUIVO_BANCO):
+        if caminho != ":memory:":
+            os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+        self._conexao = sqlite3.connect(caminho, check_same_thread=False)
+        self._conexao.row_factory = sqlite3.Row
+        self._trava = threading.Lock()
+        with self._trava, self._conexao:
+            self._conexao.execute("PRAGMA journal_mode=WAL")
+            self._conexao.executescript(_ESQUEMA)
+
+    def buscar(self, texto: str, tema: Any) -> Optional[Dict[str, Any]]:
+        """Retorna os resultados gravados para a redação e tema, ou None."""
+        encontrado = self.buscar_com_autor(texto, tema)
+        return encontrado[0] if encontrado else None
+
+    def buscar_com_autor(self, texto: str, tema: Any) -> Optional[Tuple[Dict[str, Any], Optional[str]]]:
+        """Como buscar, mas retorna também o user_id de quem enviou a redação."""
+        with self._trava:
+            linha = self._conexao.execute(
+                "SELECT resultados, user_id FROM resultados WHERE chave = ?", (chave_redacao(texto, tema),)
+            ).fetchone()
+        return (json.loads(linha["resultados"]), linha["user_id"]) if linha else None
+
+    def salvar(self, texto: str, tema: Any, resultados: Dict[str, Any], user_id: Optional[str] = None) -> str:
+        chave = chave_redacao(texto, tema)
+        registro = (
+            chave,
+            hash_texto(texto),
+            tema if isinstance(tema, str) else json.dumps(tema, ensure_ascii=False, sort_keys=True),
+            None if user_id is None else str(user_id),
+            datetime.now().isoformat(),
+            int(resultados.get("nota_total", 0)),
+            json.dumps(resultados, ensure_ascii=False, default=str),
+        )
+        with self._trava, self._conexao:
+            self._conexao.execute("INSERT OR REPLACE INTO resultados VALUES (?, ?, ?, ?, ?, ?, ?)", registro)
+        return chave
+
+    def _listar(self, condicao: str, parametros: tuple, limite: int) -> List[Dict[str, Any]]:
+        with self._trava:
+            linhas = self._conexao.execute(
+                f"SELECT chave, tema, user_id, criado_em, nota_total FROM resultados WHERE {condicao} "
+                "ORDER BY criado_em DESC LIMIT ?", (*parametros, limite)
+            ).fetchall()
+        return [dict(linha) for linha in linhas]
+
+    def listar_por_aluno(self, user_id: str, limite: int = 50) -> List[Dict[str, Any]]:
+        return self._listar("user_id = ?", (str(user_id),), limite)
+
+    def listar_por_periodo(self, inicio: datetime, fim: datetime, limite: int = 500) -> List[Dict[str, Any]]:
+        return self._listar("criado_em BETWEEN ? AND ?", (inicio.isoformat(), fim.isoformat()), limite)
+
+    def listar_por_nota(self, minima: int = 0, maxima: int = 1000, limite: int = 500) -> List[Dict[str, Any]]:
+        return self._listar("nota_total BETWEEN ? AND ?", (minima, maxima), limite)
+
+    def carregar(self, chave: str) -> Optional[Dict[str, Any]]:
+        with self._trava:
+            linha = self._conexao.execute("SELECT resultados FROM resultados WHERE chave = ?", (chave,)).fetchone()
+        return json.loads(linha["resultados"]) if linha else None
+
+    def iterar_redacoes(self) -> Iterator[Tuple[str, str, Optional[str], str]]:
+        """Percorre (chave, tema, user_id, texto original) de todas as redações gravadas."""
+        with self._trava:
+            linhas = self._conexao.execute("SELECT chave, tema, user_id, resultados FROM resultados").fetchall()
+        for linha in linhas:
+            texto = json.loads(linha["resultados"]).get("texto_original")
+            if texto:
+                yield linha["chave"], linha["tema"], linha["user_id"], texto
+
+    def fechar(self):
+        with self._trava:
+            self._conexao.close()
+
+
+_armazem: Optional[ArmazemResultados] = None
+_trava_armazem = threading.Lock()
+
+
+def obter_armazem() -> ArmazemResultados:
+    """Retorna o armazém do processo, aberto em ARQUIVO_BANCO na primeira chamada."""
+    global _armazem
+    with _trava_armazem:
+        if _armazem is None:
+            _armazem = ArmazemResultados()
+        return _armazem
+
+
+def configurar(caminho: str) -> ArmazemResultados:
+    """Troca o armazém do processo por um aberto em `caminho` (benchmark, testes)."""
+    global _armazem
+    with _trava_armazem:
+        _armazem = ArmazemResultados(caminho)
+        return _armazem
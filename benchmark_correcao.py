@@ -0,0 +1,476 @@
+"""
+Benchmark ponta a ponta do pipeline de correção.
+
+Executa processar_redacao_completa, as funções de revisão e o GeradorConteudo
+sobre um corpus fixo de redações, contra o servidor OpenAI mock local (ou um
+servidor compatível informado em --base-url), e relata throughput, latência
+p50/p95/p99 e chamadas de modelo por redação.
+
+Uso:
+    python benchmark_correcao.py
+    python benchmark_correcao.py --latencia-ms 300 --variacao-ms 100 --taxa-erro 0.02 --concorrencia 4
+    python benchmark_correcao.py --cenarios pipeline --repeticoes 3 --saida resultado.json
+    python benchmark_correcao.py --contexto-revisao completo
+    python benchmark_correcao.py --comparar-contexto --base-url https://api.openai.com/v1
+    python benchmark_correcao.py --comparar-fundido --base-url https://api.openai.com/v1
+    python benchmark_correcao.py --comparar-regra-comp1
+
+Toda mudança de desempenho no pipeline deve vir acompanhada da comparação
+deste relatório antes e depois.
+
+--comparar-contexto revisa um conjunto fixo de erros com cada política de
+contexto dos prompts de revisão e relata tokens de entrada e a concordância
+das decisões com a política "completo". Contra o mock as decisões são
+sorteadas; a concordância só é significativa com um modelo real (--base-url).
+
+--comparar-fundido corrige o corpus no fluxo de várias chamadas e no modo
+fundido (CHAMADA_FUNDIDA, uma geração por competência com erros, análise e
+nota) e relata chamadas, latência e a concordância das notas por competência.
+
+--comparar-regra-comp1 corrige a Competência 1 de cada redação do corpus e
+relata a nota base e a nota final com a contagem de erros anterior (que lia a
+chave 'explicacao', ausente nos erros, e deixava a base sempre em 200) e com a
+atual, que classifica os erros pela explicação. Contra o mock as explicações
+revisadas não citam categoria; as colunas dos erros conhecidos de cada redação
+(ERROS_CONTEXTO) mostram a regra sobre explicações reais.
+"""
+import argparse
+import copy
+import json
+import math
+import os
+import re
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from openai import OpenAI
+
+import analysis_function as af
+import armazem_resultados
+import cache_deteccao
+import custos
+import nota_especulativa
+import persistencia
+import rastreamento
+import tarefas_correcao
+from editor import BancoQuestoesEnem, GeradorConteudo
+from persistencia import EscritorMemoria
+from indice_texto import POLITICAS_CONTEXTO
+from servidor_openai_mock import ConfiguracaoMock, ServidorOpenAIMock
+
+TEMA_BENCHMARK = "Desafios para a valorização de comunidades e povos tradicionais no Brasil"
+
+CORPUS_REDACOES = [
+    (
+        "No Brasil, os povos tradicionais enfrenta diversos desafios para preservar sua cultura. "
+        "A Constituição de 1988 garante direitos a essas comunidades, porém, na pratica, muitos desses "
+        "direitos não são respeitados.\n\n"
+        "Em primeiro lugar, a falta de demarcação de terras contribui para os conflitos no campo. "
+        "Segundo o filósofo Aristóteles, a política deve buscar o bem comum, o que não ocorre quando "
+        "interesses econômicos se sobrepõe à vida das comunidades.\n\n"
+        "Além disso, o preconceito afeta a valorização desses povos. Muitas pessoas desconhece a "
+        "importância dos saberes tradicionais para a preservação ambiental.\n\n"
+        "Portanto, o Governo Federal deve, por meio da Funai, acelerar a demarcação de terras, a fim "
+        "de garantir a sobrevivência dessas comunidades. Ademais, as escolas devem promover palestras "
+        "sobre a cultura dos povos tradicionais."
+    ),
+    (
+        "A valorização das comunidades tradicionais é um tema urgente na sociedade brasileira. "
+        "Quilombolas, indígenas e ribeirinhos contribuem para a diversidade cultural do país, mas "
+        "ainda são invisibilizados.\n\n"
+        "Nesse contexto, a ausência de políticas públicas efetivas agrava a vulnerabilidade dessas "
+        "populações. Conforme dados do IBGE, grande parte das comunidades quilombolas não tem acesso "
+        "a saneamento básico.\n\n"
+        "Outrossim, a mídia raramente retrata esses povos de forma positiva, o que reforça estereótipos. "
+        "Como afirma Djamila Ribeiro, é preciso ouvir quem historicamente foi silenciado.\n\n"
+        "Dessa forma, cabe ao Ministério da Cultura, em parceria com as emissoras, criar campanhas que "
+        "valorizem esses saberes, com o objetivo de combater o preconceito e fortalecer a identidade "
+        "dessas comunidades."
+    ),
+    (
+        "Os povos tradicionais sofre com a falta de reconhecimento. Isso acontece a muito tempo e "
+        "ninguem faz nada.\n\n"
+        "As empresas invadem as terras e destroem a natureza. O governo não fiscaliza direito e as "
+        "comunidades fica sem proteção.\n\n"
+        "Então o governo tem que fazer alguma coisa para ajudar esses povos."
+    ),
+]
+
+ERROS_FIXOS = [
+    {
+        "descrição": "Erro de concordância verbal",
+        "trecho": "os povos tradicionais enfrenta",
+        "explicação": "O verbo deve concordar com o sujeito plural.",
+        "sugestão": "os povos tradicionais enfrentam",
+    },
+    {
+        "descrição": "Erro de acentuação",
+        "trecho": "na pratica",
+        "explicação": "A palavra 'prática' é proparoxítona e deve ser acentuada.",
+        "sugestão": "na prática",
+    },
+]
+
+
+# Erros conhecidos do corpus usados na comparação de políticas de contexto
+ERROS_CONTEXTO = ERROS_FIXOS + [
+    {
+        "descrição": "Erro de concordância nominal",
+        "trecho": "se sobrepõe à vida",
+        "explicação": "O verbo deve concordar com o sujeito plural 'interesses econômicos'.",
+        "sugestão": "se sobrepõem à vida",
+    },
+    {
+        "descrição": "Erro de concordância verbal",
+        "trecho": "Os povos tradicionais sofre",
+        "explicação": "O verbo deve concordar com o sujeito plural.",
+        "sugestão": "Os povos tradicionais sofrem",
+    },
+    {
+        "descrição": "Uso indevido de 'a' em expressão de tempo decorrido",
+        "trecho": "a muito tempo",
+        "explicação": "Tempo decorrido se indica com o verbo haver.",
+        "sugestão": "há muito tempo",
+    },
+    {
+        "descrição": "Erro de acentuação",
+        "trecho": "ninguem",
+        "explicação": "A palavra 'ninguém' é oxítona terminada em -em e deve ser acentuada.",
+        "sugestão": "ninguém",
+    },
+]
+
+
+def metricas_textuais(texto: str) -> Dict[str, float]:
+    """Aproximação das métricas Coh-Metrix usadas nos prompts das Competências 2-5."""
+    palavras = re.findall(r"\w+", texto.lower())
+    sentencas = [s for s in re.split(r"[.!?]+", texto) if s.strip()]
+    paragrafos = [p for p in texto.split("\n\n") if p.strip()]
+    conectivos = {"porém", "além", "portanto", "dessa", "outrossim", "ademais", "conforme", "então", "nesse"}
+    return {
+        "Word Count": len(palavras),
+        "Sentence Count": len(sentencas),
+        "Unique Words": len(set(palavras)),
+        "Lexical Diversity": round(len(set(palavras)) / max(1, len(palavras)), 3),
+        "Paragraph Count": len(paragrafos),
+        "Sentences per Paragraph": round(len(sentencas) / max(1, len(paragrafos)), 2),
+        "Connectives": sum(1 for p in palavras if p in conectivos),
+        "Noun Phrases": len(palavras) // 4,
+        "Verb Phrases": len(palavras) // 6,
+        "Words per Sentence": round(len(palavras) / max(1, len(sentencas)), 2),
+    }
+
+
+def preparar_ambiente(client: OpenAI):
+    """
+    Aponta o pipeline para `client` e preenche as dependências que a aplicação
+    injeta em produção (RAG e métricas textuais) quando ausentes. A persistência
+    vai para destinos em memória, e o armazém de resultados (com o índice de
+    duplicatas), os checkpoints, o cache de detecção, o uso diário e o placar
+    da especulação para um diretório temporário: nada do mock entra nos
+    arquivos de produção.
+    """
+    af.client = client
+    if not hasattr(af, "competencies"):
+        af.competencies = {f"competency{i}": "" for i in range(1, 6)}
+    if not hasattr(af, "retrieve_relevant_docs"):
+        af.retrieve_relevant_docs = lambda consulta: [f"Documento de referência: {consulta}"]
+    if not hasattr(af, "generate_rag_response"):
+        af.generate_rag_response = lambda prompt, docs, chave: af.chamar_modelo(
+            "gpt-4o", "\n".join(map(str, docs)) + "\n\n" + prompt, 0.3, chave
+        )
+    persistencia.configurar([EscritorMemoria("elasticsearch"), EscritorMemoria("supabase")], arquivo_spool=None)
+    dados = tempfile.mkdtemp(prefix="benchmark_correcao_")
+    armazem_resultados.configurar(os.path.join(dados, "resultados.sqlite3"))
+    tarefas_correcao.configurar(os.path.join(dados, "tarefas.sqlite3"))
+    cache_deteccao.configurar(os.path.join(dados, "cache_deteccao.sqlite3"))
+    custos.ARQUIVO_USO_DIARIO = os.path.join(dados, "uso_diario.json")
+    nota_especulativa.ARQUIVO_PLACAR = os.path.join(dados, "especulacao.json")
+    # Métricas fixas: cohmetrix_results é global no módulo e seria disputado entre threads
+    metricas = [metricas_textuais(texto) for texto in CORPUS_REDACOES]
+    af.cohmetrix_results = {chave: round(statistics.mean(m[chave] for m in metricas), 2) for chave in metricas[0]}
+
+
+def cenario_pipeline(texto: str, client: OpenAI):
+    # Como processar_redacao_completa, mas sem reaproveitar correções (armazém, duplicatas,
+    # coalescência, checkpoints): toda passada do corpus mede a correção inteira
+    resultados, _ = af.executar_pipeline(texto, TEMA_BENCHMARK, reaproveitar=False)
+    af.persistir_resultados(texto, TEMA_BENCHMARK, resultados, None)
+
+
+def cenario_revisao(texto: str, client: OpenAI):
+    af.revisar_erros_competency1(ERROS_FIXOS, texto)
+    af.revisar_erros_generico(ERROS_FIXOS, texto, af.MODELO_REVISAO_COMP2, af.NOMES_COMPETENCIAS["competency2"])
+
+
+def cenario_gerador(texto: str, client: OpenAI):
+    banco = BancoQuestoesEnem()
+    gerador = GeradorConteudo(client)
+    questoes = banco.get_questoes_por_tema("Gêneros Textuais")
+    gerador.gerar_material_estudo("Gêneros Textuais", questoes[:3])
+    gerador.gerar_dicas_resolucao(questoes[0])
+
+
+CENARIOS: Dict[str, Callable[[str, OpenAI], None]] = {
+    "pipeline": cenario_pipeline,
+    "revisao": cenario_revisao,
+    "gerador": cenario_gerador,
+}
+
+
+def percentil(valores: List[float], p: float) -> float:
+    ordenados = sorted(valores)
+    if not ordenados:
+        return 0.0
+    indice = max(0, min(len(ordenados) - 1, math.ceil(p / 100 * len(ordenados)) - 1))
+    return ordenados[indice]
+
+
+def executar_cenario(nome: str, client: OpenAI, repeticoes: int, concorrencia: int,
+                     servidor: Optional[ServidorOpenAIMock] = None) -> Dict[str, Any]:
+    funcao = CENARIOS[nome]
+    itens = CORPUS_REDACOES * repeticoes
+    latencias: List[float] = []
+    falhas = 0
+
+    def medir(texto: str):
+        inicio = time.perf_counter()
+        funcao(texto, client)
+        return time.perf_counter() - inicio
+
+    if servidor:
+        servidor.zerar_contadores()
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concorrencia) as executor:
+        for futuro in [executor.submit(medir, texto) for texto in itens]:
+            try:
+                latencias.append(futuro.result())
+            except Exception as e:
+                falhas += 1
+                print(f"[{nome}] falha: {e}")
+    duracao = time.perf_counter() - inicio
+
+    return {
+        "cenario": nome,
+        "redacoes": len(itens),
+        "falhas": falhas,
+        "concorrencia": concorrencia,
+        "duracao_s": round(duracao, 3),
+        "throughput_por_min": round(len(latencias) / duracao * 60, 2) if duracao else 0.0,
+        "p50_s": round(percentil(latencias, 50), 3),
+        "p95_s": round(percentil(latencias, 95), 3),
+        "p99_s": round(percentil(latencias, 99), 3),
+        "chamadas_por_redacao": round(servidor.total_chamadas() / len(itens), 2) if servidor else None,
+        "chamadas_por_tipo": dict(servidor.chamadas) if servidor else None,
+        "tokens_prompt_revisao_por_redacao": (
+            round(servidor.tokens_prompt.get("revisao", 0) / len(itens), 1) if servidor else None
+        ),
+    }
+
+
+def comparar_politicas_contexto() -> List[Dict[str, Any]]:
+    """Revisa ERROS_CONTEXTO com cada política e compara tokens e decisões com "completo"."""
+    casos = [(texto, erro) for texto in CORPUS_REDACOES for erro in ERROS_CONTEXTO if erro["trecho"] in texto]
+    nome_comp2 = af.NOMES_COMPETENCIAS["competency2"]
+    prompts = {
+        politica: [p for texto, erro in casos for p in (
+            af.montar_prompt_revisao_competency1(dict(erro), texto, politica=politica)[0],
+            af.montar_prompt_revisao_generico(dict(erro), texto, nome_comp2, politica=politica),
+        )]
+        for politica in POLITICAS_CONTEXTO
+    }
+    modelos = [af.MODELO_REVISAO_COMP1, af.MODELO_REVISAO_COMP2] * len(casos)
+
+    decisoes = {}
+    for politica, lista in prompts.items():
+        decisoes[politica] = [
+            af.extrair_revisao_do_resultado(af.chamar_modelo(modelo, prompt, 0.0, "revisao:erro")).get("Erro Confirmado")
+            for modelo, prompt in zip(modelos, lista)
+        ]
+
+    tokens_completo = sum(len(p) // 4 for p in prompts["completo"])
+    relatorio = []
+    for politica, lista in prompts.items():
+        tokens = sum(len(p) // 4 for p in lista)
+        concordancia = statistics.mean(a == b for a, b in zip(decisoes[politica], decisoes["completo"]))
+        relatorio.append({
+            "politica": politica,
+            "revisoes": len(lista),
+            "tokens_prompt_medio": round(tokens / len(lista), 1),
+            "reducao_vs_completo": f"{(1 - tokens / tokens_completo) * 100:.1f}%",
+            "concordancia_com_completo": round(concordancia, 3),
+        })
+    return relatorio
+
+
+def notas_sem_armazem(texto: str) -> Dict[str, int]:
+    """
+    Corrige todas as competências como processar_redacao_completa, mas sem o
+    armazém local nem a detecção de duplicatas, que reaproveitariam a primeira
+    correção na segunda passada do corpus.
+    """
+    notas = {}
+    for comp in af.competencies:
+        with rastreamento.span(comp, competencia=comp):
+            analise = getattr(af, f"analisar_{comp}")(texto, TEMA_BENCHMARK, af.cohmetrix_results)
+            nota = analise.get("nota") or getattr(af, f"atribuir_nota_{comp}")(analise["analise"], analise["erros"])
+        notas[comp] = nota["nota"]
+    return notas
+
+
+def comparar_chamada_fundida(repeticoes: int, servidor: Optional[ServidorOpenAIMock] = None) -> List[Dict[str, Any]]:
+    """A/B do modo fundido contra o fluxo de várias chamadas, sobre o mesmo corpus."""
+    itens = CORPUS_REDACOES * repeticoes
+    modo_original = af.CHAMADA_FUNDIDA
+    medicoes = {}
+    try:
+        for fundido in (False, True):
+            af.CHAMADA_FUNDIDA = fundido
+            if servidor:
+                servidor.zerar_contadores()
+            latencias, notas = [], []
+            for texto in itens:
+                inicio = time.perf_counter()
+                notas.append(notas_sem_armazem(texto))
+                latencias.append(time.perf_counter() - inicio)
+            chamadas = round(servidor.total_chamadas() / len(itens), 2) if servidor else None
+            medicoes[fundido] = (latencias, notas, chamadas)
+    finally:
+        af.CHAMADA_FUNDIDA = modo_original
+
+    _, notas_referencia, _ = medicoes[False]
+    relatorio = []
+    for fundido, (latencias, notas, chamadas) in medicoes.items():
+        linha = {
+            "modo": "fundido" if fundido else "varias_chamadas",
+            "redacoes": len(itens),
+            "chamadas_por_redacao": chamadas,
+            "p50_s": round(percentil(latencias, 50), 3),
+            "p95_s": round(percentil(latencias, 95), 3),
+        }
+        for comp in af.competencies:
+            pares = [(a[comp], b[comp]) for a, b in zip(notas, notas_referencia)]
+            linha[f"{comp}_iguais"] = round(statistics.mean(a == b for a, b in pares), 3)
+        linha["total_ate_40"] = round(statistics.mean(
+            abs(sum(a.values()) - sum(b.values())) <= 40 for a, b in zip(notas, notas_referencia)
+        ), 3)
+        relatorio.append(linha)
+    return relatorio
+
+
+def contagem_anterior_competency1(erros: List[Dict[str, Any]]) -> Dict[str, int]:
+    """Contagem de erros da Competência 1 antes da correção da chave: nenhum erro caía em categoria."""
+    return dict.fromkeys(af.contar_erros_competency1([]), 0)
+
+
+def comparar_regra_competency1() -> List[Dict[str, Any]]:
+    """
+    Nota base e nota final da Competência 1 de cada redação, com a contagem anterior e a atual.
+
+    As duas notas saem da mesma correção: a nota do modelo é ajustada pelas duas notas
+    base, então só a regra muda entre as colunas. Com a contagem anterior o prompt de
+    nota também listava os erros sem explicação; contra o mock a resposta é a mesma,
+    com um modelo real (--base-url) pode não ser.
+    """
+    ajustar = af.ajustar_nota_competency1
+    base_anterior = af.calcular_nota_base_competency1(contagem_anterior_competency1([]))
+    ajustes: Dict[str, int] = {}
+
+    def ajustar_pelas_duas_regras(resultado: Dict[str, Any], nota_base: int) -> Dict[str, Any]:
+        ajustes.update(nota_base=nota_base, nota_anterior=ajustar(copy.deepcopy(resultado), base_anterior)["nota"])
+        return ajustar(resultado, nota_base)
+
+    relatorio = []
+    af.ajustar_nota_competency1 = ajustar_pelas_duas_regras
+    try:
+        for i, texto in enumerate(CORPUS_REDACOES):
+            conhecidos = [erro for erro in ERROS_CONTEXTO if erro["trecho"] in texto]
+            with rastreamento.span("competency1", competencia="competency1"):
+                analise = af.analisar_competency1(texto, TEMA_BENCHMARK, af.cohmetrix_results)
+                nota = analise.get("nota") or af.atribuir_nota_competency1(analise["analise"], analise["erros"])
+            relatorio.append({
+                "redacao": i,
+                "erros": len(analise["erros"]),
+                "nota_base_antes": base_anterior,
+                "nota_base_depois": ajustes["nota_base"],
+                "nota_antes": ajustes["nota_anterior"],
+                "nota_depois": nota["nota"],
+                "erros_conhecidos": len(conhecidos),
+                "base_conhecidos_antes": af.calcular_nota_base_competency1(contagem_anterior_competency1(conhecidos)),
+                "base_conhecidos_depois": af.calcular_nota_base_competency1(af.contar_erros_competency1(conhecidos)),
+            })
+    finally:
+        af.ajustar_nota_competency1 = ajustar
+    return relatorio
+
+
+def imprimir_relatorio(relatorio: List[Dict[str, Any]], colunas: Optional[List[str]] = None):
+    colunas = colunas or ["cenario", "redacoes", "falhas", "throughput_por_min", "p50_s", "p95_s", "p99_s",
+                          "chamadas_por_redacao", "tokens_prompt_revisao_por_redacao"]
+    print(" | ".join(f"{c:>20}" for c in colunas))
+    for linha in relatorio:
+        print(" | ".join(f"{str(linha[c]):>20}" for c in colunas))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ponta a ponta da correção de redações")
+    parser.add_argument("--cenarios", nargs="+", choices=list(CENARIOS), default=list(CENARIOS))
+    parser.add_argument("--repeticoes", type=int, default=1, help="Quantas vezes percorrer o corpus")
+    parser.add_argument("--concorrencia", type=int, default=1)
+    parser.add_argument("--base-url", help="Usa um servidor externo em vez do mock local")
+    parser.add_argument("--latencia-ms", type=float, default=50.0)
+    parser.add_argument("--variacao-ms", type=float, default=0.0)
+    parser.add_argument("--taxa-erro", type=float, default=0.0)
+    parser.add_argument("--erros-por-deteccao", type=int, default=2)
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--contexto-revisao", choices=POLITICAS_CONTEXTO,
+                        help="Usa esta política de contexto na revisão de todas as competências")
+    parser.add_argument("--comparar-contexto", action="store_true",
+                        help="Compara as políticas de contexto da revisão em vez de rodar os cenários")
+    parser.add_argument("--comparar-fundido", action="store_true",
+                        help="Compara o modo fundido (uma chamada por competência) com o fluxo de várias chamadas")
+    parser.add_argument("--comparar-regra-comp1", action="store_true",
+                        help="Compara a nota da Competência 1 com a contagem de erros anterior e a atual")
+    parser.add_argument("--saida", help="Grava o relatório em JSON neste arquivo")
+    args = parser.parse_args()
+
+    servidor = None
+    if args.base_url:
+        client = OpenAI(base_url=args.base_url)
+    else:
+        config = ConfiguracaoMock(latencia_ms=args.latencia_ms, variacao_ms=args.variacao_ms,
+                                  taxa_erro=args.taxa_erro, erros_por_deteccao=args.erros_por_deteccao,
+                                  semente=args.semente)
+        servidor = ServidorOpenAIMock(config).iniciar()
+        # Sem retentativas do SDK: as retentativas medidas são as do pipeline
+        client = OpenAI(base_url=servidor.base_url, api_key="mock", max_retries=0)
+
+    preparar_ambiente(client)
+    if args.contexto_revisao:
+        af.POLITICAS_CONTEXTO_REVISAO = {comp: args.contexto_revisao for comp in af.POLITICAS_CONTEXTO_REVISAO}
+    try:
+        if args.comparar_contexto:
+            relatorio = comparar_politicas_contexto()
+        elif args.comparar_fundido:
+            relatorio = comparar_chamada_fundida(args.repeticoes, servidor)
+        elif args.comparar_regra_comp1:
+            relatorio = comparar_regra_competency1()
+        else:
+            relatorio = [executar_cenario(nome, client, args.repeticoes, args.concorrencia, servidor)
+                         for nome in args.cenarios]
+    finally:
+        if servidor:
+            servidor.parar()
+
+    comparacao = args.comparar_contexto or args.comparar_fundido or args.comparar_regra_comp1
+    imprimir_relatorio(relatorio, list(relatorio[0]) if comparacao else None)
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as arquivo:
+            json.dump(relatorio, arquivo, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""
+Micro-benchmarks dos trechos executados por redação e por erro.
+
+Mede tempo por chamada e alocações (tracemalloc) de:
+    - extrair_erros_do_resultado
+    - extrair_revisao_do_resultado
+    - extrair_nota_e_justificativa
+    - classificar_erros_competency1 (classificação por palavras-chave)
+    - contar_erros_competency1 + calcular_nota_base_competency1
+
+As entradas são respostas sintéticas grandes, com centenas de blocos ERRO e
+linhas malformadas. O resultado é comparado com uma baseline gravada em JSON;
+o script termina com código 1 se algum caso regredir além da tolerância, e com
+código 2 se não houver baseline para comparar (arquivo ausente ou caso que não
+está nela): a baseline é por máquina e precisa ser gravada antes do primeiro uso.
+
+Uso:
+    python benchmark_parsing.py --atualizar-baseline   # grava a baseline desta máquina
+    python benchmark_parsing.py                        # compara com a baseline
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import timeit
+import tracemalloc
+from typing import Any, Callable, Dict, List, Tuple
+
+import analysis_function as af
+
+ARQUIVO_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_parsing_baseline.json")
+
+TOLERANCIA_TEMPO = 0.25
+TOLERANCIA_MEMORIA = 0.10
+
+EXPLICACOES = [
+    "O verbo não concorda com o sujeito da oração.",
+    "Falta acento na palavra proparoxítona, erro de ortografia.",
+    "A vírgula separa sujeito e predicado, erro de pontuação.",
+    "Há crase indevida: não existe artigo definido feminino após a preposição.",
+    "Uso de registro coloquial inadequado ao texto dissertativo.",
+    "A estrutura sintática do período está truncada.",
+    "Poderia ser reescrito para maior clareza, sugestão de estilo.",
+]
+
+
+def gerar_resposta_deteccao(blocos: int, semente: int = 7) -> str:
+    """Resposta de detecção com `blocos` erros, blocos incompletos e linhas sem formato."""
+    aleatorio = random.Random(semente)
+    partes = ["Análise Geral: O texto apresenta diversos desvios.", "linha solta sem dois pontos"]
+    for i in range(blocos):
+        partes.append(
+            "ERRO\n"
+            f"Descrição: Desvio número {i} de {aleatorio.choice(['concordância', 'crase', 'ortografia', 'pontuação'])}\n"
+            f"Trecho: \"trecho de exemplo {i} com: dois pontos\"\n"
+            f"Explicação: {aleatorio.choice(EXPLICACOES)}\n"
+            "Sugestão: Corrigir conforme a norma-padrão.\n"
+            "linha malformada dentro do bloco\n"
+            "FIM_ERRO"
+        )
+        if i % 10 == 0:
+            partes.append("ERRO\nTrecho: \"bloco sem descrição\"\nFIM_ERRO")
+        if i % 25 == 0:
+            partes.append("ERRO\nDescrição: bloco sem fim")
+    return "\n".join(partes)
+
+
+def gerar_resposta_revisao(linhas_extras: int) -> str:
+    linhas = [
+        "REVISAO",
+        "Erro Confirmado: Sim",
+        "Análise Sintática: O termo exerce função sintática de complemento: objeto indireto.",
+        "Regra Aplicável: Regência verbal.",
+        "Explicação Revisada: " + "explicação detalhada " * 20,
+        "Sugestão Revisada: Ajustar a regência.",
+        "Considerações ENEM: Desvio relevante.",
+    ]
+    linhas += [f"Observação {i}: comentário adicional sem impacto" for i in range(linhas_extras)]
+    linhas += ["texto livre sem formato"] * linhas_extras
+    return "\n".join(linhas + ["FIM_REVISAO"])
+
+
+def gerar_resposta_nota(linhas_justificativa: int) -> str:
+    linhas = ["Algum preâmbulo do modelo.", "Nota: 160", "Justificativa:"]
+    linhas += [f"Parágrafo {i} da justificativa relacionando a análise aos critérios." for i in range(linhas_justificativa)]
+    return "\n".join(linhas)
+
+
+def montar_casos() -> Dict[str, Tuple[Callable[[], Any], int]]:
+    """Retorna nome -> (função sem argumentos, número de execuções por medição)."""
+    deteccao_grande = gerar_resposta_deteccao(500)
+    deteccao_media = gerar_resposta_deteccao(50)
+    revisao = gerar_resposta_revisao(200)
+    nota = gerar_resposta_nota(300)
+    erros = af.extrair_erros_do_resultado(deteccao_grande)
+
+    return {
+        "extrair_erros_500_blocos": (lambda: af.extrair_erros_do_resultado(deteccao_grande), 20),
+        "extrair_erros_50_blocos": (lambda: af.extrair_erros_do_resultado(deteccao_media), 200),
+        "extrair_revisao": (lambda: af.extrair_revisao_do_resultado(revisao), 500),
+        "extrair_nota_e_justificativa": (lambda: af.extrair_nota_e_justificativa(nota), 500),
+        "classificar_erros_competency1": (lambda: af.classificar_erros_competency1(erros), 50),
+        "contar_erros_competency1": (
+            lambda: af.calcular_nota_base_competency1(af.contar_erros_competency1(erros)), 200
+        ),
+    }
+
+
+def medir(funcao: Callable[[], Any], execucoes: int, repeticoes: int = 5) -> Dict[str, float]:
+    """Melhor tempo por chamada entre `repeticoes` medições e alocações de uma chamada."""
+    funcao()  # aquecimento
+    tempos = timeit.repeat(funcao, number=execucoes, repeat=repeticoes)
+
+    tracemalloc.start()
+    inicio, _ = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    funcao()
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "us_por_chamada": round(min(tempos) / execucoes * 1e6, 2),
+        "pico_kib": round((pico - inicio) / 1024, 2),
+    }
+
+
+def comparar(atual: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]],
+             tolerancia_tempo: float, tolerancia_memoria: float) -> List[str]:
+    regressoes = []
+    for caso, medida in atual.items():
+        referencia = baseline.get(caso)
+        if not referencia:
+            continue
+        if medida["us_por_chamada"] > referencia["us_por_chamada"] * (1 + tolerancia_tempo):
+            regressoes.append(f"{caso}: tempo {referencia['us_por_chamada']} -> {medida['us_por_chamada']} us")
+        if medida["pico_kib"] > referencia["pico_kib"] * (1 + tolerancia_memoria) + 1:
+            regressoes.append(f"{caso}: memória {referencia['pico_kib']} -> {medida['pico_kib']} KiB")
+    return regressoes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks de parsing e nota por regras")
+    parser.add_argument("--baseline", default=ARQUIVO_BASELINE)
+    parser.add_argument("--atualizar-baseline", action="store_true")
+    parser.add_argument("--tolerancia-tempo", type=float, default=TOLERANCIA_TEMPO)
+    parser.add_argument("--tolerancia-memoria", type=float, default=TOLERANCIA_MEMORIA)
+    parser.add_argument("--casos", nargs="*", help="Executa apenas os casos indicados")
+    args = parser.parse_args()
+
+    casos = montar_casos()
+    if args.casos:
+        casos = {nome: casos[nome] for nome in args.casos}
+
+    atual = {}
+    for nome, (funcao, execucoes) in casos.items():
+        atual[nome] = medir(funcao, execucoes)
+        print(f"{nome:>32}: {atual[nome]['us_por_chamada']:>10} us/chamada  {atual[nome]['pico_kib']:>9} KiB")
+
+    if args.atualizar_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as arquivo:
+            json.dump(atual, arquivo, indent=2)
+        print(f"Baseline gravada em {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"Baseline inexistente em {args.baseline}; rode com --atualizar-baseline para criá-la.", file=sys.stderr)
+        sys.exit(2)
+
+    with open(args.baseline, encoding="utf-8") as arquivo:
+        baseline = json.load(arquivo)
+    ausentes = sorted(set(atual) - set(baseline))
+    if ausentes:
+        print(f"Casos sem baseline: {', '.join(ausentes)}; rode com --atualizar-baseline.", file=sys.stderr)
+        sys.exit(2)
+    regressoes = comparar(atual, baseline, args.tolerancia_tempo, args.tolerancia_memoria)
+    if regressoes:
+        print("Regressões em relação à baseline:")
+        for regressao in regressoes:
+            print(f"  - {regressao}")
+        sys.exit(1)
+    print("Sem regressões em relação à baseline.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Cache persistente de detecção de erros da Competência 1 por sentença.
+
+No modo por sentença (DETECCAO_COMP1_POR_SENTENCA=1) a redação é dividida em
+sentenças e cada critério de detecção só envia ao modelo as sentenças que não
+estão no cache, todas num único prompt. Os erros devolvidos são atribuídos à
+sentença que contém o trecho e gravados por sentença normalizada, de modo que
+sentenças comuns (modelos de redação, citações, repertório decorado) nunca são
+analisadas duas vezes.
+
+A chave inclui modelo, critério e um hash do prompt do critério: mudar o prompt
+ou o modelo invalida o cache naturalmente.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from armazem_resultados import normalizar_texto
+
+ARQUIVO_CACHE = os.getenv("CACHE_DETECCAO_DB", os.path.join(".dados", "cache_deteccao.sqlite3"))
+
+
+def chave_sentenca(sentenca: str, criterio: str, modelo: str, versao_prompt: str) -> str:
+    bruto = "\x1f".join((modelo, criterio, versao_prompt, normalizar_texto(sentenca)))
+    return hashlib.sha256(bruto.encode("utf-8")).hexdigest()
+
+
+class CacheDeteccao:
+    """Erros detectados por sentença e critério, em SQLite."""
+
+    def __init__(self, caminho: str = ARQUIVO_CACHE):
+        if caminho != ":memory:":
+            os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+        self._conexao = sqlite3.connect(caminho, check_same_thread=False)
+        self._trava = threading.Lock()
+        with self._trava, self._conexao:
+            self._conexao.execute("PRAGMA journal_mode=WAL")
+            self._conexao.execute(
+                "CREATE TABLE IF NOT EXISTS deteccoes ("
+                "chave TEXT PRIMARY KEY, criterio TEXT NOT NULL, erros TEXT NOT NULL, criado_em TEXT NOT NULL)"
+            )
+
+    def buscar(self, chaves: Iterable[str]) -> Dict[str, List[Dict[str, str]]]:
+        chaves = list(dict.fromkeys(chaves))
+        encontrados: Dict[str, List[Dict[str, str]]] = {}
+        with self._trava:
+            # Limite de variáveis por consulta do SQLite
+            for i in range(0, len(chaves), 500):
+                parte = chaves[i:i + 500]
+                linhas = self._conexao.execute(
+                    f"SELECT chave, erros FROM deteccoes WHERE chave IN ({','.join('?' * len(parte))})", parte
+                ).fetchall()
+                encontrados.update((chave, json.loads(erros)) for chave, erros in linhas)
+        return encontrados
+
+    def gravar(self, criterio: str, erros_por_chave: Dict[str, List[Dict[str, str]]]):
+        agora = datetime.now().isoformat()
+        registros = [(chave, criterio, json.dumps(erros, ensure_ascii=False), agora)
+                     for chave, erros in erros_por_chave.items()]
+        with self._trava, self._conexao:
+            self._conexao.executemany("INSERT OR REPLACE INTO deteccoes VALUES (?, ?, ?, ?)", registros)
+
+
+def atribuir_erros_a_sentencas(erros: List[Dict[str, str]], sentencas: List[str]
+                               ) -> Optional[Dict[int, List[Dict[str, str]]]]:
+    """
+    Agrupa os erros pela sentença (índice em `sentencas`) que contém o trecho,
+    guardando em 'posicao' o deslocamento do trecho dentro da sentença. Retorna
+    None se algum trecho não for encontrado: nesse caso o lote não deve ir ao cache.
+    """
+    por_sentenca: Dict[int, List[Dict[str, str]]] = {i: [] for i in range(len(sentencas))}
+    for erro in erros:
+        trecho = erro.get("trecho", "")
+        for i, sentenca in enumerate(sentencas):
+            posicao = sentenca.find(trecho) if trecho else -1
+            if posicao >= 0:
+                por_sentenca[i].append({**erro, "posicao": posicao})
+                break
+        else:
+            return None
+    return por_sentenca
+
+
+_cache: Optional[CacheDeteccao] = None
+_trava_cache = threading.Lock()
+
+
+def obter_cache() -> CacheDeteccao:
+    global _cache
+    with _trava_cache:
+        if _cache is None:
+            _cache = CacheDeteccao()
+        return _cache
+
+
+def configurar(caminho: str) -> CacheDeteccao:
+    """Troca o cache do processo por um aberto em `caminho`."""
+    global _cache
+    with _trava_cache:
+        _cache = CacheDeteccao(caminho)
+        return _cache
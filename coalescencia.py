@@ -0,0 +1,109 @@
+"""
+Coalescência de chamadas idênticas simultâneas (single-flight).
+
+Quando várias threads pedem o mesmo cálculo ao mesmo tempo (a turma inteira
+enviando a redação de exemplo que o professor projetou), só a primeira executa;
+as demais esperam e recebem o mesmo resultado, ou a mesma exceção. Não é cache:
+terminada a chamada a chave é liberada, e o reaproveitamento de resultados
+prontos continua com armazem_resultados e duplicatas.
+
+Quem espera também acompanha o progresso: `calcular` recebe uma função
+notificar que repassa cada atualização a todos os ouvintes da chamada; quem
+chega no meio recebe logo a última atualização.
+
+Uso:
+    em_andamento = Coalescedor("pipeline")
+    valor = em_andamento.executar(chave, lambda notificar: calcular(notificar), ao_atualizar)
+"""
+import hashlib
+import json
+import logging
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Hashable, List, Optional, TypeVar
+
+import rastreamento
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+Ouvinte = Callable[[Any], None]
+
+
+@dataclass
+class _Chamada:
+    pronta: threading.Event = field(default_factory=threading.Event)
+    ouvintes: List[Ouvinte] = field(default_factory=list)
+    ultima_atualizacao: Any = None
+    resultado: Any = None
+    erro: Optional[BaseException] = None
+    seguidores: int = 0
+
+
+def chave_estavel(*partes: Any) -> str:
+    """Hash estável de valores JSON (dicts em qualquer ordem de chaves), para compor chaves de coalescência."""
+    bruto = json.dumps(partes, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(bruto.encode("utf-8")).hexdigest()
+
+
+class Coalescedor:
+    """Executa uma vez por chave as chamadas simultâneas; `nome` identifica o coalescedor no log e no rastro."""
+
+    def __init__(self, nome: str):
+        self.nome = nome
+        self._chamadas: Dict[Hashable, _Chamada] = {}
+        self._trava = threading.Lock()
+        self.coalescidas = 0
+
+    def executar(self, chave: Hashable, calcular: Callable[[Ouvinte], T], ao_atualizar: Optional[Ouvinte] = None) -> T:
+        with self._trava:
+            chamada = self._chamadas.get(chave)
+            lider = chamada is None
+            if lider:
+                chamada = self._chamadas[chave] = _Chamada()
+            else:
+                chamada.seguidores += 1
+                self.coalescidas += 1
+            if ao_atualizar is not None:
+                chamada.ouvintes.append(ao_atualizar)
+            ultima = chamada.ultima_atualizacao
+
+        if not lider:
+            return self._aguardar(chave, chamada, ao_atualizar, ultima)
+
+        try:
+            chamada.resultado = calcular(lambda atualizacao: self._notificar(chamada, atualizacao))
+        except BaseException as e:
+            chamada.erro = e
+            raise
+        finally:
+            with self._trava:
+                del self._chamadas[chave]
+            chamada.pronta.set()
+            if chamada.seguidores:
+                logger.info(f"{self.nome}: {chamada.seguidores} chamadas coalescidas com a mesma chave")
+        return chamada.resultado
+
+    def _aguardar(self, chave: Hashable, chamada: _Chamada, ao_atualizar: Optional[Ouvinte], ultima: Any) -> Any:
+        if ao_atualizar is not None and ultima is not None:
+            ao_atualizar(ultima)
+        with rastreamento.span(f"coalescida:{self.nome}", tipo="coalescencia"):
+            chamada.pronta.wait()
+        if chamada.erro is not None:
+            raise chamada.erro
+        return chamada.resultado
+
+    def _notificar(self, chamada: _Chamada, atualizacao: Any):
+        with self._trava:
+            chamada.ultima_atualizacao = atualizacao
+            ouvintes = list(chamada.ouvintes)
+        for ouvinte in ouvintes:
+            try:
+                ouvinte(atualizacao)
+            except Exception as e:
+                # Um ouvinte com problema (sessão encerrada) não derruba a chamada dos outros
+                logger.error(f"{self.nome}: erro ao notificar ouvinte: {e}")
+
+    def em_andamento(self) -> int:
+        with self._trava:
+            return len(self._chamadas)
@@ -0,0 +1,187 @@
+"""
+Material de estudo e dicas de resolução gerados offline para o banco de questões.
+
+GeradorConteudo.gerar_material_estudo e gerar_dicas_resolucao dependem só do
+conteúdo fixo do BancoQuestoesEnem, então não precisam esperar um clique: este
+job percorre o banco inteiro, gera o material de cada tema em cada dificuldade
+do plano de estudos e as dicas de cada questão, e grava tudo em
+ARQUIVO_CONTEUDO, um SQLite com o texto comprimido indexado pela chave do item
+e pelo hash da fonte. editor.gerar_material e editor.gerar_dicas consultam o
+arquivo antes de chamar o modelo (aqui ou no servico_correcao), então o
+editor.main serve o conteúdo pronto na hora.
+
+O hash da fonte é o do prompt montado a partir do banco (mais o modelo): uma
+questão editada, um tema com questões novas ou um prompt alterado mudam o
+hash. Cada rodada só gera os itens cujo hash mudou ou que ainda não existem, e
+apaga os itens que saíram do banco. Um item nunca é servido com hash diferente
+do prompt atual; nesse caso o editor volta a gerar na hora.
+
+Uso:
+    OPENAI_API_KEY=... python conteudo_pre_gerado.py --concorrencia 4
+"""
+import argparse
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+ARQUIVO_CONTEUDO = os.getenv("CONTEUDO_PRE_GERADO_ARQUIVO", os.path.join(".dados", "conteudo_pre_gerado.sqlite3"))
+CONCORRENCIA = int(os.getenv("CONTEUDO_PRE_GERADO_CONCORRENCIA", "4"))
+
+# Dificuldades do cronograma do editor e questões de referência por material (como no editor.main)
+DIFICULDADES = ("Fácil", "Média", "Difícil")
+QUESTOES_POR_MATERIAL = 3
+NIVEL_PROFUNDIDADE = "alto"
+
+# GeradorConteudo._fazer_requisicao devolve o erro como texto em vez de levantar a exceção
+PREFIXO_ERRO = "Erro ao gerar conteúdo"
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS conteudo (
+    chave TEXT PRIMARY KEY,
+    hash_fonte TEXT NOT NULL,
+    texto BLOB NOT NULL,
+    gerado_em REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_conteudo_hash ON conteudo (hash_fonte);
+"""
+
+
+def hash_fonte(modelo: str, prompt: str) -> str:
+    return hashlib.sha256(f"{modelo}\x1f{prompt}".encode("utf-8")).hexdigest()
+
+
+class ArmazemConteudo:
+    """Conteúdo pré-gerado em SQLite, com o texto comprimido (zlib)."""
+
+    def __init__(self, caminho: str = ARQUIVO_CONTEUDO):
+        if caminho != ":memory:":
+            os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+        self._conexao = sqlite3.connect(caminho, check_same_thread=False, timeout=30)
+        self._trava = threading.Lock()
+        with self._trava, self._conexao:
+            self._conexao.execute("PRAGMA journal_mode=WAL")
+            self._conexao.executescript(_ESQUEMA)
+
+    def buscar(self, hash_fonte: str) -> Optional[str]:
+        with self._trava:
+            linha = self._conexao.execute("SELECT texto FROM conteudo WHERE hash_fonte = ?", (hash_fonte,)).fetchone()
+        return zlib.decompress(linha[0]).decode("utf-8") if linha else None
+
+    def hashes(self) -> Dict[str, str]:
+        with self._trava:
+            return dict(self._conexao.execute("SELECT chave, hash_fonte FROM conteudo").fetchall())
+
+    def gravar(self, chave: str, hash_fonte: str, texto: str):
+        with self._trava, self._conexao:
+            self._conexao.execute("INSERT OR REPLACE INTO conteudo (chave, hash_fonte, texto, gerado_em) VALUES (?, ?, ?, ?)",
+                                  (chave, hash_fonte, zlib.compress(texto.encode("utf-8"), 9), time.time()))
+
+    def remover(self, chaves: List[str]):
+        with self._trava, self._conexao:
+            self._conexao.executemany("DELETE FROM conteudo WHERE chave = ?", [(chave,) for chave in chaves])
+
+
+_armazem: Optional[ArmazemConteudo] = None
+_trava_armazem = threading.Lock()
+
+
+def obter_armazem() -> Optional[ArmazemConteudo]:
+    """Armazém do conteúdo pré-gerado; None enquanto o job não tiver rodado (não cria o arquivo)."""
+    global _armazem
+    with _trava_armazem:
+        if _armazem is None and os.path.exists(ARQUIVO_CONTEUDO):
+            _armazem = ArmazemConteudo()
+        return _armazem
+
+
+def buscar(modelo: str, prompt: str) -> Optional[str]:
+    """Conteúdo pré-gerado para o prompt, se existir e for da versão atual do banco."""
+    armazem = obter_armazem()
+    if armazem is None:
+        return None
+    try:
+        return armazem.buscar(hash_fonte(modelo, prompt))
+    except sqlite3.Error as e:
+        logger.error(f"Erro ao ler conteúdo pré-gerado: {e}")
+        return None
+
+
+def itens_do_banco(banco, gerador) -> List[Tuple[str, str]]:
+    """(chave, prompt) de todo o conteúdo derivado do banco: material por tema e dificuldade, dicas por questão."""
+    itens = []
+    for tema in banco.get_temas():
+        for dificuldade in DIFICULDADES:
+            questoes = banco.get_questoes_por_tema(tema, dificuldade)[:QUESTOES_POR_MATERIAL]
+            if questoes:
+                prompt = gerador._criar_prompt_estudo(tema, questoes, NIVEL_PROFUNDIDADE)
+                itens.append((f"material:{tema}:{dificuldade}", prompt))
+        for questao in banco.get_questoes_por_tema(tema):
+            itens.append((f"dicas:{questao['id']}", gerador._criar_prompt_resolucao(questao)))
+    return itens
+
+
+def pre_gerar(banco, gerador, armazem: ArmazemConteudo, concorrencia: int = CONCORRENCIA,
+              forcar: bool = False) -> Dict[str, int]:
+    """
+    Gera os itens novos ou com fonte alterada, no máximo `concorrencia` chamadas ao mesmo tempo.
+
+    Cada item é gravado assim que fica pronto: uma rodada interrompida não perde o que já gerou.
+    """
+    itens = itens_do_banco(banco, gerador)
+    existentes = armazem.hashes()
+    atuais = {chave for chave, _ in itens}
+    pendentes = [(chave, prompt, hash_fonte(gerador.model, prompt)) for chave, prompt in itens]
+    if not forcar:
+        pendentes = [item for item in pendentes if existentes.get(item[0]) != item[2]]
+    removidos = [chave for chave in existentes if chave not in atuais]
+    armazem.remover(removidos)
+
+    gerados = falhas = 0
+    with ThreadPoolExecutor(max_workers=concorrencia) as executor:
+        futuros = {executor.submit(gerador._fazer_requisicao, prompt): (chave, hash_)
+                   for chave, prompt, hash_ in pendentes}
+        for futuro in as_completed(futuros):
+            chave, hash_ = futuros[futuro]
+            texto = futuro.result()
+            if not texto or texto.startswith(PREFIXO_ERRO):
+                logger.error(f"{chave}: {texto}")
+                falhas += 1
+                continue
+            armazem.gravar(chave, hash_, texto)
+            gerados += 1
+            logger.info(f"{chave} gerado ({gerados}/{len(pendentes)})")
+
+    resumo = {"itens": len(itens), "gerados": gerados, "mantidos": len(itens) - len(pendentes),
+              "falhas": falhas, "removidos": len(removidos)}
+    logger.info(f"Conteúdo pré-gerado: {resumo}")
+    return resumo
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gera offline o material de estudo e as dicas do banco de questões")
+    parser.add_argument("--arquivo", default=ARQUIVO_CONTEUDO)
+    parser.add_argument("--concorrencia", type=int, default=CONCORRENCIA)
+    parser.add_argument("--forcar", action="store_true", help="Gera de novo mesmo os itens sem mudança na fonte")
+    args = parser.parse_args()
+
+    import openai
+    from editor import BancoQuestoesEnem, GeradorConteudo
+
+    logging.basicConfig(level=logging.INFO)
+    resumo = pre_gerar(BancoQuestoesEnem(), GeradorConteudo(openai.OpenAI()), ArmazemConteudo(args.arquivo),
+                       args.concorrencia, args.forcar)
+    print(resumo)
+    if resumo["falhas"]:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Contabilidade de tokens e custo por redação e por competência.
+
+Cada chamada de modelo feita via analysis_function.chamar_modelo é lançada no
+RegistroUso ativo, agrupada por competência e por etapa. Ao fim da redação o
+resumo vai para resultados['uso'] e é somado ao consolidado diário persistido
+localmente em JSON, com trava entre processos (json_compartilhado): os
+processos do servico_correcao e os trabalhadores da fila somam no mesmo arquivo.
+
+A tabela de preços (USD por 1 milhão de tokens) pode ser sobrescrita com um
+arquivo JSON apontado por CUSTOS_TABELA_PRECOS, no formato
+{"modelo-ou-prefixo": {"prompt": 3.75, "completion": 15.0}}.
+"""
+import json
+import logging
+import os
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import date
+from typing import Any, Dict, Iterator, Optional
+
+import json_compartilhado
+
+logger = logging.getLogger(__name__)
+
+ARQUIVO_USO_DIARIO = os.getenv("CUSTOS_ARQUIVO", os.path.join(".dados", "uso_diario.json"))
+
+# USD por 1 milhão de tokens. Modelos fine-tuned são procurados pelo prefixo.
+TABELA_PRECOS: Dict[str, Dict[str, float]] = {
+    "ft:gpt-4o-mini": {"prompt": 0.30, "completion": 1.20},
+    "ft:gpt-4o": {"prompt": 3.75, "completion": 15.00},
+    "gpt-4o-mini": {"prompt": 0.15, "completion": 0.60},
+    "gpt-4o": {"prompt": 2.50, "completion": 10.00},
+    "o3-mini": {"prompt": 1.10, "completion": 4.40},
+}
+
+_caminho_precos = os.getenv("CUSTOS_TABELA_PRECOS")
+if _caminho_precos:
+    with open(_caminho_precos, encoding="utf-8") as _arquivo:
+        TABELA_PRECOS.update(json.load(_arquivo))
+
+
+def preco_modelo(modelo: str) -> Optional[Dict[str, float]]:
+    """Retorna o preço do modelo, usando o prefixo mais longo da tabela que casar."""
+    if modelo in TABELA_PRECOS:
+        return TABELA_PRECOS[modelo]
+    prefixos = [p for p in TABELA_PRECOS if modelo.startswith(p)]
+    return TABELA_PRECOS[max(prefixos, key=len)] if prefixos else None
+
+
+def calcular_custo(modelo: str, tokens_prompt: int, tokens_completion: int) -> float:
+    preco = preco_modelo(modelo)
+    if preco is None:
+        logger.warning(f"Modelo sem preço na tabela: {modelo}")
+        return 0.0
+    return (tokens_prompt * preco["prompt"] + tokens_completion * preco["completion"]) / 1_000_000
+
+
+def _vazio() -> Dict[str, Any]:
+    return {"chamadas": 0, "tokens_prompt": 0, "tokens_completion": 0, "custo_usd": 0.0}
+
+
+def _somar(destino: Dict[str, Any], origem: Dict[str, Any]):
+    for chave in ("chamadas", "tokens_prompt", "tokens_completion", "custo_usd"):
+        destino[chave] += origem[chave]
+
+
+class RegistroUso:
+    """Acumula o uso de tokens de uma redação por competência e por etapa."""
+
+    def __init__(self):
+        self.total = _vazio()
+        self.por_competencia: Dict[str, Dict[str, Any]] = {}
+
+    def lancar(self, competencia: str, etapa: str, modelo: str, tokens_prompt: int, tokens_completion: int):
+        item = {
+            "chamadas": 1,
+            "tokens_prompt": tokens_prompt,
+            "tokens_completion": tokens_completion,
+            "custo_usd": calcular_custo(modelo, tokens_prompt, tokens_completion),
+        }
+        comp = self.por_competencia.setdefault(competencia, {**_vazio(), "por_etapa": {}})
+        _somar(comp, item)
+        _somar(comp["por_etapa"].setdefault(etapa.split(":")[0], _vazio()), item)
+        _somar(self.total, item)
+
+    def resumo(self) -> Dict[str, Any]:
+        return {"total": dict(self.total), "por_competencia": json.loads(json.dumps(self.por_competencia))}
+
+
+_registro_atual: ContextVar[Optional[RegistroUso]] = ContextVar("registro_uso", default=None)
+
+
+@contextmanager
+def registrar_uso_redacao() -> Iterator[RegistroUso]:
+    """Ativa um RegistroUso para as chamadas feitas dentro do bloco."""
+    registro = RegistroUso()
+    token = _registro_atual.set(registro)
+    try:
+        yield registro
+    finally:
+        _registro_atual.reset(token)
+
+
+def contabilizar(resposta: Any, modelo: str, etapa: str, competencia: Optional[str]):
+    """Lança o `usage` de uma resposta de chat completion no registro ativo, se houver."""
+    registro = _registro_atual.get()
+    uso = getattr(resposta, "usage", None)
+    if registro is None or uso is None:
+        return
+    registro.lancar(
+        competencia or "sem_competencia",
+        etapa,
+        getattr(resposta, "model", None) or modelo,
+        getattr(uso, "prompt_tokens", 0) or 0,
+        getattr(uso, "completion_tokens", 0) or 0,
+    )
+
+
+def consolidar_dia(resumo: Dict[str, Any], dia: Optional[date] = None, caminho: Optional[str] = None):
+    """Soma o resumo de uma redação ao consolidado diário persistido em `caminho`."""
+    chave_dia = (dia or date.today()).isoformat()
+
+    def somar(consolidado: Dict[str, Any]):
+        registro_dia = consolidado.setdefault(chave_dia, {**_vazio(), "redacoes": 0, "por_competencia": {}})
+        registro_dia["redacoes"] += 1
+        _somar(registro_dia, resumo["total"])
+        for comp, valores in resumo["por_competencia"].items():
+            _somar(registro_dia["por_competencia"].setdefault(comp, _vazio()), valores)
+
+    json_compartilhado.atualizar(caminho or ARQUIVO_USO_DIARIO, somar)
+
+
+def carregar_consolidado(caminho: Optional[str] = None) -> Dict[str, Any]:
+    """Lê o consolidado diário; retorna um dict vazio se o arquivo não existir."""
+    return json_compartilhado.ler(caminho or ARQUIVO_USO_DIARIO)
@@ -0,0 +1,161 @@
+"""
+Detecção de redações duplicadas e quase duplicadas antes da correção.
+
+Cada redação corrigida entra num índice MinHash/LSH (shingles de 5 palavras,
+64 permutações em 16 bandas). Antes de corrigir uma nova redação o pipeline
+consulta o índice:
+
+    - duplicata exata (mesmo texto normalizado e tema): os resultados
+      anteriores são reaproveitados inteiros;
+    - quase duplicata (similaridade de Jaccard estimada >= LIMIAR_SIMILARIDADE):
+      os erros da Competência 1 das sentenças inalteradas são reaproveitados e
+      só as sentenças alteradas voltam ao modelo.
+
+Quando a redação anterior é de outro aluno, o resultado é marcado como
+suspeita de cópia.
+"""
+import re
+import threading
+import zlib
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from armazem_resultados import ArmazemResultados, chave_tema, hash_texto, normalizar_texto
+
+NUM_PERMUTACOES = 64
+NUM_BANDAS = 16
+TAMANHO_SHINGLE = 5
+LIMIAR_SIMILARIDADE = 0.8
+
+_PRIMO = (1 << 31) - 1
+_gerador = np.random.default_rng(20240601)
+_COEF_A = _gerador.integers(1, _PRIMO, NUM_PERMUTACOES, dtype=np.uint64)
+_COEF_B = _gerador.integers(0, _PRIMO, NUM_PERMUTACOES, dtype=np.uint64)
+
+
+@dataclass
+class Duplicata:
+    chave: str
+    similaridade: float
+    exata: bool
+    user_id: Optional[str]
+
+    def suspeita_copia(self, user_id: Optional[str]) -> bool:
+        """Cópia é quando a redação parecida é de outro aluno (ou de autor desconhecido)."""
+        return self.user_id is None or user_id is None or str(user_id) != self.user_id
+
+    def para_dict(self, user_id: Optional[str]) -> Dict[str, Any]:
+        return {
+            "chave_original": self.chave,
+            "similaridade": round(self.similaridade, 3),
+            "exata": self.exata,
+            "suspeita_copia": self.suspeita_copia(user_id),
+        }
+
+
+def dividir_sentencas(texto: str) -> List[str]:
+    """Divide o texto em sentenças normalizadas (não vazias)."""
+    return [s.strip() for s in re.split(r"(?<=[.!?;])\s+|\n+", normalizar_texto(texto)) if s.strip()]
+
+
+def assinatura_minhash(texto: str) -> np.ndarray:
+    palavras = re.findall(r"\w+", texto.lower())
+    if len(palavras) < TAMANHO_SHINGLE:
+        shingles = {" ".join(palavras)}
+    else:
+        shingles = {" ".join(palavras[i:i + TAMANHO_SHINGLE]) for i in range(len(palavras) - TAMANHO_SHINGLE + 1)}
+    hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) % _PRIMO for s in shingles), dtype=np.uint64,
+                         count=len(shingles))
+    return ((_COEF_A[:, None] * hashes[None, :] + _COEF_B[:, None]) % _PRIMO).min(axis=1)
+
+
+def _bandas(assinatura: np.ndarray) -> List[Tuple[int, bytes]]:
+    linhas = NUM_PERMUTACOES // NUM_BANDAS
+    return [(i, assinatura[i * linhas:(i + 1) * linhas].tobytes()) for i in range(NUM_BANDAS)]
+
+
+class IndiceDuplicatas:
+    """Índice em memória; as redações vêm do armazém local de resultados."""
+
+    def __init__(self, limiar: float = LIMIAR_SIMILARIDADE):
+        self.limiar = limiar
+        self._assinaturas: Dict[str, np.ndarray] = {}
+        self._metadados: Dict[str, Tuple[str, Optional[str]]] = {}
+        self._exatas: Dict[str, str] = {}
+        self._baldes: Dict[Tuple[int, bytes], Set[str]] = defaultdict(set)
+        self._trava = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._assinaturas)
+
+    def adicionar(self, chave: str, texto: str, tema: Any, user_id: Optional[str] = None):
+        assinatura = assinatura_minhash(texto)
+        tema_chave = chave_tema(tema)
+        with self._trava:
+            self._assinaturas[chave] = assinatura
+            self._metadados[chave] = (tema_chave, None if user_id is None else str(user_id))
+            self._exatas[f"{hash_texto(texto)}:{tema_chave}"] = chave
+            for banda in _bandas(assinatura):
+                self._baldes[banda].add(chave)
+
+    def consultar(self, texto: str, tema: Any) -> Optional[Duplicata]:
+        """Retorna a redação mais parecida com o mesmo tema, se passar do limiar."""
+        tema_chave = chave_tema(tema)
+        with self._trava:
+            exata = self._exatas.get(f"{hash_texto(texto)}:{tema_chave}")
+            if exata:
+                return Duplicata(exata, 1.0, True, self._metadados[exata][1])
+
+        assinatura = assinatura_minhash(texto)
+        with self._trava:
+            candidatos = set().union(*(self._baldes.get(banda, ()) for banda in _bandas(assinatura)))
+            melhor: Optional[Duplicata] = None
+            for chave in candidatos:
+                tema_candidato, user_id = self._metadados[chave]
+                if tema_candidato != tema_chave:
+                    continue
+                similaridade = float(np.mean(self._assinaturas[chave] == assinatura))
+                if similaridade >= self.limiar and (melhor is None or similaridade > melhor.similaridade):
+                    melhor = Duplicata(chave, similaridade, False, user_id)
+        return melhor
+
+    def carregar_do_armazem(self, armazem: ArmazemResultados):
+        for chave, tema, user_id, texto in armazem.iterar_redacoes():
+            self.adicionar(chave, texto, tema, user_id)
+
+
+def reaproveitar_competency1(texto_novo: str, resultados_anteriores: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Separa o texto novo em sentenças inalteradas e alteradas em relação à redação
+    anterior e retorna os erros (já revisados) da Competência 1 que caem nas inalteradas.
+    """
+    sentencas_anteriores = set(dividir_sentencas(resultados_anteriores.get("texto_original", "")))
+    inalteradas, alteradas = [], []
+    for sentenca in dividir_sentencas(texto_novo):
+        (inalteradas if sentenca in sentencas_anteriores else alteradas).append(sentenca)
+
+    erros = [
+        erro for erro in resultados_anteriores.get("erros_especificos", {}).get("competency1", [])
+        if any(normalizar_texto(erro.get("trecho", "")).strip('"') in s for s in inalteradas)
+    ]
+    return {"erros": erros, "texto_alterado": "\n".join(alteradas), "sentencas_reaproveitadas": len(inalteradas)}
+
+
+_indice: Optional[IndiceDuplicatas] = None
+_armazem_indice: Optional[ArmazemResultados] = None
+_trava_indice = threading.Lock()
+
+
+def obter_indice(armazem: ArmazemResultados) -> IndiceDuplicatas:
+    """Retorna o índice do processo, carregado do armazém na primeira chamada."""
+    global _indice, _armazem_indice
+    with _trava_indice:
+        # Um armazém trocado (armazem_resultados.configurar) recarrega o índice
+        if _indice is None or _armazem_indice is not armazem:
+            _indice = IndiceDuplicatas()
+            _indice.carregar_do_armazem(armazem)
+            _armazem_indice = armazem
+        return _indice
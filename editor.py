@@ -1,24 +1,41 @@
+import os
 import streamlit as st
 import pandas as pd
 import json
 import openai
 from datetime import datetime, timedelta
+from functools import lru_cache
 
-st.set_page_config(page_title="ENEM Linguagens - Plano de Estudos", layout="wide")  # Deve ser a primeira linha!
+import coalescencia
+import conteudo_pre_gerado
+import servico_correcao
 
-# 🔍 Carregar a chave corretamente
-openai_api_key = st.secrets.get("openai_api_key") or os.getenv("OPENAI_API_KEY")
+client = None
 
-if not openai_api_key:
-    st.error("❌ A chave da API OpenAI não foi encontrada. Verifique `Manage app > Secrets` no Streamlit Cloud.")
-    st.stop()  # ⛔ Para a execução do script se a chave não estiver definida
-else:
-    st.success("✅ Chave da API carregada com sucesso!")
+# Monta só o dia escolhido do plano (e as questões só quando abertas) em vez de todas as abas a cada rerun
+ABAS_PREGUICOSAS = os.getenv("EDITOR_ABAS_PREGUICOSAS", "0") == "1"
 
-# ✅ Definir a chave diretamente na configuração do OpenAI
-openai.api_key = openai_api_key  # O OpenAI agora lê a chave diretamente assim
+# Materiais de estudo em geração por tema, profundidade e questões, compartilhados por pedidos simultâneos
+_materiais_em_andamento = coalescencia.Coalescedor("material_estudo")
 
 
+def configurar_pagina():
+   """Configura a página e o cliente OpenAI. Deve ser a primeira chamada do Streamlit!"""
+   global client
+   st.set_page_config(page_title="ENEM Linguagens - Plano de Estudos", layout="wide")
+
+   # 🔍 Carregar a chave corretamente
+   openai_api_key = st.secrets.get("openai_api_key") or os.getenv("OPENAI_API_KEY")
+
+   if not openai_api_key:
+       st.error("❌ A chave da API OpenAI não foi encontrada. Verifique `Manage app > Secrets` no Streamlit Cloud.")
+       st.stop()  # ⛔ Para a execução do script se a chave não estiver definida
+   else:
+       st.success("✅ Chave da API carregada com sucesso!")
+
+   # ✅ Definir a chave diretamente na configuração do OpenAI
+   openai.api_key = openai_api_key
+   client = openai.OpenAI(api_key=openai_api_key)
 
 
 
@@ -406,14 +423,20 @@ class BancoQuestoesEnem:
            }
        }
 
-   def get_questoes_por_tema(self, tema, dificuldade=None, quantidade=None):
-       categorias = {
+   def _categorias(self):
+       return {
            "Gêneros Textuais": self.generos_textuais,
            "Textos Não Literários": self.textos_nao_literarios,
            "Compreensão Textual": self.compreensao_textual,
            "Textos Literários": self.textos_literarios,
            "Variações Linguísticas": self.variacoes_linguisticas
        }
+
+   def get_temas(self):
+       return list(self._categorias())
+
+   def get_questoes_por_tema(self, tema, dificuldade=None, quantidade=None):
+       categorias = self._categorias()
        
        if tema not in categorias:
            return []
@@ -456,16 +479,26 @@ class BancoQuestoesEnem:
        return self.metadata.get(categoria, {})
 
 class GeradorConteudo:
-   def __init__(self):
+   def __init__(self, client=None):
        self.model = "o3-mini"
+       self.client = client
        
    def gerar_material_estudo(self, tema, questoes, nivel_profundidade="alto"):
+       # Pedidos simultâneos do mesmo tema e questões (a turma abrindo o mesmo dia do plano)
+       # geram o material uma vez só; o conteúdo pré-gerado já foi consultado em gerar_material
        prompt = self._criar_prompt_estudo(tema, questoes, nivel_profundidade)
-       return self._fazer_requisicao(prompt)
+       return _materiais_em_andamento.executar(coalescencia.chave_estavel(tema, nivel_profundidade, questoes),
+                                               lambda notificar: self._fazer_requisicao(prompt))
        
    def gerar_dicas_resolucao(self, questao):
-       prompt = self._criar_prompt_resolucao(questao)
-       return self._fazer_requisicao(prompt)
+       return self._fazer_requisicao(self._criar_prompt_resolucao(questao))
+
+   def material_pre_gerado(self, tema, questoes, nivel_profundidade="alto"):
+       """Material gerado offline para estes tema e questões, ou None."""
+       return conteudo_pre_gerado.buscar(self.model, self._criar_prompt_estudo(tema, questoes, nivel_profundidade))
+
+   def dicas_pre_geradas(self, questao):
+       return conteudo_pre_gerado.buscar(self.model, self._criar_prompt_resolucao(questao))
        
    def _criar_prompt_estudo(self, tema, questoes, nivel_profundidade):
        exemplos_questoes = "\n".join([
@@ -514,7 +547,7 @@ class GeradorConteudo:
        
    def _fazer_requisicao(self, prompt):
     try:
-        response = client.chat.completions.create(
+        response = (self.client or client).chat.completions.create(
             model=self.model,
             messages=[
                 {"role": "system", "content": (
@@ -533,6 +566,7 @@ class GeradorConteudo:
 
 
 
+@lru_cache(maxsize=None)
 def criar_estilo():
    return """
    <style>
@@ -562,6 +596,7 @@ def criar_estilo():
    </style>
    """
 
+@lru_cache(maxsize=256)
 def criar_card_estudo(tag, titulo, descricao, tempo="30min"):
    tag_class = tag.lower()
    return f"""
@@ -573,7 +608,37 @@ def criar_card_estudo(tag, titulo, descricao, tempo="30min"):
    </div>
    """
 
+def gerar_material(gerador, tema, questoes):
+   """
+   Serve o material pré-gerado (conteudo_pre_gerado) quando existe; senão gera no
+   servico_correcao, se SERVICO_CORRECAO_URL está definida, ou aqui mesmo.
+   """
+   pronto = gerador.material_pre_gerado(tema, questoes)
+   if pronto is not None:
+      return pronto
+   cliente = servico_correcao.obter_cliente()
+   if cliente is None:
+      return gerador.gerar_material_estudo(tema, questoes)
+   try:
+      return cliente.executar("material_estudo", {"tema": tema, "questoes": questoes}, chave=tema)
+   except servico_correcao.ErroServico as e:
+      return f"Erro ao gerar conteúdo: {str(e)}"
+
+def gerar_dicas(gerador, questao):
+   """Como gerar_material, para as dicas de resolução de uma questão."""
+   pronto = gerador.dicas_pre_geradas(questao)
+   if pronto is not None:
+      return pronto
+   cliente = servico_correcao.obter_cliente()
+   if cliente is None:
+      return gerador.gerar_dicas_resolucao(questao)
+   try:
+      return cliente.executar("dicas_resolucao", {"questao": questao}, chave=questao["id"])
+   except servico_correcao.ErroServico as e:
+      return f"Erro ao gerar conteúdo: {str(e)}"
+
 def main():   
+   configurar_pagina()
    banco = BancoQuestoesEnem()
    gerador = GeradorConteudo()
    
@@ -609,54 +674,73 @@ def main():
        }
    }
    
-   dias = st.tabs(list(cronograma.keys()))
+   if ABAS_PREGUICOSAS:
+       # Só o dia escolhido é montado: o rerun não depende de quantos dias e questões o plano tem
+       dia = st.radio("Dia", list(cronograma.keys()), horizontal=True, key="dia_plano",
+                      label_visibility="collapsed")
+       exibir_dia(banco, gerador, dia, cronograma[dia])
+   else:
+       dias = st.tabs(list(cronograma.keys()))
+       for i, dia in enumerate(cronograma.keys()):
+           with dias[i]:
+               exibir_dia(banco, gerador, dia, cronograma[dia])
+
+def exibir_dia(banco, gerador, dia, info_dia):
+   questoes_dia = banco.get_questoes_por_tema(
+       info_dia["tema_principal"], 
+       info_dia["dificuldade_exercicios"]
+   )
    
-   for i, dia in enumerate(cronograma.keys()):
-       with dias[i]:
-           info_dia = cronograma[dia]
-           
-           questoes_dia = banco.get_questoes_por_tema(
-               info_dia["tema_principal"], 
-               info_dia["dificuldade_exercicios"]
-           )
-           
-           st.markdown(criar_card_estudo(
-               "CONTEÚDO",
-               info_dia["tema_principal"],
-               "Conceitos fundamentais e aplicações"
-           ), unsafe_allow_html=True)
-           
-           st.markdown(criar_card_estudo(
-               "EXERCÍCIOS",
-               f"Questões de nível {info_dia['dificuldade_exercicios'].lower()}",
-               f"Seleção de questões sobre {info_dia['tema_principal']}"
-           ), unsafe_allow_html=True)
-           
-           st.markdown(criar_card_estudo(
-               "REVISÃO",
-               info_dia["tema_revisao"],
-               "Revisão ativa e exercícios de fixação"
-           ), unsafe_allow_html=True)
-           
-           with st.expander("📖 Material de Estudo"):
-               if st.button(f"Gerar material sobre {info_dia['tema_principal']}", key=f"btn_{dia}"):
-                   with st.spinner("Gerando material..."):
-                       conteudo = gerador.gerar_material_estudo(
-                           info_dia["tema_principal"],
-                           questoes_dia[:3]
-                       )
-                       st.markdown(conteudo)
-           
-           with st.expander("📝 Questões do Dia"):
-               for j, questao in enumerate(questoes_dia, 1):
-                   st.subheader(f"Questão {j}")
-                   st.write(questao["texto"])
-                   for k, alt in enumerate(questao["alternativas"]):
-                       st.write(f"{chr(65+k)}) {alt}")
-                   
-                   if st.button(f"Ver resposta {j}", key=f"resp_{dia}_{j}"):
-                       st.success(f"Gabarito: {questao['gabarito']}")
-                       st.info(questao["explicacao"])
+   st.markdown(criar_card_estudo(
+       "CONTEÚDO",
+       info_dia["tema_principal"],
+       "Conceitos fundamentais e aplicações"
+   ), unsafe_allow_html=True)
+   
+   st.markdown(criar_card_estudo(
+       "EXERCÍCIOS",
+       f"Questões de nível {info_dia['dificuldade_exercicios'].lower()}",
+       f"Seleção de questões sobre {info_dia['tema_principal']}"
+   ), unsafe_allow_html=True)
+   
+   st.markdown(criar_card_estudo(
+       "REVISÃO",
+       info_dia["tema_revisao"],
+       "Revisão ativa e exercícios de fixação"
+   ), unsafe_allow_html=True)
+   
+   with st.expander("📖 Material de Estudo"):
+       if st.button(f"Gerar material sobre {info_dia['tema_principal']}", key=f"btn_{dia}"):
+           with st.spinner("Gerando material..."):
+               conteudo = gerar_material(
+                   gerador,
+                   info_dia["tema_principal"],
+                   questoes_dia[:3]
+               )
+               st.markdown(conteudo)
+   
+   # Um expander monta o conteúdo mesmo fechado; no modo preguiçoso as questões só são montadas quando abertas
+   if ABAS_PREGUICOSAS:
+       if st.toggle("📝 Questões do Dia", key=f"questoes_{dia}"):
+           exibir_questoes(gerador, dia, questoes_dia)
+   else:
+       with st.expander("📝 Questões do Dia"):
+           exibir_questoes(gerador, dia, questoes_dia)
+
+def exibir_questoes(gerador, dia, questoes_dia):
+   for j, questao in enumerate(questoes_dia, 1):
+       st.subheader(f"Questão {j}")
+       st.write(questao["texto"])
+       for k, alt in enumerate(questao["alternativas"]):
+           st.write(f"{chr(65+k)}) {alt}")
+       
+       if st.button(f"Ver resposta {j}", key=f"resp_{dia}_{j}"):
+           st.success(f"Gabarito: {questao['gabarito']}")
+           st.info(questao["explicacao"])
+       
+       if st.button(f"Dicas de resolução {j}", key=f"dicas_{dia}_{j}"):
+           with st.spinner("Gerando dicas..."):
+               st.markdown(gerar_dicas(gerador, questao))
 
 if __name__ == "__main__":
    main()
@@ -0,0 +1,209 @@
+"""
+Índice de posições de uma redação, construído uma vez por texto.
+
+Resolve o `trecho` citado pelo modelo em posições exatas (início/fim em
+caracteres), com o id da sentença e do parágrafo. Trechos repetidos são
+atribuídos a ocorrências diferentes, na ordem dos erros ou perto da posição
+sugerida; trechos levemente parafraseados (acentos, maiúsculas, uma palavra
+trocada) são alinhados por tokens normalizados.
+
+Uso:
+    indice = IndiceTexto(redacao_texto)
+    local = indice.localizar(erro['trecho'])
+    if local:
+        janela = indice.janela(local, 100)
+        referencia = indice.contexto(local, "paragrafo")
+"""
+import bisect
+import re
+import unicodedata
+from dataclasses import dataclass
+from difflib import SequenceMatcher
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+SIMILARIDADE_MINIMA = 0.6
+
+# Políticas de contexto dos prompts de revisão (ver IndiceTexto.contexto)
+POLITICAS_CONTEXTO = ("janela", "paragrafo", "paragrafo_tese", "completo")
+MARGEM_JANELA = 300
+
+_SENTENCA = re.compile(r"[^.!?;\n]+(?:[.!?;]+|$)")
+_TOKEN = re.compile(r"\w+")
+_PARAGRAFO = re.compile(r"[^\n]+")
+
+
+def _aparar(texto: str, inicio: int, fim: int) -> Tuple[int, int]:
+    while inicio < fim and texto[inicio].isspace():
+        inicio += 1
+    while fim > inicio and texto[fim - 1].isspace():
+        fim -= 1
+    return inicio, fim
+
+
+def segmentar_sentencas(texto: str) -> List[Tuple[int, int]]:
+    """Retorna os intervalos (início, fim) de cada sentença não vazia, sem espaços nas bordas."""
+    intervalos = [_aparar(texto, *m.span()) for m in _SENTENCA.finditer(texto)]
+    return [(inicio, fim) for inicio, fim in intervalos if fim > inicio]
+
+
+def segmentar_paragrafos(texto: str) -> List[Tuple[int, int]]:
+    """Cada linha não vazia é um parágrafo."""
+    intervalos = [_aparar(texto, *m.span()) for m in _PARAGRAFO.finditer(texto)]
+    return [(inicio, fim) for inicio, fim in intervalos if fim > inicio]
+
+
+def normalizar_token(token: str) -> str:
+    """Minúsculas e sem acentos, para alinhar trechos reescritos pelo modelo."""
+    decomposto = unicodedata.normalize("NFD", token.lower())
+    return "".join(c for c in decomposto if not unicodedata.combining(c))
+
+
+@dataclass
+class Localizacao:
+    inicio: int
+    fim: int
+    sentenca: int
+    paragrafo: int
+    exata: bool
+    similaridade: float = 1.0
+
+    def como_dict(self) -> Dict[str, object]:
+        return {"inicio": self.inicio, "fim": self.fim, "sentenca": self.sentenca, "paragrafo": self.paragrafo}
+
+
+class IndiceTexto:
+    def __init__(self, texto: str):
+        self.texto = texto
+        self.sentencas = segmentar_sentencas(texto)
+        self.paragrafos = segmentar_paragrafos(texto)
+        self._inicios_sentencas = [inicio for inicio, _ in self.sentencas]
+        self._inicios_paragrafos = [inicio for inicio, _ in self.paragrafos]
+
+        self.tokens: List[Tuple[str, int, int]] = [
+            (normalizar_token(m.group()), m.start(), m.end()) for m in _TOKEN.finditer(texto)
+        ]
+        self._posicoes: Dict[str, List[int]] = {}
+        for i, (token, _, _) in enumerate(self.tokens):
+            self._posicoes.setdefault(token, []).append(i)
+        self._usados: Set[Tuple[int, int]] = set()
+
+    # ------------------------------------------------------------------
+    def sentenca_em(self, posicao: int) -> int:
+        return max(0, bisect.bisect_right(self._inicios_sentencas, posicao) - 1)
+
+    def paragrafo_em(self, posicao: int) -> int:
+        return max(0, bisect.bisect_right(self._inicios_paragrafos, posicao) - 1)
+
+    def _localizacao(self, inicio: int, fim: int, exata: bool, similaridade: float = 1.0) -> Localizacao:
+        return Localizacao(inicio, fim, self.sentenca_em(inicio), self.paragrafo_em(inicio), exata, similaridade)
+
+    def _ocorrencias_exatas(self, trecho: str) -> List[int]:
+        tokens = _TOKEN.findall(trecho)
+        if tokens:
+            # Candidatos: posições do primeiro token; confere o texto exato a partir do deslocamento
+            deslocamento = trecho.find(tokens[0])
+            candidatos = (self.tokens[i][1] - deslocamento for i in self._posicoes.get(normalizar_token(tokens[0]), []))
+            ocorrencias = [c for c in candidatos if c >= 0 and self.texto.startswith(trecho, c)]
+            if ocorrencias:
+                return ocorrencias
+        # Sem trecho tokenizável, ou trecho que começa no meio de uma palavra ("ciedade precisa")
+        return [m.start() for m in re.finditer(re.escape(trecho), self.texto)]
+
+    def _alinhar(self, trecho: str) -> Optional[Tuple[int, int, float]]:
+        """Melhor janela de tokens parecida com o trecho (tokens normalizados)."""
+        alvo = [normalizar_token(t) for t in _TOKEN.findall(trecho)]
+        if not alvo:
+            return None
+        # Âncora: o token do trecho mais raro no texto
+        ancoras = [(len(self._posicoes[t]), j) for j, t in enumerate(alvo) if t in self._posicoes]
+        if not ancoras:
+            return None
+        _, j = min(ancoras)
+        melhor = None
+        for i in self._posicoes[alvo[j]]:
+            for tamanho in {len(alvo) - 1, len(alvo), len(alvo) + 1} - {0}:
+                inicio = max(0, i - j)
+                janela = self.tokens[inicio:inicio + tamanho]
+                if not janela:
+                    continue
+                similaridade = SequenceMatcher(None, alvo, [t for t, _, _ in janela]).ratio()
+                if melhor is None or similaridade > melhor[2]:
+                    melhor = (janela[0][1], janela[-1][2], similaridade)
+        return melhor if melhor and melhor[2] >= SIMILARIDADE_MINIMA else None
+
+    def localizar(self, trecho: str, perto_de: Optional[int] = None, reservar: bool = True) -> Optional[Localizacao]:
+        """
+        Resolve `trecho` numa posição do texto.
+
+        Entre ocorrências exatas repetidas, prefere a mais próxima de `perto_de`
+        ou a primeira ainda não atribuída a outro erro (`reservar`). Sem
+        ocorrência exata, tenta o alinhamento aproximado.
+        """
+        trecho = trecho.strip().strip('"').strip()
+        if not trecho:
+            return None
+        ocorrencias = self._ocorrencias_exatas(trecho)
+        if ocorrencias:
+            if perto_de is not None:
+                inicio = min(ocorrencias, key=lambda c: abs(c - perto_de))
+            else:
+                livres = [c for c in ocorrencias if (c, c + len(trecho)) not in self._usados]
+                inicio = (livres or ocorrencias)[0]
+            local = self._localizacao(inicio, inicio + len(trecho), True)
+        else:
+            alinhado = self._alinhar(trecho)
+            if alinhado is None:
+                return None
+            local = self._localizacao(alinhado[0], alinhado[1], False, alinhado[2])
+        if reservar:
+            self._usados.add((local.inicio, local.fim))
+        return local
+
+    def localizar_erros(self, erros: Iterable[Dict]) -> List[Optional[Localizacao]]:
+        return [self.localizar(erro.get("trecho", ""), erro.get("inicio")) for erro in erros]
+
+    # ------------------------------------------------------------------
+    def janela(self, local: Localizacao, margem: int) -> str:
+        """Texto de `margem` caracteres antes e depois do trecho."""
+        return self.texto[max(0, local.inicio - margem):min(len(self.texto), local.fim + margem)]
+
+    def texto_sentenca(self, indice: int) -> str:
+        inicio, fim = self.sentencas[indice]
+        return self.texto[inicio:fim]
+
+    def texto_paragrafo(self, indice: int) -> str:
+        inicio, fim = self.paragrafos[indice]
+        return self.texto[inicio:fim]
+
+    # ------------------------------------------------------------------
+    def tese(self) -> str:
+        """Sentença de tese: a última do primeiro parágrafo (a introdução)."""
+        if not self.paragrafos:
+            return ""
+        inicio_p, fim_p = self.paragrafos[0]
+        sentencas = [(i, f) for i, f in self.sentencas if inicio_p <= i < fim_p]
+        return self.texto[sentencas[-1][0]:sentencas[-1][1]] if sentencas else self.texto_paragrafo(0)
+
+    def contexto(self, local: Optional[Localizacao], politica: str, margem: int = MARGEM_JANELA) -> str:
+        """
+        Texto de referência para o prompt de revisão de um erro, segundo a política:
+
+            janela          sentenças que cobrem `margem` caracteres antes e depois do trecho
+            paragrafo       parágrafo do trecho
+            paragrafo_tese  sentença de tese seguida do parágrafo do trecho
+            completo        redação inteira
+
+        Sem localização (trecho não encontrado) o contexto é sempre a redação inteira.
+        """
+        if politica not in POLITICAS_CONTEXTO:
+            raise ValueError(f"Política de contexto desconhecida: {politica}")
+        if local is None or politica == "completo":
+            return self.texto
+        if politica == "janela":
+            primeira = self.sentenca_em(max(0, local.inicio - margem))
+            ultima = self.sentenca_em(min(len(self.texto) - 1, local.fim + margem))
+            return self.texto[self.sentencas[primeira][0]:self.sentencas[ultima][1]] if self.sentencas else self.texto
+        paragrafo = self.texto_paragrafo(local.paragrafo)
+        if politica == "paragrafo" or local.paragrafo == 0:
+            return paragrafo
+        return f"{self.tese()}\n[...]\n{paragrafo}"
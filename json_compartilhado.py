@@ -0,0 +1,65 @@
+"""
+Arquivos JSON atualizados por vários processos (read-modify-write com trava).
+
+O consolidado de uso diário (custos) e o placar da especulação
+(nota_especulativa) são somados por todo processo que persiste correções: o
+app, os processos do servico_correcao e os trabalhadores da fila. Uma trava de
+thread só protege o próprio processo; aqui a leitura, a atualização e a
+gravação acontecem com uma trava exclusiva (fcntl.flock) num arquivo
+`<caminho>.lock` ao lado, e a gravação passa por um temporário por processo
+trocado atomicamente (os.replace), então leitores nunca veem o arquivo pela
+metade e nenhum incremento se perde.
+
+Sem fcntl (Windows) resta a trava de thread, suficiente para um processo só.
+
+Uso:
+    atualizar(caminho, lambda dados: dados.update(total=dados.get("total", 0) + 1))
+"""
+import json
+import os
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+_trava_processo = threading.Lock()
+
+
+@contextmanager
+def _travar(caminho: str) -> Iterator[None]:
+    with _trava_processo:
+        if fcntl is None:
+            yield
+            return
+        with open(f"{caminho}.lock", "a") as trava:
+            fcntl.flock(trava.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(trava.fileno(), fcntl.LOCK_UN)
+
+
+def ler(caminho: str) -> Dict[str, Any]:
+    """Conteúdo do arquivo; dict vazio se ele não existir."""
+    try:
+        with open(caminho, encoding="utf-8") as arquivo:
+            return json.load(arquivo)
+    except FileNotFoundError:
+        return {}
+
+
+def atualizar(caminho: str, alterar: Callable[[Dict[str, Any]], None]) -> Dict[str, Any]:
+    """Lê o arquivo, aplica `alterar` ao dict (no lugar) e grava, tudo sob a trava entre processos."""
+    os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+    with _travar(caminho):
+        dados = ler(caminho)
+        alterar(dados)
+        temporario = f"{caminho}.{os.getpid()}.tmp"
+        with open(temporario, "w", encoding="utf-8") as arquivo:
+            json.dump(dados, arquivo, ensure_ascii=False, indent=2)
+        os.replace(temporario, caminho)
+    return dados
@@ -0,0 +1,192 @@
+"""
+Nota especulativa: faixa provisória calculada antes das revisões terminarem.
+
+Assim que a detecção de uma competência termina, os erros detectados já dão
+uma faixa de nota pelas regras conhecidas de antemão:
+
+    competency1   nota base de calcular_nota_base_competency1 sobre os erros
+                  detectados; a revisão só remove erros, e ajustar_nota_competency1
+                  limita a nota final a 40 pontos da base;
+    competency2-5 faixa da rubrica pelo número de erros (NOTA_POR_ERROS), com a
+                  mesma margem de uma faixa (40 pontos), já que a nota final é do modelo.
+
+A cada revisão concluída a faixa é recalculada com os erros confirmados e os
+ainda pendentes, e o callback da correção recebe o resumo atualizado. Quando a
+nota final de uma competência sai, a primeira especulação é comparada com ela
+e o acerto é somado ao placar persistido em ESPECULACAO_ARQUIVO.
+
+Uso:
+    with acompanhar_redacao(ao_atualizar, regras) as especulacao:
+        ...  # detecção e revisões chamam deteccao_concluida/revisao_concluida
+"""
+import logging
+import os
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import json_compartilhado
+import rastreamento
+
+logger = logging.getLogger(__name__)
+
+ARQUIVO_PLACAR = os.getenv("ESPECULACAO_ARQUIVO", os.path.join(".dados", "especulacao.json"))
+
+NOTA_MAXIMA = 200
+MARGEM = 40
+
+# Faixa da rubrica das Competências 2 a 5 pelo número de erros confirmados
+NOTA_POR_ERROS = (200, 160, 160, 120, 120, 80, 80, 40)
+
+RegraNota = Callable[[List[Dict[str, Any]]], int]
+
+
+def nota_por_erros(erros: List[Dict[str, Any]]) -> int:
+    return NOTA_POR_ERROS[len(erros)] if len(erros) < len(NOTA_POR_ERROS) else 0
+
+
+@dataclass
+class EstadoCompetencia:
+    confirmados: List[Dict[str, Any]] = field(default_factory=list)
+    pendentes: List[Dict[str, Any]] = field(default_factory=list)
+    provavel_inicial: Optional[int] = None
+    nota_final: Optional[int] = None
+
+
+class Especulacao:
+    """Faixas provisórias das competências de uma redação."""
+
+    def __init__(self, competencias: List[str], ao_atualizar: Optional[Callable[[Dict[str, Any]], None]] = None,
+                 regras: Optional[Dict[str, RegraNota]] = None):
+        self.competencias = list(competencias)
+        self.ao_atualizar = ao_atualizar
+        self.regras = regras or {}
+        self.estados: Dict[str, EstadoCompetencia] = {}
+
+    def _regra(self, competencia: str) -> RegraNota:
+        return self.regras.get(competencia, nota_por_erros)
+
+    def faixa(self, competencia: str) -> Dict[str, Any]:
+        estado = self.estados.get(competencia)
+        if estado is None:
+            return {"minimo": 0, "provavel": None, "maximo": NOTA_MAXIMA, "provisoria": True}
+        if estado.nota_final is not None:
+            return {"minimo": estado.nota_final, "provavel": estado.nota_final, "maximo": estado.nota_final,
+                    "provisoria": False}
+        regra = self._regra(competencia)
+        # Pendentes podem ser rejeitados na revisão: o pior caso conta todos, o melhor nenhum
+        pior = regra(estado.confirmados + estado.pendentes)
+        melhor = regra(estado.confirmados)
+        return {"minimo": max(0, pior - MARGEM), "provavel": pior, "maximo": min(NOTA_MAXIMA, melhor + MARGEM),
+                "provisoria": True}
+
+    def resumo(self) -> Dict[str, Any]:
+        faixas = {comp: self.faixa(comp) for comp in self.competencias}
+        provaveis = [f["provavel"] for f in faixas.values()]
+        return {
+            "competencias": faixas,
+            "total": {
+                "minimo": sum(f["minimo"] for f in faixas.values()),
+                "provavel": sum(provaveis) if None not in provaveis else None,
+                "maximo": sum(f["maximo"] for f in faixas.values()),
+                "provisoria": any(f["provisoria"] for f in faixas.values()),
+            },
+        }
+
+    def _notificar(self):
+        if self.ao_atualizar is None:
+            return
+        try:
+            self.ao_atualizar(self.resumo())
+        except Exception as e:
+            # A nota provisória é só apresentação: falhas na interface não interrompem a correção
+            logger.error(f"Erro ao atualizar nota provisória: {e}")
+
+    def deteccao_concluida(self, competencia: str, detectados: List[Dict[str, Any]],
+                           confirmados: Optional[List[Dict[str, Any]]] = None):
+        estado = EstadoCompetencia(list(confirmados or []), list(detectados))
+        self.estados[competencia] = estado
+        estado.provavel_inicial = self.faixa(competencia)["provavel"]
+        self._notificar()
+
+    def revisao_concluida(self, competencia: str, erro: Dict[str, Any], confirmado: bool):
+        estado = self.estados.get(competencia)
+        if estado is None:
+            return
+        for i, pendente in enumerate(estado.pendentes):
+            if pendente is erro:
+                del estado.pendentes[i]
+                break
+        if confirmado:
+            estado.confirmados.append(erro)
+        self._notificar()
+
+    def nota_concluida(self, competencia: str, nota: int):
+        estado = self.estados.setdefault(competencia, EstadoCompetencia())
+        estado.nota_final = nota
+        if estado.provavel_inicial is not None:
+            registrar_acerto(competencia, estado.provavel_inicial, nota)
+        self._notificar()
+
+
+_especulacao_atual: ContextVar[Optional[Especulacao]] = ContextVar("especulacao", default=None)
+
+
+@contextmanager
+def acompanhar_redacao(competencias: List[str], ao_atualizar: Optional[Callable[[Dict[str, Any]], None]] = None,
+                       regras: Optional[Dict[str, RegraNota]] = None) -> Iterator[Especulacao]:
+    """Ativa uma Especulacao para as etapas executadas dentro do bloco."""
+    especulacao = Especulacao(competencias, ao_atualizar, regras)
+    token = _especulacao_atual.set(especulacao)
+    try:
+        yield especulacao
+    finally:
+        _especulacao_atual.reset(token)
+
+
+def _competencia_atual(competencia: Optional[str]) -> Optional[str]:
+    return competencia or rastreamento.atributo_atual("competencia")
+
+
+def deteccao_concluida(detectados: List[Dict[str, Any]], confirmados: Optional[List[Dict[str, Any]]] = None,
+                       competencia: Optional[str] = None):
+    """Registra os erros detectados (ainda não revisados) na especulação ativa, se houver."""
+    especulacao = _especulacao_atual.get()
+    competencia = _competencia_atual(competencia)
+    if especulacao is not None and competencia:
+        especulacao.deteccao_concluida(competencia, detectados, confirmados)
+
+
+def revisao_concluida(erro: Dict[str, Any], confirmado: bool, competencia: Optional[str] = None):
+    especulacao = _especulacao_atual.get()
+    competencia = _competencia_atual(competencia)
+    if especulacao is not None and competencia:
+        especulacao.revisao_concluida(competencia, erro, confirmado)
+
+
+def nota_concluida(nota: int, competencia: Optional[str] = None):
+    especulacao = _especulacao_atual.get()
+    competencia = _competencia_atual(competencia)
+    if especulacao is not None and competencia:
+        especulacao.nota_concluida(competencia, nota)
+
+
+def registrar_acerto(competencia: str, provavel: int, nota: int, caminho: Optional[str] = None):
+    """Soma ao placar se a nota provável da primeira especulação coincidiu com a final (ou ficou a uma faixa)."""
+    def somar(placar: Dict[str, Any]):
+        registro = placar.setdefault(competencia, {"especulacoes": 0, "exatas": 0, "uma_faixa": 0})
+        registro["especulacoes"] += 1
+        registro["exatas"] += int(provavel == nota)
+        registro["uma_faixa"] += int(abs(provavel - nota) <= MARGEM)
+
+    try:
+        # Trava entre processos: os processos do servico_correcao somam no mesmo placar
+        json_compartilhado.atualizar(caminho or ARQUIVO_PLACAR, somar)
+    except OSError as e:
+        logger.error(f"Erro ao gravar placar da especulação: {e}")
+
+
+def carregar_placar(caminho: Optional[str] = None) -> Dict[str, Any]:
+    """Lê o placar de acertos por competência; retorna um dict vazio se o arquivo não existir."""
+    return json_compartilhado.ler(caminho or ARQUIVO_PLACAR)
@@ -0,0 +1,155 @@
+"""
+Orçamento de tokens dos prompts.
+
+Todo prompt com partes de tamanho variável (a redação, o trecho de referência,
+a análise, a lista de erros) é montado por enquadrar(): o prompt é medido com
+prompts.contar_tokens e, se passar do limite da etapa, a maior seção é
+reduzida e o prompt remontado, até caber ou até as seções chegarem ao piso.
+
+Políticas por tipo de seção:
+
+    texto   mantém o início e o fim e troca o meio por uma marca com o número de
+            caracteres omitidos (a introdução e a conclusão da redação ficam);
+    erros   lista de erros: primeiro cada erro fica só com os campos essenciais;
+            se ainda não couber, ficam os primeiros e o resto vira um resumo
+            com a quantidade omitida.
+
+Cada redução é registrada no log e num span "orcamento:<etapa>" do rastro;
+truncamentos_do_rastro() reúne as de uma redação para os resultados.
+
+Os limites por etapa podem ser sobrescritos com um arquivo JSON apontado por
+ORCAMENTO_TOKENS, no formato {"revisao": 2500, "analise": 8000}.
+"""
+import json
+import logging
+import os
+from typing import Any, Callable, Dict, List, Optional
+
+import prompts
+import rastreamento
+
+logger = logging.getLogger(__name__)
+
+# Tokens por prompt, pela etapa (prefixo antes de ":"). Uma redação do ENEM tem
+# cerca de 800 tokens; os limites só pegam textos colados muito maiores que isso.
+LIMITES: Dict[str, int] = {
+    "deteccao": 4000,
+    "revisao": 3000,
+    "analise": 6000,
+    "nota": 4000,
+    "fundido": 6000,
+}
+LIMITE_PADRAO = int(os.getenv("ORCAMENTO_TOKENS_PADRAO", "6000"))
+
+# Abaixo disso uma seção não é mais reduzida
+PISO_TOKENS = 200
+
+# Tamanho máximo aceito na caixa de texto da redação (cerca de 6x uma redação longa)
+MAX_CARACTERES_REDACAO = int(os.getenv("ORCAMENTO_MAX_CARACTERES_REDACAO", "20000"))
+
+CAMPOS_ESSENCIAIS_ERRO = ("descrição", "descricao", "trecho", "sugestão", "sugestao")
+
+_MAX_RODADAS = 8
+
+# Margem para a marca de corte e a imprecisão da proporção caracteres/tokens
+_FOLGA_TOKENS = 32
+
+_caminho_limites = os.getenv("ORCAMENTO_TOKENS")
+if _caminho_limites:
+    with open(_caminho_limites, encoding="utf-8") as _arquivo:
+        LIMITES.update({etapa: int(limite) for etapa, limite in json.load(_arquivo).items()})
+
+
+def limite(etapa: str) -> int:
+    return LIMITES.get(etapa.split(":", 1)[0], LIMITE_PADRAO)
+
+
+def _medir(valor: Any) -> int:
+    if isinstance(valor, str):
+        return prompts.contar_tokens(valor)
+    return prompts.contar_tokens(json.dumps(valor, ensure_ascii=False, indent=2))
+
+
+def cortar_texto(texto: str, alvo_tokens: int) -> str:
+    """Mantém início e fim de `texto` em cerca de `alvo_tokens` tokens, marcando o corte."""
+    tokens = prompts.contar_tokens(texto)
+    if tokens <= alvo_tokens:
+        return texto
+    manter = max(0, int(len(texto) * alvo_tokens / tokens))
+    inicio = texto[:manter * 2 // 3].rsplit(" ", 1)[0]
+    fim = texto[len(texto) - manter // 3:].split(" ", 1)[-1] if manter // 3 else ""
+    omitidos = len(texto) - len(inicio) - len(fim)
+    return f"{inicio}\n[... {omitidos} caracteres omitidos por limite de tamanho ...]\n{fim}"
+
+
+def resumir_erros(erros: List[Dict[str, Any]], alvo_tokens: int) -> List[Dict[str, Any]]:
+    """Reduz a lista de erros a cerca de `alvo_tokens` tokens (campos essenciais, depois os primeiros)."""
+    compactos = [{chave: valor for chave, valor in erro.items() if chave in CAMPOS_ESSENCIAIS_ERRO}
+                 for erro in erros]
+    tokens = _medir(compactos)
+    if tokens <= alvo_tokens or not compactos:
+        return compactos
+    manter = max(1, int(len(compactos) * alvo_tokens / tokens))
+    omitidos = len(compactos) - manter
+    return compactos[:manter] + [{"resumo": f"mais {omitidos} erros omitidos por limite de tamanho"}]
+
+
+def _reduzir(valor: Any, alvo_tokens: int) -> Any:
+    if isinstance(valor, str):
+        return cortar_texto(valor, alvo_tokens)
+    return resumir_erros(valor, alvo_tokens)
+
+
+def enquadrar(etapa: str, montar: Callable[..., str], **secoes: Any) -> str:
+    """
+    Monta o prompt com montar(**secoes), reduzindo as seções até caber no limite da etapa.
+
+    Seções str seguem a política de texto; listas, a de erros.
+    """
+    maximo = limite(etapa)
+    prompt = montar(**secoes)
+    tokens_prompt = prompts.contar_tokens(prompt)
+    if tokens_prompt <= maximo:
+        return prompt
+
+    valores = dict(secoes)
+    originais = {nome: _medir(valor) for nome, valor in secoes.items()}
+    atuais = dict(originais)
+    for _ in range(_MAX_RODADAS):
+        excesso = tokens_prompt - maximo
+        redutiveis = [nome for nome, tokens in atuais.items() if tokens > PISO_TOKENS]
+        if excesso <= 0 or not redutiveis:
+            break
+        nome = max(redutiveis, key=atuais.get)
+        # Sempre a partir do valor original, para não acumular marcas de corte
+        secoes[nome] = _reduzir(valores[nome], max(PISO_TOKENS, atuais[nome] - excesso - _FOLGA_TOKENS))
+        novo = _medir(secoes[nome])
+        if novo >= atuais[nome]:
+            atuais[nome] = PISO_TOKENS  # a política não reduz mais esta seção
+            continue
+        atuais[nome] = novo
+        prompt = montar(**secoes)
+        tokens_prompt = prompts.contar_tokens(prompt)
+
+    reducoes = [{"etapa": etapa, "secao": nome, "tokens_antes": originais[nome], "tokens_depois": _medir(secoes[nome])}
+                for nome in secoes if _medir(secoes[nome]) < originais[nome]]
+    _registrar(etapa, reducoes, tokens_prompt, maximo)
+    return prompt
+
+
+def _registrar(etapa: str, reducoes: List[Dict[str, Any]], tokens_prompt: int, maximo: int):
+    for reducao in reducoes:
+        logger.warning(f"Prompt de {etapa}: seção {reducao['secao']} reduzida de "
+                       f"{reducao['tokens_antes']} para {reducao['tokens_depois']} tokens")
+    if tokens_prompt > maximo:
+        logger.warning(f"Prompt de {etapa} com {tokens_prompt} tokens mesmo após reduções (limite {maximo})")
+    competencia = rastreamento.atributo_atual("competencia")
+    with rastreamento.span(f"orcamento:{etapa}", tipo="orcamento", tokens_prompt=tokens_prompt, limite=maximo) as span:
+        span.atributos["truncamentos"] = [{**reducao, "competencia": competencia} for reducao in reducoes]
+
+
+def truncamentos_do_rastro(rastro: Optional[rastreamento.Rastro]) -> List[Dict[str, Any]]:
+    """Reduções de prompt feitas durante a correção de uma redação."""
+    if rastro is None:
+        return []
+    return [reducao for span in rastro.spans for reducao in span.atributos.get("truncamentos", [])]
@@ -0,0 +1,229 @@
+"""
+Pré-filtro local de ortografia e acentuação para a Competência 1.
+
+O léxico é um arquivo texto ordenado por bytes, uma linha "chave\\tpalavra"
+por forma, em que a chave é a palavra em minúsculas sem acentos e a palavra
+mantém a grafia da lista (nomes próprios com maiúscula). O arquivo é mapeado em
+memória (mmap) e consultado por busca binária: não é carregado no heap e vários
+processos compartilham as mesmas páginas.
+
+Para cada palavra da redação:
+    - está no léxico: correta;
+    - não está, mas a chave sem acentos existe: erro de acentuação certo,
+      registrado localmente no formato ERRO/FIM_ERRO;
+    - só existe com maiúscula (brasil -> Brasil), ou abre a sentença com
+      minúscula: erro de maiúscula, também registrado localmente;
+    - a chave não existe: caso ambíguo (erro de grafia, abreviação,
+      estrangeirismo, neologismo), enviado ao modelo só com as sentenças em que
+      aparece.
+
+Palavras com maiúscula fora do início da sentença (nomes próprios) e siglas
+não são verificadas.
+
+A lista de origem precisa ter todas as formas flexionadas, uma por linha. O
+.dic do hunspell não serve: ele guarda radicais com marcas de afixo
+("analisar/XYZ") e, sem expandi-las, formas como "sabia", "critica" e "analise"
+ficariam de fora e seriam acusadas como erro de acentuação. Expanda antes com
+o unmunch:
+    unmunch pt_BR.dic pt_BR.aff > palavras.txt
+    python ortografia_local.py construir palavras.txt --saida .dados/lexico_ptbr.txt
+"""
+import argparse
+import mmap
+import os
+import re
+import threading
+import unicodedata
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from indice_texto import IndiceTexto
+
+ARQUIVO_LEXICO = os.getenv("ORTOGRAFIA_LEXICO", os.path.join(".dados", "lexico_ptbr.txt"))
+
+_PALAVRA = re.compile(r"[^\W\d_]+(?:-[^\W\d_]+)*")
+
+
+def sem_acentos(palavra: str) -> str:
+    decomposto = unicodedata.normalize("NFD", palavra)
+    return unicodedata.normalize("NFC", "".join(c for c in decomposto if not unicodedata.combining(c)))
+
+
+class LexicoMapeado:
+    """Léxico ordenado em arquivo, consultado por busca binária sobre o mmap."""
+
+    def __init__(self, caminho: str):
+        self._arquivo = open(caminho, "rb")
+        self._mapa = mmap.mmap(self._arquivo.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _linha(self, posicao: int) -> Tuple[int, int]:
+        inicio = self._mapa.rfind(b"\n", 0, posicao) + 1
+        fim = self._mapa.find(b"\n", inicio)
+        return inicio, len(self._mapa) if fim == -1 else fim
+
+    def formas(self, chave: str) -> List[str]:
+        """Todas as palavras do léxico cuja forma sem acentos é `chave`."""
+        alvo = chave.encode("utf-8") + b"\t"
+        baixo, alto = 0, len(self._mapa)
+        while baixo < alto:
+            inicio, fim = self._linha((baixo + alto) // 2)
+            if self._mapa[inicio:fim] < alvo:
+                baixo = fim + 1
+            else:
+                alto = inicio
+        formas = []
+        while baixo < len(self._mapa):
+            inicio, fim = self._linha(baixo)
+            linha = self._mapa[inicio:fim]
+            if not linha.startswith(alvo):
+                break
+            formas.append(linha[len(alvo):].decode("utf-8"))
+            baixo = fim + 1
+        return formas
+
+    def __contains__(self, palavra: str) -> bool:
+        return palavra in self.formas(sem_acentos(palavra.lower()))
+
+    def fechar(self):
+        self._mapa.close()
+        self._arquivo.close()
+
+
+@dataclass
+class ResultadoOrtografia:
+    erros: List[Dict[str, str]] = field(default_factory=list)
+    ambiguas: List[Tuple[str, int, int]] = field(default_factory=list)
+
+    def como_texto_erros(self) -> str:
+        """Erros no formato ERRO/FIM_ERRO lido por extrair_erros_do_resultado."""
+        return "\n".join(
+            "ERRO\n"
+            f"Descrição: {erro['descrição']}\n"
+            f"Trecho: \"{erro['trecho']}\"\n"
+            f"Explicação: {erro['explicação']}\n"
+            f"Sugestão: {erro['sugestão']}\n"
+            "FIM_ERRO"
+            for erro in self.erros
+        )
+
+
+class VerificadorOrtografia:
+    def __init__(self, lexico: LexicoMapeado):
+        self.lexico = lexico
+
+    def _conhecida(self, palavra: str) -> Optional[List[str]]:
+        """None se a palavra está correta; senão as formas possíveis no léxico (lista vazia: desconhecida)."""
+        minuscula = palavra.lower()
+        formas = self.lexico.formas(sem_acentos(minuscula))
+        if minuscula in formas or palavra in formas:
+            return None
+        if "-" in minuscula and not formas:
+            # Compostos e ênclises (fazê-lo): basta cada parte ser conhecida
+            partes = [self._conhecida(parte) for parte in palavra.split("-")]
+            return None if all(p is None for p in partes) else []
+        return formas
+
+    def verificar(self, texto: str) -> ResultadoOrtografia:
+        resultado = ResultadoOrtografia()
+        inicios_sentenca = {inicio for inicio, _ in IndiceTexto(texto).sentencas}
+        for m in _PALAVRA.finditer(texto):
+            palavra = m.group()
+            if palavra.isupper() and len(palavra) > 1:
+                continue  # sigla
+            inicio_sentenca = m.start() in inicios_sentenca
+            if palavra[0].isupper() and not inicio_sentenca:
+                continue  # nome próprio
+            formas = self._conhecida(palavra)
+            nomes = [f for f in formas or [] if f.lower() == palavra.lower()]
+            if nomes:
+                resultado.erros.append(_erro_maiuscula(palavra, nomes[0], "é nome próprio"))
+                continue
+            if inicio_sentenca and palavra[0].islower():
+                sugestao = palavra[0].upper() + palavra[1:]
+                resultado.erros.append(_erro_maiuscula(palavra, sugestao, "inicia a sentença"))
+            if formas is None:
+                continue
+            if formas:
+                sugestao = " ou ".join(f if palavra[0].islower() else f[0].upper() + f[1:] for f in formas)
+                resultado.erros.append({
+                    "descrição": f"Erro de acentuação na palavra '{palavra}'",
+                    "trecho": palavra,
+                    "explicação": f"A forma '{palavra}' não existe na norma-padrão; a grafia correta leva acento gráfico.",
+                    "sugestão": sugestao,
+                })
+            else:
+                resultado.ambiguas.append((palavra, m.start(), m.end()))
+        return resultado
+
+
+def _erro_maiuscula(palavra: str, sugestao: str, motivo: str) -> Dict[str, str]:
+    return {
+        "descrição": f"Erro de maiúscula na palavra '{palavra}'",
+        "trecho": palavra,
+        "explicação": f"A palavra {motivo} e deve ser escrita com letra maiúscula.",
+        "sugestão": sugestao,
+    }
+
+
+def construir_lexico(origem: str, destino: str) -> int:
+    """
+    Gera o arquivo de léxico ordenado a partir de uma lista de palavras; retorna o total de formas.
+
+    A lista deve estar expandida (todas as formas flexionadas, por exemplo a
+    saída do unmunch); um .dic com marcas de afixo é recusado com ValueError.
+    """
+    palavras = set()
+    with open(origem, encoding="utf-8") as arquivo:
+        for numero, linha in enumerate(arquivo, 1):
+            palavra = unicodedata.normalize("NFC", linha.strip())
+            if "/" in palavra:
+                raise ValueError(
+                    f"{origem}:{numero}: marca de afixo do hunspell em '{palavra}'; "
+                    "expanda a lista antes (unmunch pt_BR.dic pt_BR.aff)"
+                )
+            if palavra and "\t" not in palavra:
+                palavras.add(palavra)
+    linhas = sorted(f"{sem_acentos(p.lower())}\t{p}".encode("utf-8") for p in palavras)
+    os.makedirs(os.path.dirname(destino) or ".", exist_ok=True)
+    with open(destino, "wb") as arquivo:
+        arquivo.write(b"\n".join(linhas))
+    return len(linhas)
+
+
+_verificador: Optional[VerificadorOrtografia] = None
+_trava = threading.Lock()
+
+
+def obter_verificador() -> Optional[VerificadorOrtografia]:
+    """Verificador do processo, ou None se não houver léxico (a detecção fica toda com o modelo)."""
+    global _verificador
+    with _trava:
+        if _verificador is None and os.path.exists(ARQUIVO_LEXICO):
+            _verificador = VerificadorOrtografia(LexicoMapeado(ARQUIVO_LEXICO))
+        return _verificador
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Léxico do pré-filtro de ortografia")
+    subcomandos = parser.add_subparsers(dest="comando", required=True)
+    construir = subcomandos.add_parser("construir", help="Gera o léxico a partir de uma lista de palavras")
+    construir.add_argument("lista")
+    construir.add_argument("--saida", default=ARQUIVO_LEXICO)
+    verificar = subcomandos.add_parser("verificar", help="Verifica um arquivo de texto")
+    verificar.add_argument("texto")
+    args = parser.parse_args()
+
+    if args.comando == "construir":
+        print(f"{construir_lexico(args.lista, args.saida)} formas gravadas em {args.saida}")
+    else:
+        verificador = obter_verificador()
+        if verificador is None:
+            parser.error(f"Léxico não encontrado: {ARQUIVO_LEXICO}")
+        with open(args.texto, encoding="utf-8") as arquivo:
+            resultado = verificador.verificar(arquivo.read())
+        print(resultado.como_texto_erros())
+        print(f"Ambíguas: {', '.join(p for p, _, _ in resultado.ambiguas) or 'nenhuma'}")
+
+
+if __name__ == "__main__":
+    main()
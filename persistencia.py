@@ -0,0 +1,332 @@
+"""
+Persistência assíncrona (write-behind) das redações corrigidas.
+
+processar_redacao_completa apenas enfileira o documento e retorna; uma thread
+de fundo agrupa os documentos em lotes por destino (bulk no Elasticsearch,
+insert de várias linhas no Supabase) e grava fora do caminho da requisição.
+
+Todo documento é anotado antes num spool JSONL local (pendente/confirmado por
+destino). Lotes que falham voltam para a fila com backoff; o que não for
+confirmado até o encerramento do processo continua no spool e é reenfileirado
+na próxima inicialização. No encerramento (atexit) a fila é esvaziada.
+
+O spool só cresce enquanto o processo grava; a thread de fundo o reescreve só
+com o que está em aberto quando a fila fica ociosa depois de confirmações, ou
+quando ele passa de LIMITE_SPOOL_BYTES (e do dobro do tamanho deixado pela
+última compactação, para um destino fora do ar não forçar uma reescrita a
+cada lote).
+
+Uso:
+    fila = configurar([EscritorElasticsearch(es, "redacoes"), EscritorSupabase(supabase, "redacoes")])
+    fila.enfileirar({"user_id": ..., "redacao_texto": ..., ...})
+"""
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+ARQUIVO_SPOOL = os.getenv("PERSISTENCIA_SPOOL", os.path.join(".dados", "persistencia_spool.jsonl"))
+
+TAMANHO_LOTE = 100
+INTERVALO_LOTE_S = 0.5
+MAX_TENTATIVAS = 5
+LIMITE_SPOOL_BYTES = int(os.getenv("PERSISTENCIA_SPOOL_MAX_BYTES", str(16 * 1024 * 1024)))
+
+
+class Escritor:
+    """Destino de persistência. `gravar_lote` deve levantar exceção se o lote não foi gravado."""
+
+    nome = "escritor"
+
+    def gravar_lote(self, documentos: List[Dict[str, Any]]):
+        raise NotImplementedError
+
+
+class EscritorElasticsearch(Escritor):
+    """Grava o lote com uma única requisição bulk; o id do documento torna a retentativa idempotente."""
+
+    nome = "elasticsearch"
+
+    def __init__(self, cliente, indice: str = "redacoes"):
+        self.cliente = cliente
+        self.indice = indice
+
+    def gravar_lote(self, documentos: List[Dict[str, Any]]):
+        from elasticsearch.helpers import bulk
+
+        acoes = [{"_index": self.indice, "_id": doc["id"], "_source": doc} for doc in documentos]
+        bulk(self.cliente, acoes)
+
+
+class EscritorSupabase(Escritor):
+    """Grava o lote como um único upsert de várias linhas."""
+
+    nome = "supabase"
+
+    def __init__(self, cliente, tabela: str = "redacoes",
+                 montar_linha: Optional[Callable[[Dict[str, Any]], Dict[str, Any]]] = None):
+        self.cliente = cliente
+        self.tabela = tabela
+        self.montar_linha = montar_linha or (lambda doc: doc)
+
+    def gravar_lote(self, documentos: List[Dict[str, Any]]):
+        self.cliente.table(self.tabela).upsert([self.montar_linha(doc) for doc in documentos]).execute()
+
+
+class EscritorPorDocumento(Escritor):
+    """Adapta uma função que grava um documento por vez (ex.: save_redacao_es) à interface de lote."""
+
+    def __init__(self, nome: str, funcao: Callable[[Dict[str, Any]], Any]):
+        self.nome = nome
+        self.funcao = funcao
+
+    def gravar_lote(self, documentos: List[Dict[str, Any]]):
+        for doc in documentos:
+            self.funcao(doc)
+
+
+class EscritorMemoria(Escritor):
+    """Destino local para desenvolvimento e benchmarks, com latência e falhas simuladas."""
+
+    def __init__(self, nome: str = "memoria", latencia_s: float = 0.0, falhas: int = 0):
+        self.nome = nome
+        self.latencia_s = latencia_s
+        self.falhas = falhas
+        self.documentos: List[Dict[str, Any]] = []
+        self.lotes = 0
+
+    def gravar_lote(self, documentos: List[Dict[str, Any]]):
+        if self.latencia_s:
+            time.sleep(self.latencia_s)
+        if self.falhas > 0:
+            self.falhas -= 1
+            raise ConnectionError(f"{self.nome}: falha simulada")
+        self.documentos.extend(documentos)
+        self.lotes += 1
+
+
+class FilaPersistencia:
+    """Fila write-behind com lotes por destino, retentativas e spool durável."""
+
+    def __init__(self, escritores: List[Escritor], arquivo_spool: Optional[str] = ARQUIVO_SPOOL,
+                 tamanho_lote: int = TAMANHO_LOTE, intervalo_s: float = INTERVALO_LOTE_S,
+                 max_tentativas: int = MAX_TENTATIVAS, limite_spool_bytes: int = LIMITE_SPOOL_BYTES):
+        self.escritores = {e.nome: e for e in escritores}
+        self.arquivo_spool = arquivo_spool
+        self.tamanho_lote = tamanho_lote
+        self.intervalo_s = intervalo_s
+        self.max_tentativas = max_tentativas
+        self.limite_spool_bytes = limite_spool_bytes
+
+        self._pendentes: Dict[str, Deque[Tuple[Dict[str, Any], int]]] = {nome: deque() for nome in self.escritores}
+        self._proxima_tentativa: Dict[str, float] = {nome: 0.0 for nome in self.escritores}
+        self._em_voo = 0
+        self._cond = threading.Condition()
+        self._trava_spool = threading.Lock()
+        self._encerrando = False
+        # Tamanho do spool e confirmações anotadas desde a última compactação
+        self._bytes_spool = 0
+        self._bytes_compactado = 0
+        self._confirmacoes_pendentes_compactacao = 0
+
+        self._recuperar_spool()
+        self._thread = threading.Thread(target=self._laco, name="persistencia", daemon=True)
+        self._thread.start()
+
+    # ------------------------------------------------------------------
+    def enfileirar(self, documento: Dict[str, Any]) -> str:
+        """Anota o documento no spool, enfileira para todos os destinos e retorna o id."""
+        doc = {"id": uuid.uuid4().hex, "criado_em": datetime.now().isoformat(), **documento}
+        for nome in self.escritores:
+            self._anotar({"op": "pendente", "escritor": nome, "id": doc["id"], "documento": doc})
+        with self._cond:
+            for nome in self.escritores:
+                self._pendentes[nome].append((doc, 0))
+            self._cond.notify()
+        return doc["id"]
+
+    def pendentes(self) -> int:
+        with self._cond:
+            return sum(len(fila) for fila in self._pendentes.values()) + self._em_voo
+
+    def esvaziar(self, timeout: Optional[float] = None) -> bool:
+        """Aguarda até que nada esteja pendente; retorna False se o tempo esgotar."""
+        limite = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self._cond.notify_all()
+            while sum(len(fila) for fila in self._pendentes.values()) + self._em_voo:
+                restante = None if limite is None else limite - time.monotonic()
+                if restante is not None and restante <= 0:
+                    return False
+                self._cond.wait(restante if restante is not None else self.intervalo_s)
+        self._compactar_spool()
+        return True
+
+    def encerrar(self, timeout: float = 10.0):
+        """Grava o que estiver pendente e para a thread de fundo."""
+        esvaziou = self.esvaziar(timeout)
+        with self._cond:
+            self._encerrando = True
+            self._cond.notify_all()
+        self._thread.join(timeout=1.0)
+        if not esvaziou:
+            logger.warning(f"Persistência encerrada com {self.pendentes()} gravações no spool")
+
+    # ------------------------------------------------------------------
+    def _laco(self):
+        while True:
+            with self._cond:
+                lote = self._proximo_lote()
+                if lote is None and not self._encerrando:
+                    self._cond.wait(self.intervalo_s)
+                    lote = self._proximo_lote()
+                if lote is None and self._encerrando:
+                    return
+                if lote is None:
+                    ociosa = not self._em_voo and not any(self._pendentes.values())
+                else:
+                    self._em_voo += len(lote[1])
+            if lote is not None:
+                self._gravar(*lote)
+                if self._spool_grande():
+                    self._compactar_spool()
+            elif ociosa and self._confirmacoes_pendentes_compactacao:
+                self._compactar_spool()
+
+    def _spool_grande(self) -> bool:
+        return self._bytes_spool > max(self.limite_spool_bytes, 2 * self._bytes_compactado)
+
+    def _proximo_lote(self) -> Optional[Tuple[str, List[Tuple[Dict[str, Any], int]]]]:
+        agora = time.monotonic()
+        for nome, fila in self._pendentes.items():
+            if fila and self._proxima_tentativa[nome] <= agora:
+                return nome, [fila.popleft() for _ in range(min(self.tamanho_lote, len(fila)))]
+        return None
+
+    def _gravar(self, nome: str, itens: List[Tuple[Dict[str, Any], int]]):
+        documentos = [doc for doc, _ in itens]
+        try:
+            self.escritores[nome].gravar_lote(documentos)
+        except Exception as e:
+            self._reagendar(nome, itens, e)
+        else:
+            for doc in documentos:
+                self._anotar({"op": "confirmado", "escritor": nome, "id": doc["id"]})
+            logger.info(f"{nome}: {len(documentos)} redações gravadas")
+        finally:
+            with self._cond:
+                self._em_voo -= len(itens)
+                self._cond.notify_all()
+
+    def _reagendar(self, nome: str, itens: List[Tuple[Dict[str, Any], int]], erro: Exception):
+        tentativas = itens[0][1] + 1
+        if tentativas >= self.max_tentativas:
+            logger.error(f"{nome}: {len(itens)} redações mantidas no spool após {tentativas} tentativas: {erro}")
+            return
+        espera = min(30.0, 2 ** (tentativas - 1))
+        logger.warning(f"{nome}: falha ao gravar lote ({erro}); nova tentativa em {espera:.0f}s")
+        with self._cond:
+            self._pendentes[nome].extendleft(reversed([(doc, tentativas) for doc, _ in itens]))
+            self._proxima_tentativa[nome] = time.monotonic() + espera
+
+    # ------------------------------------------------------------------
+    def _anotar(self, registro: Dict[str, Any]):
+        if not self.arquivo_spool:
+            return
+        linha = json.dumps(registro, ensure_ascii=False, default=str) + "\n"
+        with self._trava_spool:
+            os.makedirs(os.path.dirname(self.arquivo_spool) or ".", exist_ok=True)
+            with open(self.arquivo_spool, "a", encoding="utf-8") as arquivo:
+                arquivo.write(linha)
+                arquivo.flush()
+                os.fsync(arquivo.fileno())
+            self._bytes_spool += len(linha.encode("utf-8"))
+            if registro["op"] == "confirmado":
+                self._confirmacoes_pendentes_compactacao += 1
+
+    def _ler_spool(self) -> Dict[Tuple[str, str], Dict[str, Any]]:
+        """Retorna (escritor, id) -> documento para o que está pendente e não foi confirmado."""
+        abertos: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        try:
+            with open(self.arquivo_spool, encoding="utf-8") as arquivo:
+                for linha in arquivo:
+                    try:
+                        registro = json.loads(linha)
+                    except json.JSONDecodeError:
+                        continue  # linha truncada por queda do processo
+                    chave = (registro["escritor"], registro["id"])
+                    if registro["op"] == "pendente":
+                        abertos[chave] = registro["documento"]
+                    else:
+                        abertos.pop(chave, None)
+        except FileNotFoundError:
+            pass
+        return abertos
+
+    def _recuperar_spool(self):
+        if not self.arquivo_spool:
+            return
+        with self._trava_spool:
+            abertos = self._ler_spool()
+        # Reescreve já: descarta o que foi confirmado e a linha truncada por uma queda, que
+        # emendada à próxima anotação tornaria ilegível também a anotação nova
+        self._compactar_spool()
+        for (nome, _), doc in abertos.items():
+            if nome in self._pendentes:
+                self._pendentes[nome].append((doc, 0))
+        if abertos:
+            logger.info(f"{len(abertos)} gravações recuperadas do spool")
+
+    def _compactar_spool(self):
+        """Reescreve o spool só com o que continua em aberto."""
+        if not self.arquivo_spool:
+            return
+        with self._trava_spool:
+            abertos = self._ler_spool()
+            if not abertos and not os.path.exists(self.arquivo_spool):
+                return
+            temporario = f"{self.arquivo_spool}.tmp"
+            with open(temporario, "w", encoding="utf-8") as arquivo:
+                for (nome, id_doc), doc in abertos.items():
+                    arquivo.write(json.dumps({"op": "pendente", "escritor": nome, "id": id_doc, "documento": doc},
+                                             ensure_ascii=False, default=str) + "\n")
+            os.replace(temporario, self.arquivo_spool)
+            self._bytes_spool = self._bytes_compactado = os.path.getsize(self.arquivo_spool)
+            self._confirmacoes_pendentes_compactacao = 0
+
+
+_fila: Optional[FilaPersistencia] = None
+_trava_fila = threading.Lock()
+
+
+def configurar(escritores: List[Escritor], **opcoes) -> FilaPersistencia:
+    """Cria a fila global com os destinos informados, encerrando a anterior se houver."""
+    global _fila
+    with _trava_fila:
+        if _fila is not None:
+            _fila.encerrar()
+        _fila = FilaPersistencia(escritores, **opcoes)
+        return _fila
+
+
+def obter_fila(escritores_padrao: Callable[[], List[Escritor]]) -> FilaPersistencia:
+    """Retorna a fila global, criando-a com `escritores_padrao()` na primeira chamada."""
+    global _fila
+    with _trava_fila:
+        if _fila is None:
+            _fila = FilaPersistencia(escritores_padrao())
+        return _fila
+
+
+@atexit.register
+def _encerrar_fila():
+    if _fila is not None:
+        _fila.encerrar()
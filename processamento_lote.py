@@ -0,0 +1,510 @@
+"""
+Backend em lote (OpenAI Batch API) para correção não interativa de redações.
+
+Em vez de uma chamada síncrona por prompt, todas as chamadas de uma mesma etapa
+do pipeline, para todas as redações, são serializadas em um arquivo JSONL,
+enviadas como um único lote e recuperadas quando o lote termina:
+
+    1. detecção: critérios da Competência 1 e análises RAG das Competências 2-5
+    2. revisão: um prompt de revisão por erro detectado
+    3. análise da Competência 1 e notas das Competências 2-5
+    4. nota da Competência 1 (depende da análise da etapa 3)
+
+Uso:
+    backend = BackendLote(client)
+    resultados = backend.processar_redacoes([
+        {"texto": "...", "tema": "...", "cohmetrix": {...}},
+    ])
+
+Com empacotar=True, redações curtas são agrupadas numa só requisição nas etapas
+cujo prompt só varia pelo texto (detecção da Competência 1 e notas das
+Competências 2-5): as instruções e rubricas longas são enviadas uma vez por
+pacote, e a resposta, com um bloco RESPOSTA n/FIM_RESPOSTA n por item, é
+separada de volta por redação. Pacotes cuja resposta não puder ser separada
+(formato inválido ou saída truncada) são refeitos item a item em outro lote.
+
+Para testes e desenvolvimento sem a API, use ClienteLoteLocal, que executa as
+requisições do lote localmente contra qualquer cliente compatível com
+chat.completions (por exemplo, um servidor OpenAI local).
+"""
+import io
+import json
+import logging
+import re
+import time
+import uuid
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import analysis_function as af
+import prompts
+from indice_texto import IndiceTexto
+
+logger = logging.getLogger(__name__)
+
+ENDPOINT_CHAT = "/v1/chat/completions"
+JANELA_CONCLUSAO = "24h"
+STATUS_FINAIS = {"completed", "failed", "expired", "cancelled"}
+
+# Limite de requisições por arquivo de lote imposto pela API
+MAX_REQUISICOES_POR_LOTE = 50000
+
+COMPETENCIAS_RAG = ["competency2", "competency3", "competency4", "competency5"]
+
+# As análises RAG são geradas pelo modelo fine-tuned da própria competência
+MODELOS_RAG = {
+    "competency1_nota": af.MODELO_COMP1,
+    "competency2": af.MODELO_REVISAO_COMP2,
+    "competency3": af.MODELO_REVISAO_COMP3,
+    "competency4": af.MODELO_REVISAO_COMP4,
+    "competency5": af.MODELO_REVISAO_COMP5,
+}
+TEMPERATURA_RAG = 0.3
+
+# Empacotamento: só entram itens curtos, e cada pacote tem um teto de itens e de caracteres
+# para que a resposta conjunta caiba no limite de saída do modelo
+LIMITE_CARACTERES_ITEM = 1500
+MAX_ITENS_POR_PACOTE = 4
+MAX_CARACTERES_PACOTE = 5000
+
+# Marca o lugar do texto nos prompts montados por analysis_function antes do empacotamento
+MARCADOR_ITEM = "<<ITEM_DO_PACOTE>>"
+
+
+class ErroLote(Exception):
+    """Falha ao executar um lote na Batch API."""
+
+
+class BackendLote:
+    """Executa o pipeline de correção em etapas, cada uma como um lote da Batch API."""
+
+    def __init__(self, client, intervalo_polling: float = 60.0,
+                 recuperar_documentos: Optional[Callable[[str], List[Any]]] = None, empacotar: bool = False):
+        self.client = client
+        self.intervalo_polling = intervalo_polling
+        self.empacotar = empacotar
+        self.recuperar_documentos = recuperar_documentos or getattr(af, "retrieve_relevant_docs", None)
+        self._documentos: Dict[str, List[Any]] = {}
+
+    # ------------------------------------------------------------------
+    # Execução de lotes
+    # ------------------------------------------------------------------
+    def executar(self, requisicoes: Dict[str, Dict[str, Any]]) -> Dict[str, Optional[str]]:
+        """
+        Envia as requisições como um ou mais lotes e aguarda os resultados.
+
+        Args:
+            requisicoes: Dict custom_id -> corpo da requisição de chat completion
+
+        Returns:
+            Dict custom_id -> conteúdo da resposta (None se a requisição falhou)
+        """
+        if not requisicoes:
+            return {}
+
+        ids = list(requisicoes)
+        lotes = []
+        for inicio in range(0, len(ids), MAX_REQUISICOES_POR_LOTE):
+            trecho = {cid: requisicoes[cid] for cid in ids[inicio:inicio + MAX_REQUISICOES_POR_LOTE]}
+            lotes.append(self._enviar_lote(trecho))
+
+        respostas: Dict[str, Optional[str]] = {cid: None for cid in ids}
+        for lote in lotes:
+            respostas.update(self._aguardar_lote(lote))
+        return respostas
+
+    def executar_empacotado(self, requisicoes: Dict[str, Dict[str, Any]],
+                            pacotes: Dict[str, Tuple[Dict[str, Any], List[str]]]) -> Dict[str, Optional[str]]:
+        """
+        Como executar, mas enviando os itens de cada pacote numa só requisição.
+
+        Args:
+            requisicoes: Dict custom_id -> corpo individual de cada requisição
+            pacotes: Dict id do pacote -> (corpo empacotado, custom_ids dos itens na ordem do pacote)
+
+        Returns:
+            Dict custom_id individual -> conteúdo da resposta
+        """
+        empacotados = {cid for _, ids in pacotes.values() for cid in ids}
+        envio = {cid: corpo for cid, corpo in requisicoes.items() if cid not in empacotados}
+        envio.update({pid: corpo for pid, (corpo, _) in pacotes.items()})
+        respostas = self.executar(envio)
+
+        refazer = {}
+        for pid, (_, ids) in pacotes.items():
+            partes = _desempacotar_resposta(respostas.pop(pid, None), len(ids))
+            if partes is None:
+                logger.warning(f"Resposta do pacote {pid} não pôde ser separada; refazendo {len(ids)} itens")
+                refazer.update({cid: requisicoes[cid] for cid in ids})
+            else:
+                respostas.update(zip(ids, partes))
+        if refazer:
+            respostas.update(self.executar(refazer))
+        return respostas
+
+    def _enviar_lote(self, requisicoes: Dict[str, Dict[str, Any]]):
+        linhas = [
+            json.dumps({"custom_id": cid, "method": "POST", "url": ENDPOINT_CHAT, "body": corpo},
+                       ensure_ascii=False)
+            for cid, corpo in requisicoes.items()
+        ]
+        conteudo = ("\n".join(linhas) + "\n").encode("utf-8")
+        arquivo = self.client.files.create(
+            file=(f"lote-{uuid.uuid4().hex}.jsonl", io.BytesIO(conteudo)),
+            purpose="batch"
+        )
+        lote = self.client.batches.create(
+            input_file_id=arquivo.id,
+            endpoint=ENDPOINT_CHAT,
+            completion_window=JANELA_CONCLUSAO
+        )
+        logger.info(f"Lote {lote.id} enviado com {len(requisicoes)} requisições")
+        return lote
+
+    def _aguardar_lote(self, lote) -> Dict[str, Optional[str]]:
+        while lote.status not in STATUS_FINAIS:
+            time.sleep(self.intervalo_polling)
+            lote = self.client.batches.retrieve(lote.id)
+
+        if lote.status != "completed":
+            raise ErroLote(f"Lote {lote.id} terminou com status '{lote.status}'")
+
+        respostas = {}
+        for file_id in (lote.output_file_id, lote.error_file_id):
+            if not file_id:
+                continue
+            texto = self.client.files.content(file_id).text
+            for linha in texto.splitlines():
+                if linha.strip():
+                    registro = json.loads(linha)
+                    respostas[registro["custom_id"]] = _conteudo_da_resposta(registro)
+        return respostas
+
+    # ------------------------------------------------------------------
+    # Pipeline de correção
+    # ------------------------------------------------------------------
+    def processar_redacoes(self, redacoes: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Corrige um conjunto de redações usando a Batch API.
+
+        Args:
+            redacoes: Lista de dicts com 'texto', 'tema' e 'cohmetrix'
+
+        Returns:
+            Lista de resultados na mesma estrutura de processar_redacao_completa.
+            Redações cuja correção falhou trazem a chave 'erro'.
+        """
+        estados = [{"redacao": r, "falha": None} for r in redacoes]
+
+        # Etapa 1: detecção
+        requisicoes = {}
+        pacotes = {}
+        for i, estado in enumerate(estados):
+            texto = estado["redacao"]["texto"]
+            for criterio, prompt in af.montar_prompts_deteccao_competency1(texto).items():
+                requisicoes[f"{i}:competency1:deteccao:{criterio}"] = _corpo(af.MODELO_COMP1, prompt, 0.3)
+            for comp in COMPETENCIAS_RAG:
+                montar = getattr(af, f"montar_prompt_analise_{comp}")
+                prompt = montar(texto, estado["redacao"]["tema"], estado["redacao"]["cohmetrix"])
+                requisicoes[f"{i}:{comp}:analise"] = self._corpo_rag(comp, prompt)
+        if self.empacotar:
+            textos = {i: estado["redacao"]["texto"] for i, estado in enumerate(estados)}
+            for criterio, modelo_prompt in af.montar_prompts_deteccao_competency1(MARCADOR_ITEM).items():
+                pacotes.update(_montar_pacotes(
+                    f"competency1:deteccao:{criterio}", modelo_prompt, textos, "REDAÇÃO",
+                    lambda prompt: _corpo(af.MODELO_COMP1, prompt, 0.3)
+                ))
+        respostas = self.executar_empacotado(requisicoes, pacotes)
+
+        # Etapa 2: revisão dos erros detectados
+        requisicoes = {}
+        for i, estado in enumerate(estados):
+            try:
+                self._preparar_revisoes(i, estado, respostas, requisicoes)
+            except Exception as e:
+                self._registrar_falha(estado, e)
+        respostas = self.executar(requisicoes)
+
+        # Etapa 3: análise da Competência 1 e notas das Competências 2-5
+        requisicoes = {}
+        pacotes = {}
+        for i, estado in enumerate(estados):
+            if estado["falha"]:
+                continue
+            try:
+                self._aplicar_revisoes(i, estado, respostas)
+                prompt = af.montar_prompt_analise_competency1(estado["erros"]["competency1"])
+                requisicoes[f"{i}:competency1:analise"] = _corpo(af.MODELO_COMP1, prompt, 0.3)
+                for comp in COMPETENCIAS_RAG:
+                    prompt = getattr(af, f"montar_prompt_nota_{comp}")(estado["analises"][comp])
+                    requisicoes[f"{i}:{comp}:nota"] = _corpo(MODELOS_RAG[comp], prompt, TEMPERATURA_RAG)
+            except Exception as e:
+                self._registrar_falha(estado, e)
+        if self.empacotar:
+            for comp in COMPETENCIAS_RAG:
+                analises = {i: estado["analises"][comp] for i, estado in enumerate(estados) if not estado["falha"]}
+                modelo_prompt = getattr(af, f"montar_prompt_nota_{comp}")(MARCADOR_ITEM)
+                pacotes.update(_montar_pacotes(
+                    f"{comp}:nota", modelo_prompt, analises, "ANÁLISE",
+                    lambda prompt, comp=comp: _corpo(MODELOS_RAG[comp], prompt, TEMPERATURA_RAG)
+                ))
+        respostas = self.executar_empacotado(requisicoes, pacotes)
+
+        # Etapa 4: nota da Competência 1
+        requisicoes = {}
+        for i, estado in enumerate(estados):
+            if estado["falha"]:
+                continue
+            try:
+                estado["analises"]["competency1"] = _obrigatoria(respostas, f"{i}:competency1:analise")
+                estado["notas"] = {
+                    comp: af.extrair_nota_e_justificativa(_obrigatoria(respostas, f"{i}:{comp}:nota"))
+                    for comp in COMPETENCIAS_RAG
+                }
+                prompt, estado["nota_base_comp1"] = af.montar_prompt_nota_competency1(
+                    estado["analises"]["competency1"], estado["erros"]["competency1"]
+                )
+                requisicoes[f"{i}:competency1:nota"] = self._corpo_rag("competency1_nota", prompt)
+            except Exception as e:
+                self._registrar_falha(estado, e)
+        respostas = self.executar(requisicoes)
+
+        resultados = []
+        for i, estado in enumerate(estados):
+            if not estado["falha"]:
+                try:
+                    resultado = af.extrair_nota_e_justificativa(_obrigatoria(respostas, f"{i}:competency1:nota"))
+                    estado["notas"]["competency1"] = af.ajustar_nota_competency1(resultado, estado["nota_base_comp1"])
+                except Exception as e:
+                    self._registrar_falha(estado, e)
+            resultados.append(_montar_resultados(estado))
+        return resultados
+
+    def _preparar_revisoes(self, i: int, estado: Dict[str, Any], respostas: Dict[str, Optional[str]],
+                           requisicoes: Dict[str, Dict[str, Any]]):
+        texto = estado["redacao"]["texto"]
+        estado["analises"] = {}
+        estado["detectados"] = {}
+        estado["contextos"] = {}
+
+        todos_erros = []
+        for criterio in af.montar_prompts_deteccao_competency1(texto):
+            todos_erros.extend(af.extrair_erros_do_resultado(
+                _obrigatoria(respostas, f"{i}:competency1:deteccao:{criterio}")
+            ))
+        indice = IndiceTexto(texto)
+        estado["crase_local"], todos_erros = af.triar_crase_competency1(todos_erros, texto, indice)
+        erros_reais, estado["sugestoes_estilo"] = af.classificar_erros_competency1(todos_erros)
+        estado["detectados"]["competency1"] = erros_reais
+        for j, erro in enumerate(erros_reais):
+            prompt, estado["contextos"][j] = af.montar_prompt_revisao_competency1(erro, texto, indice)
+            requisicoes[f"{i}:competency1:revisao:{j}"] = _corpo(af.MODELO_REVISAO_COMP1, prompt, 0.2)
+
+        for comp in COMPETENCIAS_RAG:
+            analise_geral = _obrigatoria(respostas, f"{i}:{comp}:analise")
+            estado["analises"][comp] = af.limpar_analise(analise_geral)
+            erros = af.extrair_erros_do_resultado(analise_geral)
+            estado["detectados"][comp] = erros
+            for j, erro in enumerate(erros):
+                prompt = af.montar_prompt_revisao_generico(erro, texto, af.NOMES_COMPETENCIAS[comp])
+                requisicoes[f"{i}:{comp}:revisao:{j}"] = _corpo(af.MODELOS_REVISAO[comp], prompt, 0.2)
+
+    def _aplicar_revisoes(self, i: int, estado: Dict[str, Any], respostas: Dict[str, Optional[str]]):
+        estado["erros"] = {}
+        for comp, detectados in estado["detectados"].items():
+            revisados = []
+            for j, erro in enumerate(detectados):
+                conteudo = respostas.get(f"{i}:{comp}:revisao:{j}")
+                if conteudo is None:
+                    logger.error(f"Revisão ausente para o erro {j} da {comp} (redação {i})")
+                    continue
+                revisao = af.extrair_revisao_do_resultado(conteudo)
+                try:
+                    if comp == "competency1":
+                        erro_revisado = af.aplicar_revisao_competency1(erro, revisao, estado["contextos"][j])
+                    else:
+                        erro_revisado = af.aplicar_revisao_generica(erro, revisao)
+                except KeyError as e:
+                    logger.error(f"Revisão incompleta para o erro {j} da {comp} (redação {i}): {e}")
+                    continue
+                if erro_revisado is not None:
+                    revisados.append(erro_revisado)
+            if comp == "competency1":
+                revisados.extend(estado.get("crase_local", []))
+            estado["erros"][comp] = revisados
+
+    def _corpo_rag(self, chave: str, prompt: str) -> Dict[str, Any]:
+        consulta = af.CONSULTAS_RAG[chave]
+        if consulta not in self._documentos:
+            self._documentos[consulta] = self.recuperar_documentos(consulta) if self.recuperar_documentos else []
+        return _corpo(MODELOS_RAG[chave], _prompt_com_documentos(prompt, self._documentos[consulta]), TEMPERATURA_RAG)
+
+    @staticmethod
+    def _registrar_falha(estado: Dict[str, Any], erro: Exception):
+        logger.error(f"Falha ao corrigir redação em lote: {erro}")
+        estado["falha"] = str(erro)
+
+
+class ClienteLoteLocal:
+    """
+    Substituto local da Batch API.
+
+    Implementa o subconjunto de files/batches usado por BackendLote e executa as
+    requisições de forma síncrona contra `cliente_chat`, que pode ser um cliente
+    OpenAI apontando para um servidor local.
+    """
+
+    def __init__(self, cliente_chat):
+        self.chat = cliente_chat.chat
+        self._arquivos: Dict[str, bytes] = {}
+        self._lotes: Dict[str, SimpleNamespace] = {}
+        self.files = SimpleNamespace(create=self._criar_arquivo, content=self._conteudo_arquivo)
+        self.batches = SimpleNamespace(create=self._criar_lote, retrieve=self._lotes.__getitem__)
+
+    def _criar_arquivo(self, file, purpose: str):
+        _, dados = file
+        file_id = f"file-{uuid.uuid4().hex}"
+        self._arquivos[file_id] = dados.read()
+        return SimpleNamespace(id=file_id, purpose=purpose)
+
+    def _conteudo_arquivo(self, file_id: str):
+        return SimpleNamespace(text=self._arquivos[file_id].decode("utf-8"))
+
+    def _criar_lote(self, input_file_id: str, endpoint: str, completion_window: str):
+        saidas, erros = [], []
+        for linha in self._arquivos[input_file_id].decode("utf-8").splitlines():
+            if not linha.strip():
+                continue
+            requisicao = json.loads(linha)
+            try:
+                resposta = self.chat.completions.create(**requisicao["body"])
+                if hasattr(resposta, "model_dump"):
+                    corpo = resposta.model_dump()
+                else:
+                    corpo = {"choices": [{"message": {"content": resposta.choices[0].message.content}}]}
+                saidas.append({"custom_id": requisicao["custom_id"],
+                               "response": {"status_code": 200, "body": corpo}, "error": None})
+            except Exception as e:
+                erros.append({"custom_id": requisicao["custom_id"], "response": None,
+                              "error": {"message": str(e)}})
+
+        lote = SimpleNamespace(id=f"batch-{uuid.uuid4().hex}", status="completed",
+                               output_file_id=self._salvar_jsonl(saidas),
+                               error_file_id=self._salvar_jsonl(erros))
+        self._lotes[lote.id] = lote
+        return lote
+
+    def _salvar_jsonl(self, registros: List[Dict[str, Any]]) -> Optional[str]:
+        if not registros:
+            return None
+        dados = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in registros)
+        return self._criar_arquivo(("", io.BytesIO(dados.encode("utf-8"))), "batch_output").id
+
+
+def _corpo(modelo: str, prompt: str, temperatura: float) -> Dict[str, Any]:
+    return {"model": modelo, "messages": [{"role": "user", "content": prompt}], "temperature": temperatura}
+
+
+def _prompt_com_documentos(prompt: str, documentos: List[Any]) -> str:
+    if not documentos:
+        return prompt
+    contexto = "\n\n".join(str(doc) for doc in documentos)
+    return f"Documentos de referência do ENEM:\n{contexto}\n\n{prompt}"
+
+
+def _montar_pacotes(etapa: str, modelo_prompt: str, itens: Dict[int, str], rotulo: str,
+                    corpo: Callable[[str], Dict[str, Any]]) -> Dict[str, Tuple[Dict[str, Any], List[str]]]:
+    """
+    Agrupa os itens curtos de uma etapa em pacotes de até MAX_ITENS_POR_PACOTE itens
+    e MAX_CARACTERES_PACOTE caracteres. `modelo_prompt` é o prompt da etapa montado
+    com MARCADOR_ITEM no lugar do texto; pacotes de um só item não valem a pena e
+    ficam de fora. Retorna id do pacote -> (corpo, custom_ids individuais dos itens).
+    """
+    if modelo_prompt.count(MARCADOR_ITEM) != 1:
+        return {}
+    grupos: List[List[int]] = []
+    atual: List[int] = []
+    tamanho = 0
+    for i, texto in itens.items():
+        if len(texto) > LIMITE_CARACTERES_ITEM:
+            continue
+        if atual and (len(atual) == MAX_ITENS_POR_PACOTE or tamanho + len(texto) > MAX_CARACTERES_PACOTE):
+            grupos.append(atual)
+            atual, tamanho = [], 0
+        atual.append(i)
+        tamanho += len(texto)
+    grupos.append(atual)
+
+    pacotes = {}
+    for grupo in grupos:
+        if len(grupo) < 2:
+            continue
+        prompt = _empacotar_prompt(modelo_prompt, [itens[i] for i in grupo], rotulo)
+        pacotes[f"pacote:{etapa}:{grupo[0]}"] = (corpo(prompt), [f"{i}:{etapa}" for i in grupo])
+    return pacotes
+
+
+def _empacotar_prompt(modelo_prompt: str, textos: List[str], rotulo: str) -> str:
+    blocos = "\n".join(f"=== {rotulo} {n} ===\n{texto}\n=== FIM DA {rotulo} {n} ==="
+                       for n, texto in enumerate(textos, 1))
+    return (
+        modelo_prompt.replace(MARCADOR_ITEM, f"\n{blocos}\n")
+        + f"\n\nHá {len(textos)} itens ({rotulo}) acima, delimitados por === {rotulo} n === e "
+        f"=== FIM DA {rotulo} n ===. Avalie cada um separadamente, sem misturar informações entre eles, "
+        "e responda a cada um no formato pedido, em ordem, entre as linhas RESPOSTA n e FIM_RESPOSTA n:\n"
+        "RESPOSTA 1\n[resposta do item 1]\nFIM_RESPOSTA 1\n..."
+    )
+
+
+def _desempacotar_resposta(conteudo: Optional[str], quantidade: int) -> Optional[List[str]]:
+    """Separa a resposta de um pacote por item; None se faltar ou sobrar algum bloco RESPOSTA."""
+    if conteudo is None:
+        return None
+    partes = {}
+    for numero, texto in re.findall(r"^RESPOSTA (\d+)\s*\n(.*?)^FIM_RESPOSTA \1\s*$", conteudo, re.MULTILINE | re.DOTALL):
+        if numero in partes:
+            return None
+        partes[numero] = texto.strip()
+    if sorted(partes) != sorted(str(n) for n in range(1, quantidade + 1)):
+        return None
+    return [partes[str(n)] for n in range(1, quantidade + 1)]
+
+
+def _conteudo_da_resposta(registro: Dict[str, Any]) -> Optional[str]:
+    resposta = registro.get("response")
+    if registro.get("error") or not resposta or resposta.get("status_code") != 200:
+        return None
+    return resposta["body"]["choices"][0]["message"]["content"]
+
+
+def _obrigatoria(respostas: Dict[str, Optional[str]], custom_id: str) -> str:
+    conteudo = respostas.get(custom_id)
+    if conteudo is None:
+        raise ErroLote(f"Requisição {custom_id} não retornou resultado")
+    return conteudo
+
+
+def _montar_resultados(estado: Dict[str, Any]) -> Dict[str, Any]:
+    redacao = estado["redacao"]
+    if estado["falha"]:
+        return {"texto_original": redacao["texto"], "erro": estado["falha"]}
+
+    resultados = {
+        'analises_detalhadas': {},
+        'notas': {},
+        'nota_total': 0,
+        'erros_especificos': {},
+        'justificativas': {},
+        'total_erros_por_competencia': {},
+        'sugestoes_estilo': {'competency1': estado["sugestoes_estilo"]},
+        'texto_original': redacao["texto"],
+        'versoes_prompts': prompts.versoes()
+    }
+    for comp in ["competency1"] + COMPETENCIAS_RAG:
+        resultados['analises_detalhadas'][comp] = estado["analises"][comp]
+        resultados['notas'][comp] = estado["notas"][comp]['nota']
+        resultados['justificativas'][comp] = estado["notas"][comp]['justificativa']
+        resultados['erros_especificos'][comp] = estado["erros"][comp]
+        resultados['total_erros_por_competencia'][comp] = len(estado["erros"][comp])
+    resultados['nota_total'] = sum(resultados['notas'].values())
+    return resultados
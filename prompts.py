@@ -0,0 +1,461 @@
+"""
+Registro de templates de prompt, carregado uma vez na importação.
+
+Cada template é normalizado (sem indentação nem espaços no fim das linhas, no
+máximo uma linha em branco seguida), pré-compilado em partes literais e campos,
+e recebe:
+
+    versao  hash do texto normalizado; muda sempre que o prompt muda e entra nas
+            chaves de cache (cache_deteccao) e nos resultados ('versoes_prompts')
+    tokens  tokens do texto fixo do template (tiktoken se instalado; senão a
+            estimativa de 4 caracteres por token usada nos benchmarks)
+
+Uso:
+    prompt = prompts.formatar("nota_competency2", analise=analise)
+    versao = prompts.obter("deteccao_ortografia").versao
+"""
+import hashlib
+import re
+import string
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import tiktoken
+    _codificador = tiktoken.get_encoding("o200k_base")
+except Exception:  # tiktoken ausente ou sem o arquivo de codificação
+    _codificador = None
+
+
+def normalizar(texto: str) -> str:
+    linhas = [linha.rstrip() for linha in texto.strip("\n").split("\n")]
+    recuo = min((len(l) - len(l.lstrip()) for l in linhas if l.strip()), default=0)
+    texto = "\n".join(linha[recuo:] for linha in linhas)
+    return re.sub(r"\n{3,}", "\n\n", texto).strip()
+
+
+def contar_tokens(texto: str) -> int:
+    if _codificador is not None:
+        return len(_codificador.encode(texto))
+    return len(texto) // 4
+
+
+@dataclass(frozen=True)
+class Template:
+    nome: str
+    texto: str
+    versao: str
+    tokens: int
+    partes: Tuple[Tuple[str, Optional[str]], ...]
+
+    @property
+    def campos(self) -> List[str]:
+        return list(dict.fromkeys(campo for _, campo in self.partes if campo))
+
+    def formatar(self, **valores: Any) -> str:
+        faltando = [campo for campo in self.campos if campo not in valores]
+        if faltando:
+            raise KeyError(f"Template {self.nome} sem valor para: {', '.join(faltando)}")
+        return "".join(literal + (str(valores[campo]) if campo else "") for literal, campo in self.partes)
+
+
+def compilar(nome: str, texto: str) -> Template:
+    texto = normalizar(texto)
+    partes = tuple((literal, campo or None) for literal, campo, _, _ in string.Formatter().parse(texto))
+    return Template(
+        nome=nome,
+        texto=texto,
+        versao=hashlib.sha256(texto.encode("utf-8")).hexdigest()[:12],
+        tokens=contar_tokens("".join(literal for literal, _ in partes)),
+        partes=partes,
+    )
+
+
+# Critérios de detecção da Competência 1 e rubricas de nota das Competências 1 a 5
+TEXTOS: Dict[str, str] = {
+    "deteccao_ortografia": """
+Analise o texto linha por linha quanto à ortografia, identificando APENAS ERROS REAIS em:
+1. Palavras escritas incorretamente
+2. Problemas de acentuação
+3. Uso incorreto de maiúsculas/minúsculas
+4. Grafia de estrangeirismos
+5. Abreviações inadequadas
+
+NÃO inclua sugestões de melhoria ou preferências estilísticas.
+Inclua apenas desvios claros da norma culta.
+
+Texto para análise: {redacao_texto}
+
+Para cada ERRO REAL encontrado, forneça:
+ERRO
+Descrição: [Descrição objetiva do erro ortográfico]
+Trecho: "[Trecho exato do texto]"
+Explicação: [Explicação técnica do erro]
+Sugestão: [Correção necessária]
+FIM_ERRO
+""",
+
+    "deteccao_pontuacao": """
+Analise o texto linha por linha quanto à pontuação, identificando APENAS ERROS REAIS em:
+1. Uso incorreto de vírgulas em:
+   - Enumerações
+   - Orações coordenadas
+   - Orações subordinadas
+   - Apostos e vocativos
+   - Adjuntos adverbiais deslocados
+2. Uso inadequado de ponto e vírgula
+3. Uso incorreto de dois pontos
+4. Problemas com pontos finais
+5. Uso inadequado de reticências
+6. Problemas com travessões e parênteses
+
+NÃO inclua sugestões de melhoria ou pontuação opcional.
+Inclua apenas desvios claros das regras de pontuação.
+
+Texto para análise: {redacao_texto}
+
+Para cada ERRO REAL encontrado, forneça:
+ERRO
+Descrição: [Descrição objetiva do erro de pontuação]
+Trecho: "[Trecho exato do texto]"
+Explicação: [Explicação técnica do erro]
+Sugestão: [Correção necessária]
+FIM_ERRO
+""",
+
+    "deteccao_concordancia": """
+Analise o texto linha por linha quanto à concordância, identificando APENAS ERROS REAIS em:
+1. Concordância verbal
+   - Sujeito e verbo
+   - Casos especiais (coletivos, expressões partitivas)
+2. Concordância nominal
+   - Substantivo e adjetivo
+   - Casos especiais (é necessário, é proibido)
+3. Concordância ideológica
+4. Silepse (de gênero, número e pessoa)
+
+NÃO inclua sugestões de melhoria ou preferências de concordância.
+Inclua apenas desvios claros das regras de concordância.
+
+Texto para análise: {redacao_texto}
+
+Para cada ERRO REAL encontrado, forneça:
+ERRO
+Descrição: [Descrição objetiva do erro de concordância]
+Trecho: "[Trecho exato do texto]"
+Explicação: [Explicação técnica do erro]
+Sugestão: [Correção necessária]
+FIM_ERRO
+""",
+
+    "deteccao_regencia": """
+Analise o texto linha por linha quanto à regência, identificando APENAS ERROS REAIS em:
+1. Regência verbal
+   - Uso inadequado de preposições com verbos
+   - Ausência de preposição necessária
+2. Regência nominal
+   - Uso inadequado de preposições com nomes
+3. Uso da crase: Verifique CUIDADOSAMENTE se há:
+   - Junção de preposição 'a' com artigo definido feminino 'a'
+   - Palavra feminina usada em sentido definido
+   - Locuções adverbiais femininas
+
+IMPORTANTE: Analise cada caso considerando:
+- O contexto completo da frase
+- A função sintática das palavras
+- O sentido pretendido (definido/indefinido)
+- A regência dos verbos e nomes envolvidos
+
+NÃO marque como erro casos onde:
+- Não há artigo definido feminino
+- A palavra está sendo usada em sentido indefinido
+- Há apenas preposição 'a' sem artigo
+
+Texto para análise: {redacao_texto}
+
+Para cada ERRO REAL encontrado, forneça:
+ERRO
+Descrição: [Descrição objetiva do erro de regência]
+Trecho: "[Trecho exato do texto]"
+Explicação: [Explicação técnica DETALHADA do erro, incluindo análise sintática]
+Sugestão: [Correção necessária com justificativa]
+FIM_ERRO
+""",
+
+    "nota_competency1": """
+Com base na seguinte análise da Competência 1 (Domínio da Norma Culta) e na contagem de erros identificados,
+confirme se a nota {nota_base} está adequada.
+
+ANÁLISE DETALHADA:
+{analise}
+
+CONTAGEM DE ERROS:
+- Erros de sintaxe/estrutura: {erros_sintaxe}
+- Erros de ortografia/acentuação: {erros_ortografia}
+- Erros de concordância: {erros_concordancia}
+- Erros de pontuação: {erros_pontuacao}
+- Erros de crase: {erros_crase}
+- Desvios de registro formal: {erros_registro}
+Total de erros: {total_erros}
+
+ERROS ESPECÍFICOS:
+{erros_formatados}
+
+Critérios para cada nota:
+
+200 pontos:
+- No máximo uma falha de estrutura sintática
+- No máximo dois desvios gramaticais
+- Nenhum uso de linguagem informal/coloquial
+- No máximo um erro ortográfico
+- Coerência e coesão impecáveis
+- Sem repetição de erros
+
+160 pontos:
+- Até três desvios gramaticais que não comprometem a compreensão
+- Poucos erros de pontuação/acentuação
+- No máximo três erros ortográficos
+- Bom domínio geral da norma culta
+
+120 pontos:
+- Até cinco desvios gramaticais
+- Domínio mediano da norma culta
+- Alguns problemas de coesão pontuais
+- Erros não sistemáticos
+
+80 pontos:
+- Estrutura sintática deficitária
+- Erros frequentes de concordância
+- Uso ocasional de registro inadequado
+- Muitos erros de pontuação/ortografia
+
+40 pontos:
+- Domínio precário da norma culta
+- Diversos desvios gramaticais frequentes
+- Problemas graves de coesão
+- Registro frequentemente inadequado
+
+0 pontos:
+- Desconhecimento total da norma culta
+- Erros graves e sistemáticos
+- Texto incompreensível
+
+Com base nesses critérios e na análise apresentada, forneça:
+1. Confirmação ou ajuste da nota base {nota_base}
+2. Justificativa detalhada relacionando os erros encontrados com os critérios
+
+Formato da resposta:
+Nota: [NOTA FINAL]
+Justificativa: [Justificativa detalhada da nota, explicando como os erros e acertos se relacionam com os critérios]
+""",
+
+    "nota_competency2": """
+Com base na seguinte análise da Competência 2 (Compreensão do Tema) do ENEM, atribua uma nota de 0 a 200 em intervalos de 40 pontos (0, 40, 80, 120, 160 ou 200).
+
+Análise:
+{analise}
+
+Considere cuidadosamente os seguintes critérios para atribuir a nota:
+
+Nota 200:
+- Excelente domínio do tema proposto.
+- Citação das palavras principais do tema ou sinônimos em cada parágrafo.
+- Argumentação consistente com repertório sociocultural produtivo.
+- Uso de exemplos históricos, frases, músicas, textos, autores famosos, filósofos, estudos, artigos ou publicações como repertório.
+- Excelente domínio do texto dissertativo-argumentativo, incluindo proposição, argumentação e conclusão.
+- Não copia trechos dos textos motivadores e demonstra clareza no ponto de vista adotado.
+- Estabelece vínculo de ideias entre a referência ao repertório e a discussão proposta.
+- Cita a fonte do repertório (autor, obra, data de criação, etc.).
+- Inclui pelo menos um repertório no segundo e terceiro parágrafo.
+
+Nota 160:
+- Bom desenvolvimento do tema com argumentação consistente, mas sem repertório sociocultural tão produtivo.
+- Completa as 3 partes do texto dissertativo-argumentativo (nenhuma delas é embrionária).
+- Bom domínio do texto dissertativo-argumentativo, com proposição, argumentação e conclusão claras, mas sem aprofundamento.
+- Utiliza informações pertinentes, mas sem extrapolar significativamente sua justificativa.
+
+Nota 120:
+- Abordagem completa do tema, com as 3 partes do texto dissertativo-argumentativo (podendo 1 delas ser embrionária).
+- Repertório baseado nos textos motivadores e/ou repertório não legitimado e/ou repertório legitimado, mas não pertinente ao tema.
+- Desenvolvimento do tema de forma previsível, com argumentação mediana, sem grandes inovações.
+- Domínio mediano do texto dissertativo-argumentativo, com proposição, argumentação e conclusão, mas de forma superficial.
+
+Nota 80:
+- Abordagem completa do tema, mas com problemas relacionados ao tipo textual e presença de muitos trechos de cópia sem aspas.
+- Domínio insuficiente do texto dissertativo-argumentativo, faltando a estrutura completa de proposição, argumentação e conclusão.
+- Não desenvolve um ponto de vista claro e não consegue conectar as ideias argumentativas adequadamente.
+- Duas partes embrionárias ou com conclusão finalizada por frase incompleta.
+
+Nota 40:
+- Tangencia o tema, sem abordar diretamente o ponto central proposto.
+- Domínio precário do texto dissertativo-argumentativo, com traços de outros tipos textuais.
+- Não constrói uma argumentação clara e objetiva, resultando em confusão ou desvio do gênero textual.
+
+Nota 0:
+- Fuga completa do tema proposto, abordando um assunto irrelevante ou não relacionado.
+- Não atende à estrutura dissertativo-argumentativa, sendo classificado como outro gênero textual.
+- Não apresenta proposição, argumentação e conclusão, ou o texto é anulado por não atender aos critérios básicos de desenvolvimento textual.
+
+Forneça a nota e uma justificativa detalhada, relacionando diretamente com a análise fornecida. Certifique-se de que a justificativa esteja completamente alinhada com a nota atribuída e os critérios específicos.
+
+Formato da resposta:
+Nota: [NOTA ATRIBUÍDA]
+Justificativa: [Justificativa detalhada da nota, explicando como cada aspecto da análise se relaciona com os critérios de pontuação]
+""",
+
+    "nota_competency3": """
+Com base na seguinte análise da Competência 3 (Seleção e Organização das Informações) do ENEM, atribua uma nota de 0 a 200 em intervalos de 40 pontos (0, 40, 80, 120, 160 ou 200).
+
+Análise:
+{analise}
+
+Considere cuidadosamente os seguintes critérios para atribuir a nota:
+
+Nota 200:
+- Ideias progressivas e argumentos bem selecionados, revelando um planejamento claro do texto.
+- Apresenta informações, fatos e opiniões relacionados ao tema proposto e aos seus argumentos, de forma consistente e organizada, em defesa de um ponto de vista.
+- Demonstra autoria, com informações e argumentos originais que reforçam o ponto de vista do aluno.
+- Mantém o encadeamento das ideias, com cada parágrafo apresentando informações coerentes com o anterior, sem repetições desnecessárias ou saltos temáticos.
+- Apresenta poucas falhas, e essas falhas não prejudicam a progressão do texto.
+
+Nota 160:
+- Apresenta informações, fatos e opiniões relacionados ao tema, de forma organizada, com indícios de autoria em defesa de um ponto de vista.
+- Ideias claramente organizadas, mas não tão consistentes quanto o esperado para uma argumentação mais sólida.
+- Organização geral das ideias é boa, mas algumas informações e opiniões não estão bem desenvolvidas.
+
+Nota 120:
+- Apresenta informações, fatos e opiniões relacionados ao tema, mas limitados aos argumentos dos textos motivadores e pouco organizados, em defesa de um ponto de vista.
+- Ideias previsíveis, sem desenvolvimento profundo ou originalidade, com pouca evidência de autoria.
+- Argumentos simples, sem clara progressão de ideias, e baseado principalmente nas sugestões dos textos motivadores.
+
+Nota 80:
+- Apresenta informações, fatos e opiniões relacionados ao tema, mas de forma desorganizada ou contraditória, e limitados aos argumentos dos textos motivadores.
+- Ideias não estão bem conectadas, demonstrando falta de coerência e organização no desenvolvimento do texto.
+- Argumentos inconsistentes ou contraditórios, prejudicando a defesa do ponto de vista.
+- Perde linhas com informações irrelevantes, repetidas ou excessivas.
+
+Nota 40:
+- Apresenta informações, fatos e opiniões pouco relacionados ao tema, com incoerências, e sem defesa clara de um ponto de vista.
+- Falta de organização e ideias dispersas, sem desenvolvimento coerente.
+- Não apresenta um ponto de vista claro, e os argumentos são fracos ou desconexos.
+
+Nota 0:
+- Apresenta informações, fatos e opiniões não relacionados ao tema, sem coerência, e sem defesa de um ponto de vista.
+- Ideias totalmente desconexas, sem organização ou relação com o tema proposto.
+- Não desenvolve qualquer argumento relevante ou coerente, demonstrando falta de planejamento.
+
+Forneça a nota e uma justificativa detalhada, relacionando diretamente com a análise fornecida. Certifique-se de que a justificativa esteja completamente alinhada com a nota atribuída e os critérios específicos.
+
+Formato da resposta:
+Nota: [NOTA ATRIBUÍDA]
+Justificativa: [Justificativa detalhada da nota, explicando como cada aspecto da análise se relaciona com os critérios de pontuação]
+""",
+
+    "nota_competency4": """
+Com base na seguinte análise da Competência 4 (Conhecimento dos Mecanismos Linguísticos) do ENEM, atribua uma nota de 0 a 200 em intervalos de 40 pontos (0, 40, 80, 120, 160 ou 200).
+
+Análise:
+{analise}
+
+Considere cuidadosamente os seguintes critérios para atribuir a nota:
+
+Nota 200:
+- Utiliza conectivos em todo início de período.
+- Articula bem as partes do texto e apresenta um repertório diversificado de recursos coesivos, conectando parágrafos e períodos de forma fluida.
+- Utiliza referenciação adequada, com pronomes, sinônimos e advérbios, garantindo coesão e clareza.
+- Apresenta transições claras e bem estruturadas entre as ideias de causa/consequência, comparação e conclusão, sem falhas.
+- Demonstra excelente organização de períodos complexos, com uma articulação eficiente entre orações.
+- Não repete muitos conectivos ao longo do texto.
+
+Nota 160:
+- Deixa de usar uma ou duas vezes conectivos ao longo do texto.
+- Articula as partes do texto, mas com poucas inadequações ou problemas pontuais na conexão de ideias.
+- Apresenta um repertório diversificado de recursos coesivos, mas com algumas falhas no uso de pronomes, advérbios ou sinônimos.
+- As transições entre parágrafos e ideias são adequadas, mas com pequenos deslizes na estruturação dos períodos complexos.
+- Mantém boa coesão e coerência, mas com algumas falhas na articulação entre causas, consequências e exemplos.
+
+Nota 120:
+- Não usa muitos conectivos ao longo dos parágrafos.
+- Repete várias vezes o mesmo conectivo ao longo do parágrafo.
+- Articula as partes do texto de forma mediana, apresentando inadequações frequentes na conexão de ideias.
+- O repertório de recursos coesivos é pouco diversificado, com uso repetitivo de pronomes.
+- Apresenta transições previsíveis e pouco elaboradas, prejudicando o encadeamento lógico das ideias.
+- A organização dos períodos é mediana, com algumas orações mal articuladas, comprometendo a fluidez do texto.
+
+Nota 80:
+- Articula as partes do texto de forma insuficiente, com muitas inadequações no uso de conectivos e outros recursos coesivos.
+- O repertório de recursos coesivos é limitado, resultando em repetição excessiva ou uso inadequado de pronomes e advérbios.
+- Apresenta conexões falhas entre os parágrafos, com transições abruptas e pouco claras entre as ideias.
+- Os períodos complexos estão mal estruturados, com orações desconectadas ou confusas.
+
+Nota 40:
+- Articula as partes do texto de forma precária, com sérias falhas na conexão de ideias.
+- O repertório de recursos coesivos é praticamente inexistente, sem o uso adequado de pronomes, conectivos ou advérbios.
+- Apresenta parágrafos desarticulados, sem relação clara entre as ideias.
+- Os períodos são curtos e desconectados, sem estruturação adequada ou progressão de ideias.
+
+Nota 0:
+- Não articula as informações e as ideias parecem desconexas e sem coesão.
+- O texto não apresenta recursos coesivos, resultando em total falta de conexão entre as partes.
+- Os parágrafos e períodos são desorganizados, sem qualquer lógica na apresentação das ideias.
+- O texto não utiliza mecanismos de coesão (pronomes, conectivos, advérbios), tornando-o incompreensível.
+
+Forneça a nota e uma justificativa detalhada, relacionando diretamente com a análise fornecida. Certifique-se de que a justificativa esteja completamente alinhada com a nota atribuída e os critérios específicos.
+
+Formato da resposta:
+Nota: [NOTA ATRIBUÍDA]
+Justificativa: [Justificativa detalhada da nota, explicando como cada aspecto da análise se relaciona com os critérios de pontuação]
+""",
+
+    "nota_competency5": """
+Com base na seguinte análise detalhada da Competência 5 (Proposta de Intervenção) do ENEM, atribua uma nota de 0 a 200 em intervalos de 40 pontos (0, 40, 80, 120, 160 ou 200).
+
+Análise detalhada:
+{analise}
+
+Considere os seguintes critérios para atribuir a nota:
+
+Nota 200:
+- Elabora proposta de intervenção completa com todos os 5 elementos (agente, ação, modo/meio, detalhamento e finalidade).
+
+Nota 160:
+- Elabora bem a proposta de intervenção, mas com apenas 4 elementos presentes.
+
+Nota 120:
+- Elabora uma proposta de intervenção mediana, com apenas 3 elementos presentes.
+
+Nota 80:
+- Elabora uma proposta de intervenção insuficiente, com apenas 2 elementos presentes, ou se a proposta for mal articulada ao tema.
+
+Nota 40:
+- Apresenta uma proposta de intervenção vaga ou precária, apresentando apenas 1 de todos os elementos exigidos.
+
+Nota 0:
+- Não apresenta proposta de intervenção ou a proposta é completamente desconectada do tema.
+
+Formato da resposta:
+Nota: [NOTA ATRIBUÍDA]
+Justificativa: [Breve justificativa da nota baseada na análise]
+""",
+}
+
+
+REGISTRO: Dict[str, Template] = {nome: compilar(nome, texto) for nome, texto in TEXTOS.items()}
+
+
+def obter(nome: str) -> Template:
+    return REGISTRO[nome]
+
+
+def formatar(nome: str, **valores: Any) -> str:
+    return REGISTRO[nome].formatar(**valores)
+
+
+def versoes() -> Dict[str, str]:
+    """Versão de cada template, gravada nos resultados de cada correção."""
+    return {nome: template.versao for nome, template in REGISTRO.items()}
+
+
+def mesma_versao(resultados: Dict[str, Any]) -> bool:
+    """Se os resultados guardados foram gerados com os templates atuais (e podem ser reaproveitados)."""
+    return resultados.get("versoes_prompts") == versoes()
@@ -0,0 +1,218 @@
+"""
+Rastreamento de latência e consumo de tokens do pipeline de correção.
+
+Cada redação processada gera um Rastro com spans aninhados por etapa
+(competência, detecção, revisão, nota) e por chamada de modelo. Os spans de
+modelo registram latência, tokens de prompt/completion, modelo, cache hit e
+número de tentativas.
+
+Uso:
+    with iniciar_rastro("redacao") as rastro:
+        with span("competency1"):
+            with span("deteccao", tipo="modelo", modelo=MODELO) as s:
+                resposta = client.chat.completions.create(...)
+                registrar_uso(s, resposta)
+
+Os rastros podem ser exportados como JSON lines (um span por linha) e
+visualizados como waterfall no painel de depuração do Streamlit.
+"""
+import json
+import logging
+import os
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field, fields
+from typing import Any, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Se definida, cada rastro finalizado é anexado a este arquivo JSONL
+ARQUIVO_RASTROS = os.getenv("RASTREAMENTO_ARQUIVO")
+
+# Atributos copiados do span pai para os spans filhos
+ATRIBUTOS_HERDADOS = ("competencia",)
+
+
+@dataclass
+class Span:
+    id: str
+    nome: str
+    tipo: str
+    pai_id: Optional[str]
+    inicio_ms: float
+    duracao_ms: float = 0.0
+    atributos: Dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class Rastro:
+    id: str
+    nome: str
+    iniciado_em: float
+    spans: List[Span] = field(default_factory=list)
+    _origem: float = field(default_factory=time.perf_counter, repr=False)
+
+    def duracao_total_ms(self) -> float:
+        return max((s.inicio_ms + s.duracao_ms for s in self.spans), default=0.0)
+
+    def para_linhas(self) -> List[Dict[str, Any]]:
+        """Retorna um dict por span, pronto para serialização em JSON lines."""
+        return [{"rastro_id": self.id, "rastro": self.nome, "iniciado_em": self.iniciado_em, **asdict(s)}
+                for s in self.spans]
+
+
+_rastro_atual: ContextVar[Optional[Rastro]] = ContextVar("rastro_atual", default=None)
+_span_atual: ContextVar[Optional[Span]] = ContextVar("span_atual", default=None)
+
+
+def rastro_atual() -> Optional[Rastro]:
+    return _rastro_atual.get()
+
+
+def atributo_atual(nome: str, padrao: Any = None) -> Any:
+    """Lê um atributo do span corrente (inclui atributos herdados, como a competência)."""
+    corrente = _span_atual.get()
+    return corrente.atributos.get(nome, padrao) if corrente else padrao
+
+
+@contextmanager
+def iniciar_rastro(nome: str, **atributos) -> Iterator[Rastro]:
+    """Abre um rastro (normalmente um por redação) com um span raiz."""
+    rastro = Rastro(id=uuid.uuid4().hex, nome=nome, iniciado_em=time.time())
+    token = _rastro_atual.set(rastro)
+    try:
+        with span(nome, tipo="redacao", **atributos):
+            yield rastro
+    finally:
+        _rastro_atual.reset(token)
+        if ARQUIVO_RASTROS:
+            try:
+                exportar_jsonl(rastro, ARQUIVO_RASTROS)
+            except OSError as e:
+                logger.error(f"Erro ao exportar rastro: {e}")
+
+
+@contextmanager
+def span(nome: str, tipo: str = "etapa", **atributos) -> Iterator[Span]:
+    """
+    Mede a duração de um bloco dentro do rastro atual.
+
+    Fora de um rastro o span é medido mas não é registrado em lugar algum.
+    """
+    rastro = _rastro_atual.get()
+    pai = _span_atual.get()
+    inicio = time.perf_counter()
+    origem = rastro._origem if rastro else inicio
+    novo = Span(
+        id=uuid.uuid4().hex[:16],
+        nome=nome,
+        tipo=tipo,
+        pai_id=pai.id if pai else None,
+        inicio_ms=(inicio - origem) * 1000,
+        atributos={**{k: pai.atributos[k] for k in ATRIBUTOS_HERDADOS if pai and k in pai.atributos},
+                   **atributos},
+    )
+    if rastro:
+        rastro.spans.append(novo)
+    token = _span_atual.set(novo)
+    try:
+        yield novo
+    except Exception as e:
+        novo.atributos["erro"] = str(e)
+        raise
+    finally:
+        novo.duracao_ms = (time.perf_counter() - inicio) * 1000
+        _span_atual.reset(token)
+
+
+def registrar_uso(span_modelo: Span, resposta: Any):
+    """Copia modelo e tokens de uma resposta de chat completion para o span."""
+    uso = getattr(resposta, "usage", None)
+    span_modelo.atributos.update({
+        "modelo_resposta": getattr(resposta, "model", None),
+        "tokens_prompt": getattr(uso, "prompt_tokens", 0) if uso else 0,
+        "tokens_completion": getattr(uso, "completion_tokens", 0) if uso else 0,
+    })
+
+
+def de_linhas(linhas: List[Dict[str, Any]]) -> Rastro:
+    """Reconstrói o Rastro de Rastro.para_linhas() (rastros vindos de outro processo ou de uma tarefa)."""
+    campos_span = {campo.name for campo in fields(Span)}
+    primeira = linhas[0] if linhas else {}
+    rastro = Rastro(id=primeira.get("rastro_id", uuid.uuid4().hex), nome=primeira.get("rastro", ""),
+                    iniciado_em=primeira.get("iniciado_em", time.time()))
+    rastro.spans = [Span(**{chave: valor for chave, valor in linha.items() if chave in campos_span})
+                    for linha in linhas]
+    return rastro
+
+
+def exportar_jsonl(rastro: Rastro, caminho: str):
+    """Anexa os spans do rastro ao arquivo JSONL indicado."""
+    with open(caminho, "a", encoding="utf-8") as arquivo:
+        for linha in rastro.para_linhas():
+            arquivo.write(json.dumps(linha, ensure_ascii=False) + "\n")
+
+
+def resumo_por_etapa(rastro: Rastro) -> Dict[str, Dict[str, float]]:
+    """Agrega chamadas de modelo por nome de span: quantidade, latência e tokens."""
+    resumo: Dict[str, Dict[str, float]] = {}
+    for s in rastro.spans:
+        if s.tipo != "modelo":
+            continue
+        item = resumo.setdefault(s.nome, {"chamadas": 0, "latencia_ms": 0.0, "tokens_prompt": 0,
+                                          "tokens_completion": 0})
+        item["chamadas"] += 1
+        item["latencia_ms"] += s.duracao_ms
+        item["tokens_prompt"] += s.atributos.get("tokens_prompt", 0)
+        item["tokens_completion"] += s.atributos.get("tokens_completion", 0)
+    return resumo
+
+
+def renderizar_painel_depuracao(rastro: Rastro):
+    """Mostra no Streamlit o waterfall dos spans de uma redação."""
+    import altair as alt
+    import pandas as pd
+    import streamlit as st
+
+    if not rastro.spans:
+        st.write("Nenhum span registrado.")
+        return
+
+    profundidade = {}
+    for s in rastro.spans:
+        profundidade[s.id] = profundidade.get(s.pai_id, -1) + 1
+
+    df = pd.DataFrame([
+        {
+            "span": f"{i:02d} {'  ' * profundidade[s.id]}{s.nome}",
+            "tipo": s.tipo,
+            "inicio_ms": round(s.inicio_ms, 1),
+            "fim_ms": round(s.inicio_ms + s.duracao_ms, 1),
+            "duracao_ms": round(s.duracao_ms, 1),
+            "modelo": s.atributos.get("modelo"),
+            "tokens_prompt": s.atributos.get("tokens_prompt"),
+            "tokens_completion": s.atributos.get("tokens_completion"),
+            "cache_hit": s.atributos.get("cache_hit"),
+            "tentativas": s.atributos.get("tentativas"),
+            "ordem": i,
+        }
+        for i, s in enumerate(rastro.spans)
+    ])
+
+    st.metric("Tempo total", f"{rastro.duracao_total_ms() / 1000:.1f} s")
+    grafico = alt.Chart(df).mark_bar().encode(
+        x=alt.X("inicio_ms:Q", title="ms desde o início"),
+        x2="fim_ms:Q",
+        y=alt.Y("span:N", sort=alt.SortField("ordem"), title=None),
+        color="tipo:N",
+        tooltip=["span", "duracao_ms", "modelo", "tokens_prompt", "tokens_completion", "cache_hit", "tentativas"],
+    ).properties(height=max(200, 18 * len(df)))
+    st.altair_chart(grafico, use_container_width=True)
+    st.dataframe(df.drop(columns=["ordem"]), use_container_width=True)
+    st.download_button(
+        "Baixar rastro (JSONL)",
+        "".join(json.dumps(linha, ensure_ascii=False) + "\n" for linha in rastro.para_linhas()),
+        file_name=f"rastro-{rastro.id}.jsonl",
+    )
@@ -0,0 +1,168 @@
+"""
+Motor de regras determinísticas para crase e regência.
+
+Julga os candidatos a erro de crase da Competência 1 antes do modelo de
+revisão. Para o "a"/"as" (com ou sem acento grave) do trecho, as regras
+decidem se a crase é obrigatória, proibida ou indeterminada:
+
+    proibida      antes de infinitivo, de pronome pessoal, demonstrativo ou
+                  indefinido, de artigo indefinido, de palavra masculina
+                  conhecida, depois de outra preposição, entre palavras
+                  repetidas (cara a cara) e em "a" singular antes de plural;
+    obrigatória   em locuções femininas (às vezes, à medida que...), na
+                  indicação de horas (às 10h) e quando um verbo ou nome que
+                  rege "a" (acesso, direito, referente, chegar...) antecede
+                  substantivo abstrato feminino no singular (-ção, -dade...);
+    indeterminada todo o resto: o sentido definido decide e o caso vai ao modelo.
+
+Confrontando a regra com o texto, o candidato é confirmado (o texto contraria
+a regra), rejeitado (o texto já segue a regra) ou ambíguo.
+"""
+import re
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+CONFIRMADO = "confirmado"
+REJEITADO = "rejeitado"
+AMBIGUO = "ambiguo"
+
+OBRIGATORIA = "obrigatoria"
+PROIBIDA = "proibida"
+INDETERMINADA = "indeterminada"
+
+# Regência: nomes e formas verbais exatas, e radicais de verbos que regem a preposição "a".
+# Verbos que também admitem objeto direto feminino (garantir, levar, assistir...) ficam de fora.
+REGENCIA_NOMES = {
+    "ir", "vai", "vão", "vamos", "foi", "foram", "ida", "acesso", "direito", "direitos", "combate",
+    "respeito", "referência", "alusão", "adesão", "obediência", "resistência", "atenção", "incentivo",
+    "apoio", "ameaça", "ataque", "crítica", "críticas", "devido", "devida", "relativo", "relativa",
+    "referente", "referentes", "favorável", "favoráveis", "contrário", "contrária", "alusivo", "alusiva",
+    "semelhante", "igual", "obediente", "apto", "apta", "propenso", "propensa", "rumo", "junto", "quanto",
+    "graças", "face", "relação", "vinculado", "vinculada", "ligado", "ligada", "prejudicial", "nocivo",
+    "nociva", "indiferente", "alheio", "alheia", "imune", "exposto", "exposta", "submetido", "submetida",
+}
+REGENCIA_RADICAIS = (
+    "cheg", "volt", "retorn", "obedec", "desobedec", "refer", "pertenc", "respond", "ader", "recorr",
+    "resist", "equival", "proced",
+)
+
+# Locuções femininas que sempre levam crase (só as inequívocas: "a noite", "a vontade de"
+# e semelhantes também ocorrem como sujeito ou objeto)
+LOCUCOES_FEMININAS = (
+    "às vezes", "à medida que", "à proporção que", "às pressas", "à procura de", "à custa de",
+    "à mercê de", "à luz de", "à toa", "às claras", "à deriva", "à exceção de", "à revelia",
+    "às avessas", "às escondidas", "à semelhança de", "à maneira de", "à beira de", "à guisa de",
+    "à primeira vista", "à flor da pele", "às cegas", "à queima-roupa",
+)
+
+PRONOMES_SEM_CRASE = {
+    "ela", "elas", "ele", "eles", "você", "vocês", "nós", "vós", "mim", "ti", "si", "eu", "tu",
+    "esta", "estas", "essa", "essas", "este", "estes", "esse", "esses", "isto", "isso",
+    "ninguém", "alguém", "qualquer", "quaisquer", "cada", "toda", "todas", "todo", "todos", "tudo",
+    "uma", "um", "umas", "uns", "nenhuma", "nenhum", "alguma", "algum", "algumas", "alguns",
+    "certa", "certas", "tanta", "tantas", "quem", "cujo", "cuja", "vossa", "sua", "suas", "meu",
+    "minha", "nosso", "nossa",
+}
+
+PREPOSICOES = {"para", "de", "com", "em", "por", "sem", "sob", "entre", "perante", "após", "desde", "contra"}
+
+MASCULINAS = {
+    "governo", "estado", "brasil", "país", "povo", "homem", "problema", "sistema", "ensino", "trabalho",
+    "respeito", "acesso", "combate", "direito", "meio", "fim", "longo", "prazo", "ponto", "nível",
+    "mercado", "setor", "cidadão", "indivíduo", "ministério", "município", "projeto", "uso", "consumo",
+    "preconceito", "racismo", "desemprego", "ambiente", "futuro", "mundo", "estudo", "tratamento",
+}
+FEMININAS_ABSTRATAS = ("ção", "são", "dade", "gem", "tude", "ência", "ância", "eza")
+FEMININAS_PLURAIS = ("as", "ções", "sões", "dades", "gens", "tudes", "ências", "âncias", "ezas")
+FEMININAS_EM_R = {"mulher", "colher"}
+
+_TOKEN = re.compile(r"\w+(?:-\w+)*")
+_HORA = re.compile(r"^\s*(?:\d{1,2}(?:h\d{0,2}\b|:\d{2}|\s*horas?\b)|(?:uma|duas|três)\s+horas?\b|meia-noite)",
+                   re.IGNORECASE)
+_ARTIGOS = ("a", "as", "à", "às")
+_MARGEM = 60
+
+
+@dataclass
+class Decisao:
+    veredito: str
+    regra: str
+    tem_crase: bool
+    correcao: Optional[str] = None
+
+
+def _rege_a(palavra: str) -> bool:
+    palavra = palavra.lower()
+    return palavra in REGENCIA_NOMES or palavra.startswith(REGENCIA_RADICAIS)
+
+
+def classificar_contexto(anterior: Optional[str], artigo: str, seguinte: Optional[str],
+                         resto: str) -> Tuple[str, str]:
+    """
+    Aplica as regras ao "a"/"as"/"à"/"às" entre `anterior` e `seguinte`;
+    `resto` é o texto logo após o artigo. Retorna (obrigatoriedade, regra).
+    """
+    plural = artigo.lower() in ("as", "às")
+    anterior = anterior.lower() if anterior else None
+    if anterior in PREPOSICOES:
+        return PROIBIDA, f"Não há crase depois da preposição '{anterior}'."
+    if anterior == "até":
+        return INDETERMINADA, "Depois de 'até' a crase é facultativa."
+
+    locucao = ("às " if plural else "à ") + " ".join(resto.lower().split())
+    for loc in LOCUCOES_FEMININAS:
+        if locucao.startswith(loc):
+            return OBRIGATORIA, f"A locução feminina '{loc}' exige crase."
+    if _HORA.match(resto):
+        return OBRIGATORIA, "A indicação de horas exige crase."
+    if seguinte is None:
+        return INDETERMINADA, "Não há palavra depois do artigo."
+
+    palavra = seguinte.lower()
+    if palavra in PRONOMES_SEM_CRASE:
+        return PROIBIDA, f"Não há crase antes de '{seguinte}' (pronome ou determinante que não admite artigo 'a')."
+    if anterior == palavra:
+        return PROIBIDA, "Não há crase entre palavras repetidas."
+    if palavra in MASCULINAS:
+        return PROIBIDA, f"Não há crase antes de palavra masculina ('{seguinte}')."
+    if (len(palavra) > 3 and palavra.endswith(("ar", "er", "ir", "pôr"))) and palavra not in FEMININAS_EM_R:
+        return PROIBIDA, f"Não há crase antes de verbo no infinitivo ('{seguinte}')."
+    if not plural and palavra.endswith(FEMININAS_PLURAIS):
+        return PROIBIDA, "O 'a' singular antes de palavra no plural é só preposição."
+    if anterior and _rege_a(anterior) and not plural and palavra.endswith(FEMININAS_ABSTRATAS):
+        return OBRIGATORIA, (f"'{anterior}' rege a preposição 'a' e '{seguinte}' é substantivo feminino "
+                             "determinado: preposição e artigo se fundem em crase.")
+    return INDETERMINADA, "As regras locais não decidem o caso; depende do sentido definido."
+
+
+def julgar_trecho(texto: str, inicio: int, fim: int) -> Optional[Decisao]:
+    """
+    Julga o "a"/"as"/"à"/"às" de texto[inicio:fim], olhando a palavra anterior
+    e o que vem depois. Retorna None se o trecho não tiver esse artigo; com mais
+    de um, não há como saber qual foi apontado e o caso é ambíguo.
+    """
+    base = max(0, inicio - _MARGEM)
+    tokens = [(m.group(), m.start(), m.end()) for m in _TOKEN.finditer(texto, base, min(len(texto), fim + _MARGEM))]
+    candidatos = [i for i, (token, t_inicio, t_fim) in enumerate(tokens)
+                  if inicio <= t_inicio and t_fim <= fim and token.lower() in _ARTIGOS]
+    if not candidatos:
+        return None
+    if len(candidatos) > 1:
+        return Decisao(AMBIGUO, "O trecho tem mais de um 'a'.", any(tokens[i][0].lower() in ("à", "às") for i in candidatos))
+
+    i = candidatos[0]
+    token, t_inicio, t_fim = tokens[i]
+    # Pontuação entre as palavras corta a relação de regência
+    anterior = tokens[i - 1][0] if i > 0 and not texto[tokens[i - 1][2]:t_inicio].strip() else None
+    seguinte = tokens[i + 1][0] if i + 1 < len(tokens) else None
+    obrigatoriedade, regra = classificar_contexto(anterior, token, seguinte, texto[t_fim:t_fim + _MARGEM])
+    tem_crase = token.lower() in ("à", "às")
+    if obrigatoriedade == INDETERMINADA:
+        return Decisao(AMBIGUO, regra, tem_crase)
+    if tem_crase == (obrigatoriedade == OBRIGATORIA):
+        return Decisao(REJEITADO, regra, tem_crase)
+    if tem_crase:
+        forma = token.replace("à", "a").replace("À", "A")
+    else:
+        forma = token.replace("a", "à", 1).replace("A", "À", 1)
+    return Decisao(CONFIRMADO, regra, tem_crase, texto[inicio:t_inicio] + forma + texto[t_fim:fim])
@@ -0,0 +1,124 @@
+"""
+Roteamento de modelos: modelo rápido primeiro, fine-tuned no escalonamento.
+
+Com ROTEAMENTO_MODELOS=1, as chamadas de detecção e revisão de cada
+competência vão primeiro a um modelo menor (ROTEAMENTO_MODELO_RAPIDO, padrão
+gpt-4o-mini). A resposta só é aceita se:
+
+    - estiver no formato esperado pela etapa (blocos ERRO/FIM_ERRO completos
+      na detecção; REVISAO com veredito Sim/Não e todos os campos na revisão);
+    - a confiança, calculada pelos logprobs, atingir o mínimo da política.
+      Na revisão é a probabilidade do token do veredito; na detecção, a média
+      geométrica das probabilidades dos tokens. Sem logprobs na resposta só o
+      formato é verificado.
+
+Caso contrário a chamada é refeita no modelo fine-tuned da etapa, e o motivo
+do escalonamento fica no rastro.
+
+As políticas por competência podem ser sobrescritas com um arquivo JSON
+apontado por ROTEAMENTO_POLITICAS, no formato
+{"competency1": {"modelo_rapido": "gpt-4o-mini", "etapas": ["deteccao"], "confianca_minima": 0.9}};
+"modelo_rapido": null desliga o roteamento da competência.
+"""
+import json
+import math
+import os
+import re
+from dataclasses import dataclass, replace
+from typing import Any, Dict, Optional, Tuple
+
+ATIVO = os.getenv("ROTEAMENTO_MODELOS", "0") == "1"
+MODELO_RAPIDO = os.getenv("ROTEAMENTO_MODELO_RAPIDO", "gpt-4o-mini")
+
+CAMPOS_REVISAO = ("Análise Sintática", "Regra Aplicável", "Explicação Revisada", "Sugestão Revisada",
+                  "Considerações ENEM")
+CAMPOS_ERRO = ("Descrição:", "Trecho:")
+
+_VEREDITO = re.compile(r"Erro Confirmado:\s*(Sim|Não)\b")
+
+
+@dataclass(frozen=True)
+class PoliticaRoteamento:
+    modelo_rapido: Optional[str]
+    etapas: Tuple[str, ...] = ("deteccao", "revisao")
+    confianca_minima: float = 0.85
+
+
+# Comp. 1: erros de norma são frequentes e repetitivos, o modelo rápido resolve a maioria.
+# Nas demais a detecção é feita via RAG; só a revisão passa pelo roteamento.
+POLITICAS: Dict[str, PoliticaRoteamento] = {
+    "competency1": PoliticaRoteamento(MODELO_RAPIDO, ("deteccao", "revisao"), 0.9),
+    "competency2": PoliticaRoteamento(MODELO_RAPIDO, ("revisao",), 0.85),
+    "competency3": PoliticaRoteamento(MODELO_RAPIDO, ("revisao",), 0.85),
+    "competency4": PoliticaRoteamento(MODELO_RAPIDO, ("revisao",), 0.85),
+    "competency5": PoliticaRoteamento(MODELO_RAPIDO, ("revisao",), 0.85),
+}
+
+_caminho_politicas = os.getenv("ROTEAMENTO_POLITICAS")
+if _caminho_politicas:
+    with open(_caminho_politicas, encoding="utf-8") as _arquivo:
+        for _comp, _opcoes in json.load(_arquivo).items():
+            if "etapas" in _opcoes:
+                _opcoes["etapas"] = tuple(_opcoes["etapas"])
+            POLITICAS[_comp] = replace(POLITICAS.get(_comp, PoliticaRoteamento(MODELO_RAPIDO)), **_opcoes)
+
+
+def politica_para(competencia: Optional[str], etapa: str) -> Optional[PoliticaRoteamento]:
+    """Política aplicável à chamada, ou None se ela deve ir direto ao modelo informado."""
+    if not ATIVO or competencia is None:
+        return None
+    politica = POLITICAS.get(competencia)
+    if politica is None or not politica.modelo_rapido:
+        return None
+    return politica if etapa.split(":", 1)[0] in politica.etapas else None
+
+
+def _tokens_logprobs(resposta: Any) -> Optional[list]:
+    logprobs = getattr(resposta.choices[0], "logprobs", None)
+    return getattr(logprobs, "content", None) or None
+
+
+def confianca(resposta: Any, etapa: str) -> Optional[float]:
+    """Confiança da resposta a partir dos logprobs; None se a API não os devolveu."""
+    tokens = _tokens_logprobs(resposta)
+    if tokens is None:
+        return None
+    if etapa.startswith("revisao"):
+        # Probabilidade do primeiro token do veredito, após "Erro Confirmado:"
+        texto = ""
+        for token in tokens:
+            antes = texto
+            texto += token.token
+            if "Erro Confirmado:" in antes and token.token.strip():
+                return math.exp(token.logprob)
+        return None
+    return math.exp(sum(t.logprob for t in tokens) / len(tokens))
+
+
+def problema_formato(conteudo: str, etapa: str) -> Optional[str]:
+    """Descreve o defeito de formato da resposta, ou None se ela pode ser usada."""
+    if etapa.startswith("revisao"):
+        vereditos = _VEREDITO.findall(conteudo)
+        if len(vereditos) != 1:
+            return "veredito ausente ou conflitante"
+        if vereditos[0] == "Sim" and not all(f"{campo}:" in conteudo for campo in CAMPOS_REVISAO):
+            return "revisão incompleta"
+        return None
+    blocos = re.findall(r"^\s*ERRO\s*$(.*?)^\s*FIM_ERRO\s*$", conteudo, re.MULTILINE | re.DOTALL)
+    abertos = len(re.findall(r"^\s*ERRO\s*$", conteudo, re.MULTILINE))
+    if abertos != len(blocos):
+        return "bloco ERRO sem FIM_ERRO"
+    if any(not all(campo in bloco for campo in CAMPOS_ERRO) for bloco in blocos):
+        return "erro sem descrição ou trecho"
+    return None
+
+
+def motivo_escalonamento(politica: PoliticaRoteamento, etapa: str, resposta: Any) -> Optional[str]:
+    """Por que a resposta do modelo rápido não serve; None se pode ser aceita."""
+    problema = problema_formato(resposta.choices[0].message.content or "", etapa)
+    if problema:
+        return problema
+    valor = confianca(resposta, etapa)
+    if valor is not None and valor < politica.confianca_minima:
+        return f"confiança {valor:.2f} abaixo de {politica.confianca_minima:.2f}"
+    return None
@@ -0,0 +1,437 @@
+"""
+Serviço de correção: API HTTP/JSON na frente de um pool de processos.
+
+A correção (analysis_function.executar_pipeline) e a geração de conteúdo do
+editor rodam nos processos do pool, fora do servidor web do Streamlit; o
+servidor HTTP só enfileira, acompanha e devolve os resultados. Para escalar
+entre máquinas, cada nó roda o seu serviço e o cliente distribui as tarefas
+entre as URLs de SERVICO_CORRECAO_URL (separadas por vírgula) pelo hash da
+redação ou do tema. A tarefa é identificada pela URL que o nó devolve em
+Location, então as consultas voltam sempre ao nó que a recebeu.
+
+Rotas:
+    POST /tarefas                 {"tipo": ..., "parametros": {...}} -> 202, Location: /tarefas/<id>
+    GET  /tarefas/<id>            {"id", "tipo", "status", "nota_provisoria", "erro"}
+    GET  /tarefas/<id>/resultado  200 com {"resultado": ...}; 409 enquanto não termina
+                                  (na correção, o resultado traz as linhas do rastro em "rastro")
+
+Tipos de tarefa e parâmetros:
+    correcao          texto, tema, user_id e metricas (cohmetrix_results da redação)
+    material_estudo   tema, questoes e nivel_profundidade (opcional, "alto")
+    dicas_resolucao   questao
+
+As dependências que a aplicação injeta em analysis_function (client, RAG,
+competências, save_redacao_es/save_redacao) são preparadas por uma função
+"modulo:funcao" (--inicializador ou SERVICO_INICIALIZADOR), chamada no
+servidor e em cada processo do pool. Os resultados da correção são gravados
+(armazém local, uso diário, fila de persistência) no processo do servidor, que
+fica sendo o único escritor do spool e dos arquivos de uso.
+
+Tarefas iguais enviadas enquanto uma delas ainda roda (a mesma redação e tema,
+o mesmo tema de material) compartilham a execução no pool: cada uma mantém o
+seu id, o seu estado e a sua gravação, mas o processo só corrige uma vez.
+
+Uso:
+    python servico_correcao.py --porta 8090 --processos 4 --inicializador app:preparar
+    SERVICO_CORRECAO_URL=http://127.0.0.1:8090 streamlit run trilha_correcoes.py
+"""
+import argparse
+import copy
+import hashlib
+import importlib
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass, replace
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional
+
+import tarefas_correcao
+from coalescencia import chave_estavel
+from armazem_resultados import chave_redacao
+
+logger = logging.getLogger(__name__)
+
+NA_FILA = "na_fila"
+EXECUTANDO = "executando"
+CONCLUIDA = "concluida"
+FALHOU = "falhou"
+
+# Tarefas terminadas ficam disponíveis para consulta por este tempo
+RETENCAO_S = float(os.getenv("SERVICO_RETENCAO_S", "3600"))
+INTERVALO_CONSULTA_S = 1.0
+TIMEOUT_HTTP_S = 10.0
+
+
+class ErroServico(Exception):
+    pass
+
+
+# --- Processos do pool ---------------------------------------------------------
+
+_progresso = None
+
+
+def _carregar_inicializador(caminho: Optional[str]) -> Optional[Callable[[], None]]:
+    if not caminho:
+        return None
+    modulo, funcao = caminho.split(":", 1)
+    return getattr(importlib.import_module(modulo), funcao)
+
+
+def _inicializar_processo(caminho_inicializador: Optional[str], progresso):
+    global _progresso
+    _progresso = progresso
+    inicializador = _carregar_inicializador(caminho_inicializador)
+    if inicializador is not None:
+        inicializador()
+
+
+def _corrigir(id_tarefa: str, parametros: Dict[str, Any]) -> Any:
+    import analysis_function as af
+
+    def ao_atualizar_nota(resumo: Dict[str, Any]):
+        _progresso[id_tarefa] = {"status": EXECUTANDO, "nota_provisoria": resumo}
+
+    # Se o processo cair, a mesma redação enviada de novo retoma dos checkpoints
+    id_checkpoints = tarefas_correcao.id_tarefa(parametros["texto"], parametros.get("tema"), parametros.get("user_id"))
+    with tarefas_correcao.checkpoints(id_checkpoints):
+        # A correção volta inteira (com a duplicata): o servidor monta os resultados de cada tarefa
+        # anexada a esta execução para o aluno dela
+        return af.corrigir_compartilhada(parametros["texto"], parametros.get("tema"), parametros.get("user_id"),
+                                         ao_atualizar_nota if _progresso is not None else None,
+                                         parametros.get("metricas"))
+
+
+def _gerar_material(id_tarefa: str, parametros: Dict[str, Any]) -> str:
+    import analysis_function as af
+    from editor import GeradorConteudo
+
+    return GeradorConteudo(af.client).gerar_material_estudo(parametros["tema"], parametros["questoes"],
+                                                            _nivel_profundidade(parametros))
+
+
+def _nivel_profundidade(parametros: Dict[str, Any]) -> str:
+    return parametros.get("nivel_profundidade") or "alto"
+
+
+def _gerar_dicas(id_tarefa: str, parametros: Dict[str, Any]) -> str:
+    import analysis_function as af
+    from editor import GeradorConteudo
+
+    return GeradorConteudo(af.client).gerar_dicas_resolucao(parametros["questao"])
+
+
+EXECUTORES: Dict[str, Callable[[str, Dict[str, Any]], Any]] = {
+    "correcao": _corrigir,
+    "material_estudo": _gerar_material,
+    "dicas_resolucao": _gerar_dicas,
+}
+
+
+def _executar(tipo: str, id_tarefa: str, parametros: Dict[str, Any]) -> Any:
+    if _progresso is not None:
+        _progresso[id_tarefa] = {"status": EXECUTANDO}
+    return EXECUTORES[tipo](id_tarefa, parametros)
+
+
+def _chave_coalescencia(tipo: str, parametros: Dict[str, Any]) -> str:
+    if tipo == "correcao":
+        return f"{tipo}:{chave_redacao(parametros['texto'], parametros.get('tema'))}"
+    if tipo == "material_estudo":
+        return f"{tipo}:{chave_estavel(parametros.get('tema'), _nivel_profundidade(parametros), parametros.get('questoes'))}"
+    return f"{tipo}:{chave_estavel(parametros)}"
+
+
+# --- Servidor ------------------------------------------------------------------
+
+@dataclass
+class Tarefa:
+    id: str
+    tipo: str
+    parametros: Dict[str, Any]
+    criada_em: float
+    futuro: Optional[Future] = None
+    # Tarefa cuja execução esta compartilha, quando foi enviada enquanto uma igual rodava
+    origem: Optional[str] = None
+    resultado: Any = None
+    erro: Optional[str] = None
+    concluida_em: Optional[float] = None
+
+    @property
+    def status(self) -> str:
+        if self.erro is not None:
+            return FALHOU
+        if self.concluida_em is not None:
+            return CONCLUIDA
+        if self.futuro is not None and (self.futuro.running() or self.futuro.done()):
+            return EXECUTANDO
+        return NA_FILA
+
+
+class ServicoCorrecao:
+    """Servidor HTTP em thread própria; as tarefas rodam no ProcessPoolExecutor."""
+
+    def __init__(self, processos: Optional[int] = None, inicializador: Optional[str] = None,
+                 host: str = "127.0.0.1", porta: int = 0):
+        preparar = _carregar_inicializador(inicializador)
+        if preparar is not None:
+            preparar()
+        self._gerenciador = multiprocessing.Manager()
+        self._progresso = self._gerenciador.dict()
+        self._pool = ProcessPoolExecutor(max_workers=processos, initializer=_inicializar_processo,
+                                         initargs=(inicializador, self._progresso))
+        self._tarefas: Dict[str, Tarefa] = {}
+        self._em_execucao: Dict[str, Tarefa] = {}
+        self._trava = threading.Lock()
+        self._http = ThreadingHTTPServer((host, porta), self._criar_handler())
+        self._http.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, porta = self._http.server_address[:2]
+        return f"http://{host}:{porta}"
+
+    def iniciar(self) -> "ServicoCorrecao":
+        self._thread = threading.Thread(target=self._http.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def servir(self):
+        """Atende requisições na thread atual até parar() (ou Ctrl+C), para rodar como processo dedicado."""
+        self._http.serve_forever()
+
+    def parar(self):
+        self._http.shutdown()
+        self._http.server_close()
+        self._pool.shutdown(wait=True, cancel_futures=True)
+        self._gerenciador.shutdown()
+
+    def __enter__(self):
+        return self.iniciar()
+
+    def __exit__(self, *_):
+        self.parar()
+
+    def submeter(self, tipo: str, parametros: Dict[str, Any]) -> Tarefa:
+        if tipo not in EXECUTORES:
+            raise ValueError(f"tipo de tarefa desconhecido: {tipo}")
+        self._descartar_antigas()
+        tarefa = Tarefa(uuid.uuid4().hex, tipo, parametros, time.time())
+        chave = _chave_coalescencia(tipo, parametros)
+        with self._trava:
+            self._tarefas[tarefa.id] = tarefa
+            original = self._em_execucao.get(chave)
+            if original is None:
+                tarefa.futuro = self._pool.submit(_executar, tipo, tarefa.id, parametros)
+                self._em_execucao[chave] = tarefa
+            else:
+                tarefa.origem = original.id
+                tarefa.futuro = original.futuro
+        if original is None:
+            tarefa.futuro.add_done_callback(lambda _: self._liberar(chave, tarefa))
+        else:
+            logger.info(f"Tarefa {tarefa.id} ({tipo}) compartilha a execução da tarefa {original.id}")
+        tarefa.futuro.add_done_callback(lambda futuro: self._concluir(tarefa, futuro))
+        return tarefa
+
+    def _liberar(self, chave: str, tarefa: Tarefa):
+        with self._trava:
+            if self._em_execucao.get(chave) is tarefa:
+                del self._em_execucao[chave]
+
+    def _concluir(self, tarefa: Tarefa, futuro: Future):
+        try:
+            resultado = futuro.result()
+            if tarefa.tipo == "correcao":
+                import analysis_function as af
+                correcao = resultado if tarefa.origem is None else replace(resultado, coalescida=True)
+                resultado = correcao.para_usuario(tarefa.parametros.get("user_id"))
+                af.persistir_resultados(tarefa.parametros["texto"], tarefa.parametros.get("tema"), resultado,
+                                        tarefa.parametros.get("user_id"))
+                # O rastro vai junto do resultado (fora do armazém) para o painel de depuração do cliente
+                resultado = {**resultado, "rastro": correcao.rastro.para_linhas()}
+                # Correção gravada: os checkpoints abertos em _corrigir não servem mais para retomar
+                tarefas_correcao.obter_armazem().limpar_checkpoints(tarefas_correcao.id_tarefa(
+                    tarefa.parametros["texto"], tarefa.parametros.get("tema"), tarefa.parametros.get("user_id")))
+            elif tarefa.origem is not None:
+                resultado = copy.deepcopy(resultado)
+            tarefa.resultado = resultado
+        except Exception as e:
+            logger.error(f"Tarefa {tarefa.id} ({tarefa.tipo}) falhou: {e}")
+            tarefa.erro = str(e) or type(e).__name__
+        tarefa.concluida_em = time.time()
+        self._progresso.pop(tarefa.id, None)
+
+    def _descartar_antigas(self):
+        limite = time.time() - RETENCAO_S
+        with self._trava:
+            for id_tarefa in [t.id for t in self._tarefas.values() if t.concluida_em and t.concluida_em < limite]:
+                del self._tarefas[id_tarefa]
+
+    def obter(self, id_tarefa: str) -> Optional[Tarefa]:
+        with self._trava:
+            return self._tarefas.get(id_tarefa)
+
+    def estado(self, tarefa: Tarefa) -> Dict[str, Any]:
+        progresso = self._progresso.get(tarefa.origem or tarefa.id, {}) if tarefa.concluida_em is None else {}
+        return {
+            "id": tarefa.id,
+            "tipo": tarefa.tipo,
+            "status": tarefa.status,
+            "nota_provisoria": progresso.get("nota_provisoria"),
+            "erro": tarefa.erro,
+        }
+
+    def _criar_handler(self):
+        servico = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                if self.path.rstrip("/") != "/tarefas":
+                    self._enviar(404, {"erro": f"rota desconhecida: {self.path}"})
+                    return
+                try:
+                    tamanho = int(self.headers.get("Content-Length", 0))
+                    corpo = json.loads(self.rfile.read(tamanho) or b"{}")
+                    tarefa = servico.submeter(corpo.get("tipo"), corpo.get("parametros") or {})
+                except (ValueError, json.JSONDecodeError) as e:
+                    self._enviar(400, {"erro": str(e)})
+                    return
+                self._enviar(202, servico.estado(tarefa), {"Location": f"/tarefas/{tarefa.id}"})
+
+            def do_GET(self):
+                partes = self.path.strip("/").split("/")
+                tarefa = servico.obter(partes[1]) if len(partes) in (2, 3) and partes[0] == "tarefas" else None
+                if tarefa is None or (len(partes) == 3 and partes[2] != "resultado"):
+                    self._enviar(404, {"erro": f"tarefa ou rota desconhecida: {self.path}"})
+                elif len(partes) == 2:
+                    self._enviar(200, servico.estado(tarefa))
+                elif tarefa.status == CONCLUIDA:
+                    self._enviar(200, {"resultado": tarefa.resultado})
+                else:
+                    self._enviar(409, servico.estado(tarefa))
+
+            def _enviar(self, status: int, payload: Dict[str, Any], cabecalhos: Optional[Dict[str, str]] = None):
+                dados = json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(dados)))
+                for nome, valor in (cabecalhos or {}).items():
+                    self.send_header(nome, valor)
+                self.end_headers()
+                self.wfile.write(dados)
+
+            def log_message(self, *_):
+                pass
+
+        return Handler
+
+
+# --- Cliente -------------------------------------------------------------------
+
+class ClienteServico:
+    """Cliente das páginas Streamlit; a tarefa é identificada pela URL devolvida pelo nó."""
+
+    def __init__(self, urls: List[str], timeout_s: float = TIMEOUT_HTTP_S):
+        self.urls = [url.rstrip("/") for url in urls]
+        self.timeout_s = timeout_s
+
+    def _no(self, chave: str) -> str:
+        return self.urls[int(hashlib.sha256(chave.encode("utf-8")).hexdigest()[:8], 16) % len(self.urls)]
+
+    def _requisitar(self, url: str, corpo: Optional[Dict[str, Any]] = None):
+        dados = json.dumps(corpo, ensure_ascii=False).encode("utf-8") if corpo is not None else None
+        requisicao = urllib.request.Request(url, data=dados, headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(requisicao, timeout=self.timeout_s) as resposta:
+                return resposta.status, resposta.headers, json.loads(resposta.read())
+        except urllib.error.HTTPError as e:
+            return e.code, e.headers, json.loads(e.read() or b"{}")
+        except (urllib.error.URLError, OSError) as e:
+            raise ErroServico(f"Serviço de correção indisponível em {url}: {e}") from e
+
+    def submeter(self, tipo: str, parametros: Dict[str, Any], chave: str = "") -> str:
+        """Envia a tarefa ao nó escolhido por `chave`; retorna a URL da tarefa."""
+        base = self._no(chave)
+        status, cabecalhos, corpo = self._requisitar(f"{base}/tarefas", {"tipo": tipo, "parametros": parametros})
+        if status != 202:
+            raise ErroServico(corpo.get("erro", f"HTTP {status}"))
+        return base + cabecalhos["Location"]
+
+    def estado(self, url_tarefa: str) -> Dict[str, Any]:
+        status, _, corpo = self._requisitar(url_tarefa)
+        if status != 200:
+            raise ErroServico(corpo.get("erro", f"HTTP {status}"))
+        return corpo
+
+    def resultado(self, url_tarefa: str) -> Any:
+        status, _, corpo = self._requisitar(f"{url_tarefa}/resultado")
+        if status != 200:
+            raise ErroServico(corpo.get("erro", f"Tarefa ainda não concluída (HTTP {status})"))
+        return corpo["resultado"]
+
+    def aguardar(self, url_tarefa: str, ao_atualizar: Optional[Callable[[Dict[str, Any]], None]] = None,
+                 intervalo_s: float = INTERVALO_CONSULTA_S, timeout_s: Optional[float] = None) -> Any:
+        """Consulta a tarefa até terminar; `ao_atualizar` recebe cada estado. Retorna o resultado."""
+        limite = time.monotonic() + timeout_s if timeout_s else None
+        while True:
+            estado = self.estado(url_tarefa)
+            if ao_atualizar is not None:
+                ao_atualizar(estado)
+            if estado["status"] == FALHOU:
+                raise ErroServico(estado["erro"])
+            if estado["status"] == CONCLUIDA:
+                return self.resultado(url_tarefa)
+            if limite is not None and time.monotonic() > limite:
+                raise ErroServico(f"Tarefa {url_tarefa} não terminou em {timeout_s:.0f}s")
+            time.sleep(intervalo_s)
+
+    def executar(self, tipo: str, parametros: Dict[str, Any], chave: str = "", **opcoes) -> Any:
+        return self.aguardar(self.submeter(tipo, parametros, chave), **opcoes)
+
+
+_cliente: Optional[ClienteServico] = None
+_trava_cliente = threading.Lock()
+
+
+def obter_cliente() -> Optional[ClienteServico]:
+    """Cliente do serviço, ou None se SERVICO_CORRECAO_URL não estiver definida (tudo roda no processo)."""
+    global _cliente
+    urls = [url.strip() for url in os.getenv("SERVICO_CORRECAO_URL", "").split(",") if url.strip()]
+    if not urls:
+        return None
+    with _trava_cliente:
+        if _cliente is None or _cliente.urls != [url.rstrip("/") for url in urls]:
+            _cliente = ClienteServico(urls)
+        return _cliente
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serviço HTTP de correção com pool de processos")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--porta", type=int, default=8090)
+    parser.add_argument("--processos", type=int, default=os.cpu_count())
+    parser.add_argument("--inicializador", default=os.getenv("SERVICO_INICIALIZADOR"),
+                        help="Função modulo:funcao que injeta client, RAG e competências em analysis_function")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    servico = ServicoCorrecao(args.processos, args.inicializador, args.host, args.porta)
+    logger.info(f"Serviço de correção em {servico.base_url} com {args.processos} processos")
+    try:
+        servico.servir()
+    except KeyboardInterrupt:
+        servico.parar()
+
+
+if __name__ == "__main__":
+    main()
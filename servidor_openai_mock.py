@@ -0,0 +1,226 @@
+"""
+Servidor local compatível com a API de chat completions da OpenAI.
+
+Responde com textos prontos nos formatos que o pipeline espera (blocos
+ERRO/FIM_ERRO, REVISAO/FIM_REVISAO, "Nota:/Justificativa:" e a resposta do modo
+fundido, com blocos ANALISE e NOTA), com latência e taxa de erro configuráveis.
+Usado pelos benchmarks e para desenvolvimento sem custo de API.
+
+Uso:
+    python servidor_openai_mock.py --porta 8089 --latencia-ms 400 --taxa-erro 0.02
+
+    client = OpenAI(base_url="http://127.0.0.1:8089/v1", api_key="mock")
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional
+
+
+@dataclass
+class ConfiguracaoMock:
+    latencia_ms: float = 0.0
+    variacao_ms: float = 0.0
+    taxa_erro: float = 0.0
+    erros_por_deteccao: int = 2
+    taxa_confirmacao: float = 0.7
+    nota: int = 160
+    semente: Optional[int] = None
+
+
+class ServidorOpenAIMock:
+    """Servidor HTTP em thread própria; conta chamadas e tokens de prompt por tipo de resposta."""
+
+    def __init__(self, config: Optional[ConfiguracaoMock] = None, host: str = "127.0.0.1", porta: int = 0):
+        self.config = config or ConfiguracaoMock()
+        self._aleatorio = random.Random(self.config.semente)
+        self._trava = threading.Lock()
+        self.chamadas: Dict[str, int] = {}
+        self.tokens_prompt: Dict[str, int] = {}
+        self._http = ThreadingHTTPServer((host, porta), self._criar_handler())
+        self._http.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, porta = self._http.server_address[:2]
+        return f"http://{host}:{porta}/v1"
+
+    def total_chamadas(self) -> int:
+        with self._trava:
+            return sum(self.chamadas.values())
+
+    def zerar_contadores(self):
+        with self._trava:
+            self.chamadas.clear()
+            self.tokens_prompt.clear()
+
+    def iniciar(self) -> "ServidorOpenAIMock":
+        self._thread = threading.Thread(target=self._http.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def parar(self):
+        self._http.shutdown()
+        self._http.server_close()
+
+    def __enter__(self):
+        return self.iniciar()
+
+    def __exit__(self, *_):
+        self.parar()
+
+    # ------------------------------------------------------------------
+    def _sortear(self, funcao, *args):
+        with self._trava:
+            return funcao(*args)
+
+    def responder(self, corpo: Dict[str, Any]):
+        """Retorna (status, payload) para o corpo de uma requisição de chat completion."""
+        cfg = self.config
+        atraso = cfg.latencia_ms + self._sortear(self._aleatorio.uniform, -cfg.variacao_ms, cfg.variacao_ms)
+        if atraso > 0:
+            time.sleep(atraso / 1000)
+
+        if cfg.taxa_erro and self._sortear(self._aleatorio.random) < cfg.taxa_erro:
+            status = self._sortear(self._aleatorio.choice, [429, 500, 503])
+            return status, {"error": {"message": "erro simulado", "type": "server_error", "code": status}}
+
+        prompt = "\n".join(str(m.get("content", "")) for m in corpo.get("messages", []))
+        tipo, conteudo = self._gerar_conteudo(prompt)
+        with self._trava:
+            self.chamadas[tipo] = self.chamadas.get(tipo, 0) + 1
+            self.tokens_prompt[tipo] = self.tokens_prompt.get(tipo, 0) + len(prompt) // 4
+
+        return 200, {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": corpo.get("model", "mock"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": conteudo},
+                "finish_reason": "stop",
+                "logprobs": None,
+            }],
+            "usage": {
+                "prompt_tokens": len(prompt) // 4,
+                "completion_tokens": len(conteudo) // 4,
+                "total_tokens": (len(prompt) + len(conteudo)) // 4,
+            },
+        }
+
+    def _gerar_conteudo(self, prompt: str):
+        # Pacote de itens (processamento_lote com empacotar=True): uma resposta por item
+        itens = re.findall(r"^=== FIM DA \S+ (\d+) ===$", prompt, re.MULTILINE)
+        if itens and "FIM_RESPOSTA" in prompt:
+            partes = []
+            for numero in itens:
+                tipo, conteudo = self._gerar_conteudo_item(prompt)
+                partes.append(f"RESPOSTA {numero}\n{conteudo}\nFIM_RESPOSTA {numero}")
+            return f"pacote:{tipo}", "\n".join(partes)
+        return self._gerar_conteudo_item(prompt)
+
+    def _gerar_conteudo_item(self, prompt: str):
+        cfg = self.config
+        if "Erro Confirmado:" in prompt:
+            confirmado = self._sortear(self._aleatorio.random) < cfg.taxa_confirmacao
+            return "revisao", (
+                "REVISAO\n"
+                f"Erro Confirmado: {'Sim' if confirmado else 'Não'}\n"
+                "Análise Sintática: O termo exerce função sintática de complemento e a regência do verbo exige preposição.\n"
+                "Regra Aplicável: Norma-padrão da língua portuguesa, conforme a gramática normativa.\n"
+                "Explicação Revisada: Há junção da preposição exigida pela regência com o artigo definido feminino, "
+                "portanto o desvio compromete a adequação à norma culta exigida no ENEM.\n"
+                "Sugestão Revisada: Reescrever o trecho conforme a norma-padrão.\n"
+                "Considerações ENEM: Desvio pontual que deve ser considerado na avaliação.\n"
+                "FIM_REVISAO"
+            )
+        if "FIM_NOTA" in prompt:
+            _, deteccao = self._gerar_deteccao(prompt)
+            return "fundido", (
+                f"{deteccao}\n"
+                "ANALISE\nAnálise Geral: O texto demonstra domínio adequado, com desvios pontuais.\nFIM_ANALISE\n"
+                f"NOTA\nNota: {cfg.nota}\nJustificativa: A redação atende parcialmente aos critérios da competência.\n"
+                "FIM_NOTA"
+            )
+        if "Nota:" in prompt and "Justificativa:" in prompt:
+            return "nota", f"Nota: {cfg.nota}\nJustificativa: A redação atende parcialmente aos critérios da competência."
+        if "FIM_ERRO" in prompt:
+            return self._gerar_deteccao(prompt)
+        return "texto", (
+            "Análise Geral: O texto demonstra domínio adequado, com desvios pontuais.\n"
+            "Conclusão: Qualidade técnica satisfatória."
+        )
+
+    def _gerar_deteccao(self, prompt: str):
+        palavras = re.findall(r"\w+", prompt[-2000:]) or ["texto"]
+        blocos = []
+        for _ in range(self.config.erros_por_deteccao):
+            inicio = self._sortear(self._aleatorio.randrange, max(1, len(palavras) - 3))
+            trecho = " ".join(palavras[inicio:inicio + 3])
+            blocos.append(
+                "ERRO\n"
+                "Descrição: Desvio de concordância identificado no trecho\n"
+                f"Trecho: \"{trecho}\"\n"
+                "Explicação: O verbo não concorda com o sujeito da oração.\n"
+                "Sugestão: Ajustar a concordância verbal.\n"
+                "FIM_ERRO"
+            )
+        return "deteccao", "Análise Geral: O texto apresenta alguns desvios.\n" + "\n".join(blocos)
+
+    def _criar_handler(self):
+        servidor = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    self._enviar(404, {"error": {"message": f"rota desconhecida: {self.path}"}})
+                    return
+                tamanho = int(self.headers.get("Content-Length", 0))
+                corpo = json.loads(self.rfile.read(tamanho) or b"{}")
+                self._enviar(*servidor.responder(corpo))
+
+            def _enviar(self, status: int, payload: Dict[str, Any]):
+                dados = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(dados)))
+                self.end_headers()
+                self.wfile.write(dados)
+
+            def log_message(self, *_):
+                pass
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor OpenAI local para testes e benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--porta", type=int, default=8089)
+    parser.add_argument("--latencia-ms", type=float, default=0.0)
+    parser.add_argument("--variacao-ms", type=float, default=0.0)
+    parser.add_argument("--taxa-erro", type=float, default=0.0)
+    parser.add_argument("--erros-por-deteccao", type=int, default=2)
+    parser.add_argument("--taxa-confirmacao", type=float, default=0.7)
+    args = parser.parse_args()
+
+    config = ConfiguracaoMock(args.latencia_ms, args.variacao_ms, args.taxa_erro,
+                              args.erros_por_deteccao, args.taxa_confirmacao)
+    servidor = ServidorOpenAIMock(config, args.host, args.porta)
+    print(f"Servidor mock em {servidor.base_url}")
+    try:
+        servidor._http.serve_forever()
+    except KeyboardInterrupt:
+        servidor.parar()
+
+
+if __name__ == "__main__":
+    main()
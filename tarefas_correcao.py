@@ -0,0 +1,412 @@
+"""
+Tarefas de correção retomáveis, com checkpoint de cada chamada de modelo.
+
+Uma tarefa é a correção de uma redação, identificada por id_tarefa(texto,
+tema, user_id). Dentro de `checkpoints(id)`, cada resposta de chamar_modelo
+(detecção por critério, revisão por erro, nota por competência) e de
+chamar_rag (análises) é gravada em ARQUIVO_TAREFAS assim que chega. Se a
+execução for interrompida (queda do processo, rerun do Streamlit), a próxima
+execução da mesma tarefa lê as respostas gravadas em vez de chamar o modelo de
+novo e segue a partir da primeira chamada que faltava. Nenhuma chamada paga é
+refeita.
+
+A chave do checkpoint é o hash de (modelo, prompt, temperatura) mais a ordem
+da chamada entre as idênticas da mesma execução, de modo que a repetição segue
+a mesma sequência do pipeline. Os checkpoints de uma tarefa concluída são
+apagados; o resultado fica no armazém de resultados.
+
+Filas (TAREFAS_FILA):
+    local   threads no próprio processo (padrão)
+    redis   lista no Redis em TAREFAS_REDIS_URL (ou um substituto local com a
+            mesma interface, como o fakeredis); os trabalhadores rodam em
+            outros processos com
+                python tarefas_correcao.py trabalhador --inicializador app:preparar
+
+Quem executa uma tarefa a reivindica com um UPDATE condicional (só uma
+pendente vira "executando") e mantém um lease (dono e validade) renovado a cada
+DURACAO_LEASE_S / 3 enquanto corrige. Ao iniciar, a fila devolve a ela as
+tarefas pendentes e as em execução cujo lease venceu (o processo que as
+executava caiu); as que outro processo vivo está executando ficam com ele.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import queue
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import rastreamento
+from armazem_resultados import chave_redacao
+
+logger = logging.getLogger(__name__)
+
+ARQUIVO_TAREFAS = os.getenv("TAREFAS_ARQUIVO", os.path.join(".dados", "tarefas.sqlite3"))
+TIPO_FILA = os.getenv("TAREFAS_FILA", "local")
+URL_REDIS = os.getenv("TAREFAS_REDIS_URL", "redis://localhost:6379/0")
+CHAVE_FILA_REDIS = "tarefas_correcao:fila"
+TRABALHADORES = int(os.getenv("TAREFAS_TRABALHADORES", "2"))
+DURACAO_LEASE_S = float(os.getenv("TAREFAS_LEASE_S", "60"))
+
+# Dono dos leases das tarefas executadas por este processo
+DONO = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+PENDENTE = "pendente"
+EXECUTANDO = "executando"
+CONCLUIDA = "concluida"
+FALHOU = "falhou"
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS tarefas (
+    id TEXT PRIMARY KEY,
+    parametros TEXT NOT NULL,
+    status TEXT NOT NULL,
+    progresso TEXT,
+    resultado TEXT,
+    erro TEXT,
+    dono TEXT,
+    lease_ate REAL,
+    atualizada_em REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_tarefas_status ON tarefas (status);
+CREATE TABLE IF NOT EXISTS checkpoints (
+    tarefa TEXT NOT NULL,
+    chave TEXT NOT NULL,
+    resposta TEXT NOT NULL,
+    PRIMARY KEY (tarefa, chave)
+);
+"""
+
+
+def id_tarefa(texto: str, tema: Any, user_id: Any = None) -> str:
+    return hashlib.sha256(f"{chave_redacao(texto, tema)}\x1f{user_id}".encode("utf-8")).hexdigest()
+
+
+class ArmazemTarefas:
+    """Estado das tarefas e checkpoints em SQLite; seguro entre threads e processos (WAL)."""
+
+    def __init__(self, caminho: str = ARQUIVO_TAREFAS):
+        if caminho != ":memory:":
+            os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+        self._conexao = sqlite3.connect(caminho, check_same_thread=False, timeout=30)
+        self._conexao.row_factory = sqlite3.Row
+        self._trava = threading.Lock()
+        with self._trava, self._conexao:
+            self._conexao.execute("PRAGMA journal_mode=WAL")
+            self._conexao.executescript(_ESQUEMA)
+            colunas = {linha["name"] for linha in self._conexao.execute("PRAGMA table_info(tarefas)")}
+            for coluna, tipo in (("dono", "TEXT"), ("lease_ate", "REAL")):
+                if coluna not in colunas:
+                    self._conexao.execute(f"ALTER TABLE tarefas ADD COLUMN {coluna} {tipo}")
+
+    def criar(self, id_tarefa: str, parametros: Dict[str, Any]) -> bool:
+        """Registra a tarefa como pendente; False se ela já existia."""
+        with self._trava, self._conexao:
+            cursor = self._conexao.execute(
+                "INSERT OR IGNORE INTO tarefas (id, parametros, status, atualizada_em) VALUES (?, ?, ?, ?)",
+                (id_tarefa, json.dumps(parametros, ensure_ascii=False, default=str), PENDENTE, time.time()))
+        return cursor.rowcount == 1
+
+    def atualizar(self, id_tarefa: str, **campos):
+        campos = {nome: json.dumps(valor, ensure_ascii=False, default=str) if nome in ("progresso", "resultado")
+                  else valor for nome, valor in campos.items()}
+        atribuicoes = ", ".join(f"{nome} = ?" for nome in campos)
+        with self._trava, self._conexao:
+            self._conexao.execute(f"UPDATE tarefas SET {atribuicoes}, atualizada_em = ? WHERE id = ?",
+                                  (*campos.values(), time.time(), id_tarefa))
+
+    def carregar(self, id_tarefa: str) -> Optional[Dict[str, Any]]:
+        with self._trava:
+            linha = self._conexao.execute("SELECT * FROM tarefas WHERE id = ?", (id_tarefa,)).fetchone()
+        if linha is None:
+            return None
+        tarefa = dict(linha)
+        for nome in ("parametros", "progresso", "resultado"):
+            tarefa[nome] = json.loads(tarefa[nome]) if tarefa[nome] else None
+        return tarefa
+
+    def reivindicar(self, id_tarefa: str, dono: str = DONO, duracao_s: float = DURACAO_LEASE_S) -> bool:
+        """Passa a tarefa de pendente a em execução por `dono`; False se outro já a reivindicou."""
+        with self._trava, self._conexao:
+            cursor = self._conexao.execute(
+                "UPDATE tarefas SET status = ?, dono = ?, lease_ate = ?, erro = NULL, atualizada_em = ? "
+                "WHERE id = ? AND status = ?",
+                (EXECUTANDO, dono, time.time() + duracao_s, time.time(), id_tarefa, PENDENTE))
+        return cursor.rowcount == 1
+
+    def renovar_lease(self, id_tarefa: str, dono: str = DONO, duracao_s: float = DURACAO_LEASE_S) -> bool:
+        with self._trava, self._conexao:
+            cursor = self._conexao.execute(
+                "UPDATE tarefas SET lease_ate = ? WHERE id = ? AND status = ? AND dono = ?",
+                (time.time() + duracao_s, id_tarefa, EXECUTANDO, dono))
+        return cursor.rowcount == 1
+
+    def devolver(self, id_tarefa: str) -> bool:
+        """Volta à pendência uma tarefa que falhou ou cujo lease venceu; False se não era o caso."""
+        with self._trava, self._conexao:
+            cursor = self._conexao.execute(
+                "UPDATE tarefas SET status = ?, dono = NULL, lease_ate = NULL, atualizada_em = ? "
+                "WHERE id = ? AND (status = ? OR (status = ? AND (lease_ate IS NULL OR lease_ate < ?)))",
+                (PENDENTE, time.time(), id_tarefa, FALHOU, EXECUTANDO, time.time()))
+        return cursor.rowcount == 1
+
+    def interrompidas(self) -> List[str]:
+        """Tarefas pendentes e em execução com lease vencido; as de um dono vivo ficam de fora."""
+        with self._trava:
+            linhas = self._conexao.execute(
+                "SELECT id FROM tarefas WHERE status = ? OR (status = ? AND (lease_ate IS NULL OR lease_ate < ?))",
+                (PENDENTE, EXECUTANDO, time.time())).fetchall()
+        return [linha["id"] for linha in linhas]
+
+    def buscar_checkpoint(self, id_tarefa: str, chave: str) -> Optional[str]:
+        with self._trava:
+            linha = self._conexao.execute("SELECT resposta FROM checkpoints WHERE tarefa = ? AND chave = ?",
+                                          (id_tarefa, chave)).fetchone()
+        return linha["resposta"] if linha else None
+
+    def gravar_checkpoint(self, id_tarefa: str, chave: str, resposta: str):
+        with self._trava, self._conexao:
+            self._conexao.execute("INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?)", (id_tarefa, chave, resposta))
+
+    def limpar_checkpoints(self, id_tarefa: str):
+        with self._trava, self._conexao:
+            self._conexao.execute("DELETE FROM checkpoints WHERE tarefa = ?", (id_tarefa,))
+
+
+_armazem: Optional[ArmazemTarefas] = None
+_trava_armazem = threading.Lock()
+
+
+def obter_armazem() -> ArmazemTarefas:
+    global _armazem
+    with _trava_armazem:
+        if _armazem is None:
+            _armazem = ArmazemTarefas()
+        return _armazem
+
+
+def configurar(caminho: str) -> ArmazemTarefas:
+    """Troca o armazém de tarefas e checkpoints do processo por um aberto em `caminho`."""
+    global _armazem
+    with _trava_armazem:
+        _armazem = ArmazemTarefas(caminho)
+        return _armazem
+
+
+# --- Checkpoints ---------------------------------------------------------------
+
+@dataclass
+class Execucao:
+    id_tarefa: str
+    armazem: ArmazemTarefas
+    ocorrencias: Dict[str, int] = field(default_factory=dict)
+    repetidas: int = 0
+
+
+_execucao_atual: ContextVar[Optional[Execucao]] = ContextVar("execucao_tarefa", default=None)
+
+
+@contextmanager
+def checkpoints(id_tarefa: str, armazem: Optional[ArmazemTarefas] = None) -> Iterator[Execucao]:
+    """Grava e repete as respostas de modelo das chamadas feitas dentro do bloco."""
+    execucao = Execucao(id_tarefa, armazem or obter_armazem())
+    token = _execucao_atual.set(execucao)
+    try:
+        yield execucao
+    finally:
+        _execucao_atual.reset(token)
+        if execucao.repetidas:
+            logger.info(f"Tarefa {id_tarefa[:12]}: {execucao.repetidas} respostas lidas dos checkpoints")
+
+
+def repetir_ou_chamar(partes: Tuple[Any, ...], chamar: Callable[[], str]) -> str:
+    """Resposta gravada para `partes` na execução ativa, ou chamar() e gravar o resultado."""
+    execucao = _execucao_atual.get()
+    if execucao is None:
+        return chamar()
+    base = hashlib.sha256(json.dumps(partes, ensure_ascii=False, default=str).encode("utf-8")).hexdigest()
+    ordem = execucao.ocorrencias.get(base, 0)
+    execucao.ocorrencias[base] = ordem + 1
+    chave = f"{base}:{ordem}"
+    gravada = execucao.armazem.buscar_checkpoint(execucao.id_tarefa, chave)
+    if gravada is not None:
+        execucao.repetidas += 1
+        with rastreamento.span("checkpoint", tipo="checkpoint", cache_hit=True):
+            return gravada
+    resposta = chamar()
+    execucao.armazem.gravar_checkpoint(execucao.id_tarefa, chave, resposta)
+    return resposta
+
+
+# --- Execução e filas ----------------------------------------------------------
+
+def executar_tarefa(id_tarefa: str, armazem: Optional[ArmazemTarefas] = None):
+    """Corrige a redação da tarefa (retomando dos checkpoints) e grava o resultado."""
+    import analysis_function as af
+
+    armazem = armazem or obter_armazem()
+    # Só quem reivindica executa: a mesma tarefa pode estar em mais de uma fila
+    # (retomada por outro processo, reenviada), mas roda uma vez
+    if not armazem.reivindicar(id_tarefa):
+        return
+    parametros = armazem.carregar(id_tarefa)["parametros"]
+    encerrada = threading.Event()
+    batimentos = threading.Thread(target=_manter_lease, args=(armazem, id_tarefa, encerrada), daemon=True)
+    batimentos.start()
+    try:
+        with checkpoints(id_tarefa, armazem):
+            resultados, rastro = af.executar_pipeline(
+                parametros["texto"], parametros.get("tema"), parametros.get("user_id"),
+                ao_atualizar_nota=lambda resumo: armazem.atualizar(id_tarefa, progresso=resumo),
+                metricas=parametros.get("metricas"))
+        af.persistir_resultados(parametros["texto"], parametros.get("tema"), resultados, parametros.get("user_id"))
+    except Exception as e:
+        logger.error(f"Tarefa {id_tarefa[:12]} falhou: {e}")
+        armazem.atualizar(id_tarefa, status=FALHOU, erro=str(e) or type(e).__name__)
+        return
+    finally:
+        encerrada.set()
+    # O rastro vai junto do resultado (fora do armazém de resultados) para o painel de depuração de quem consulta
+    armazem.atualizar(id_tarefa, status=CONCLUIDA, resultado={**resultados, "rastro": rastro.para_linhas()})
+    armazem.limpar_checkpoints(id_tarefa)
+
+
+def _manter_lease(armazem: ArmazemTarefas, id_tarefa: str, encerrada: threading.Event):
+    while not encerrada.wait(DURACAO_LEASE_S / 3):
+        if not armazem.renovar_lease(id_tarefa):
+            logger.warning(f"Tarefa {id_tarefa[:12]}: lease perdido; outro processo pode retomá-la")
+            return
+
+
+class FilaTarefas(ABC):
+    """Base das filas: registra a tarefa no armazém e entrega o id aos trabalhadores."""
+
+    def __init__(self, armazem: Optional[ArmazemTarefas] = None):
+        self.armazem = armazem or obter_armazem()
+
+    @abstractmethod
+    def _enfileirar(self, id_tarefa: str):
+        """Entrega o id a um trabalhador."""
+
+    def submeter(self, texto: str, tema: Any, user_id: Any = None, metricas: Optional[Dict[str, Any]] = None) -> str:
+        """
+        Enfileira a correção e retorna o id da tarefa. A mesma redação do mesmo
+        aluno reaproveita a tarefa existente: em andamento ou concluída, só o id é
+        devolvido; se falhou (ou o lease de quem a executava venceu), volta à fila
+        e retoma dos checkpoints.
+        """
+        identificador = id_tarefa(texto, tema, user_id)
+        parametros = {"texto": texto, "tema": tema, "user_id": user_id, "metricas": metricas}
+        if self.armazem.criar(identificador, parametros) or self.armazem.devolver(identificador):
+            self._enfileirar(identificador)
+        return identificador
+
+    def retomar_interrompidas(self) -> int:
+        ids = self.armazem.interrompidas()
+        for identificador in ids:
+            # Pendentes voltam como estão; em execução só se o lease ainda estiver vencido
+            if self.armazem.carregar(identificador)["status"] == PENDENTE or self.armazem.devolver(identificador):
+                self._enfileirar(identificador)
+        if ids:
+            logger.info(f"{len(ids)} tarefas interrompidas de volta à fila")
+        return len(ids)
+
+    def estado(self, id_tarefa: str) -> Optional[Dict[str, Any]]:
+        return self.armazem.carregar(id_tarefa)
+
+
+class FilaLocal(FilaTarefas):
+    """Fila em memória consumida por threads do próprio processo."""
+
+    def __init__(self, armazem: Optional[ArmazemTarefas] = None, trabalhadores: int = TRABALHADORES):
+        super().__init__(armazem)
+        self._fila: "queue.Queue[str]" = queue.Queue()
+        self._threads = [threading.Thread(target=self._trabalhar, daemon=True, name=f"tarefa-{i}")
+                         for i in range(trabalhadores)]
+        for thread in self._threads:
+            thread.start()
+
+    def _enfileirar(self, id_tarefa: str):
+        self._fila.put(id_tarefa)
+
+    def _trabalhar(self):
+        while True:
+            executar_tarefa(self._fila.get(), self.armazem)
+
+
+class FilaRedis(FilaTarefas):
+    """Lista no Redis; os trabalhadores são processos rodando trabalhar()."""
+
+    def __init__(self, cliente, armazem: Optional[ArmazemTarefas] = None, chave: str = CHAVE_FILA_REDIS):
+        super().__init__(armazem)
+        self.cliente = cliente
+        self.chave = chave
+
+    def _enfileirar(self, id_tarefa: str):
+        self.cliente.lpush(self.chave, id_tarefa)
+
+    def trabalhar(self, parar: Optional[threading.Event] = None, espera_s: int = 1):
+        while parar is None or not parar.is_set():
+            item = self.cliente.brpop(self.chave, timeout=espera_s)
+            if item is not None:
+                identificador = item[1]
+                executar_tarefa(identificador.decode() if isinstance(identificador, bytes) else identificador,
+                                self.armazem)
+
+
+_fila: Optional[FilaTarefas] = None
+_trava_fila = threading.Lock()
+
+
+def _criar_fila() -> FilaTarefas:
+    if TIPO_FILA == "redis":
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("TAREFAS_FILA=redis requer o pacote redis") from e
+        return FilaRedis(redis.Redis.from_url(URL_REDIS))
+    return FilaLocal()
+
+
+def obter_fila() -> FilaTarefas:
+    """Fila do processo (TAREFAS_FILA), criada na primeira chamada com as tarefas interrompidas de volta."""
+    global _fila
+    with _trava_fila:
+        if _fila is None:
+            _fila = _criar_fila()
+            _fila.retomar_interrompidas()
+        return _fila
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Trabalhador da fila de correções no Redis")
+    subcomandos = parser.add_subparsers(dest="comando", required=True)
+    trabalhador = subcomandos.add_parser("trabalhador", help="Consome a fila do Redis")
+    trabalhador.add_argument("--redis", default=URL_REDIS)
+    trabalhador.add_argument("--inicializador", default=os.getenv("SERVICO_INICIALIZADOR"),
+                             help="Função modulo:funcao que injeta client, RAG e competências em analysis_function")
+    args = parser.parse_args()
+
+    import importlib
+    import redis
+
+    logging.basicConfig(level=logging.INFO)
+    if args.inicializador:
+        modulo, funcao = args.inicializador.split(":", 1)
+        getattr(importlib.import_module(modulo), funcao)()
+    fila = FilaRedis(redis.Redis.from_url(args.redis))
+    fila.retomar_interrompidas()
+    fila.trabalhar()
+
+
+if __name__ == "__main__":
+    main()
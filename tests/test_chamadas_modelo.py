@@ -0,0 +1,49 @@
+from types import SimpleNamespace
+
+import httpx
+import openai
+import pytest
+
+import analysis_function as af
+
+REQUISICAO = httpx.Request("POST", "http://mock/v1/chat/completions")
+
+
+def erro_status(classe, status):
+    return classe("erro", response=httpx.Response(status, request=REQUISICAO), body=None)
+
+
+@pytest.mark.parametrize("erro", [
+    openai.APIConnectionError(request=REQUISICAO),
+    openai.APITimeoutError(request=REQUISICAO),
+    erro_status(openai.RateLimitError, 429),
+    erro_status(openai.InternalServerError, 503),
+])
+def test_erros_transitorios(erro):
+    assert af._erro_transitorio(erro)
+
+
+@pytest.mark.parametrize("erro", [
+    erro_status(openai.BadRequestError, 400),
+    erro_status(openai.AuthenticationError, 401),
+    KeyError("choices"),
+    TypeError("objeto inesperado"),
+    NameError("client"),
+])
+def test_erros_definitivos(erro):
+    assert not af._erro_transitorio(erro)
+
+
+def test_erro_definitivo_nao_e_repetido(monkeypatch):
+    chamadas = []
+
+    def criar(**_):
+        chamadas.append(1)
+        raise erro_status(openai.BadRequestError, 400)
+
+    monkeypatch.setattr(af, "client", SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=criar))),
+                        raising=False)
+    monkeypatch.setattr(af.time, "sleep", lambda _: pytest.fail("não deveria esperar para repetir"))
+    with pytest.raises(openai.BadRequestError):
+        af._requisitar_modelo("gpt-4o", "prompt", 0.3, "teste")
+    assert len(chamadas) == 1
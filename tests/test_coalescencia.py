@@ -0,0 +1,68 @@
+import threading
+import time
+
+from coalescencia import Coalescedor, chave_estavel
+
+
+def simultaneas(coalescedor, quantidade, calcular, ao_atualizar=None):
+    """Dispara `quantidade` chamadas com a mesma chave enquanto a primeira ainda executa."""
+    liberar = threading.Event()
+    chamadas = []
+    saidas = []
+
+    def calcular_quando_liberado(notificar):
+        chamadas.append(1)
+        liberar.wait(5)
+        return calcular(notificar)
+
+    def chamar():
+        try:
+            saidas.append(coalescedor.executar("chave", calcular_quando_liberado, ao_atualizar))
+        except Exception as e:
+            saidas.append(e)
+
+    threads = [threading.Thread(target=chamar) for _ in range(quantidade)]
+    for thread in threads:
+        thread.start()
+    while coalescedor.coalescidas < quantidade - 1:
+        time.sleep(0.01)
+    liberar.set()
+    for thread in threads:
+        thread.join(5)
+    return chamadas, saidas
+
+
+def test_chamadas_simultaneas_executam_uma_vez():
+    coalescedor = Coalescedor("teste")
+    chamadas, saidas = simultaneas(coalescedor, 5, lambda notificar: {"nota": 800})
+
+    assert len(chamadas) == 1
+    assert saidas == [{"nota": 800}] * 5
+    assert coalescedor.em_andamento() == 0
+
+
+def test_excecao_do_lider_chega_aos_seguidores():
+    coalescedor = Coalescedor("teste")
+
+    def falhar(notificar):
+        raise ConnectionError("modelo fora do ar")
+
+    chamadas, saidas = simultaneas(coalescedor, 4, falhar)
+    assert len(chamadas) == 1
+    assert len(saidas) == 4
+    assert all(isinstance(saida, ConnectionError) for saida in saidas)
+    # A chave é liberada: a próxima chamada executa de novo
+    assert coalescedor.executar("chave", lambda notificar: "ok") == "ok"
+
+
+def test_atualizacoes_chegam_a_todos_os_ouvintes():
+    coalescedor = Coalescedor("teste")
+    recebidas = []
+    simultaneas(coalescedor, 3, lambda notificar: notificar("parcial") or "final", recebidas.append)
+
+    assert recebidas == ["parcial"] * 3
+
+
+def test_chave_estavel_ignora_ordem_das_chaves():
+    assert chave_estavel({"a": 1, "b": [2]}) == chave_estavel({"b": [2], "a": 1})
+    assert chave_estavel("tema", "alto") != chave_estavel("tema", "baixo")
@@ -0,0 +1,42 @@
+import multiprocessing
+from datetime import date
+
+import custos
+
+RESUMO = {
+    "total": {"chamadas": 2, "tokens_prompt": 100, "tokens_completion": 20, "custo_usd": 0.5},
+    "por_competencia": {"competency1": {"chamadas": 2, "tokens_prompt": 100, "tokens_completion": 20, "custo_usd": 0.5}},
+}
+PROCESSOS = 4
+REDACOES_POR_PROCESSO = 25
+
+
+def consolidar_varias(caminho):
+    for _ in range(REDACOES_POR_PROCESSO):
+        custos.consolidar_dia(RESUMO, date(2026, 1, 5), caminho)
+
+
+def test_consolidar_dia_soma_o_resumo(tmp_path):
+    caminho = str(tmp_path / "uso.json")
+    custos.consolidar_dia(RESUMO, date(2026, 1, 5), caminho)
+    custos.consolidar_dia(RESUMO, date(2026, 1, 5), caminho)
+
+    dia = custos.carregar_consolidado(caminho)["2026-01-05"]
+    assert dia["redacoes"] == 2
+    assert dia["chamadas"] == 4
+    assert dia["por_competencia"]["competency1"]["tokens_prompt"] == 200
+
+
+def test_processos_simultaneos_nao_perdem_redacoes(tmp_path):
+    caminho = str(tmp_path / "uso.json")
+    processos = [multiprocessing.get_context("fork").Process(target=consolidar_varias, args=(caminho,))
+                 for _ in range(PROCESSOS)]
+    for processo in processos:
+        processo.start()
+    for processo in processos:
+        processo.join(60)
+        assert processo.exitcode == 0
+
+    dia = custos.carregar_consolidado(caminho)["2026-01-05"]
+    assert dia["redacoes"] == PROCESSOS * REDACOES_POR_PROCESSO
+    assert dia["chamadas"] == 2 * PROCESSOS * REDACOES_POR_PROCESSO
@@ -0,0 +1,25 @@
+from indice_texto import IndiceTexto
+
+TEXTO = "A sociedade precisa agir. O governo precisa agir também."
+
+
+def test_trecho_exato_por_token():
+    local = IndiceTexto(TEXTO).localizar("governo precisa")
+    assert local.exata and TEXTO[local.inicio:local.fim] == "governo precisa" and local.sentenca == 1
+
+
+def test_trecho_que_comeca_no_meio_da_palavra():
+    local = IndiceTexto(TEXTO).localizar("ciedade precisa")
+    assert local.exata
+    assert (local.inicio, local.fim) == (TEXTO.index("ciedade"), TEXTO.index("ciedade") + len("ciedade precisa"))
+
+
+def test_ocorrencias_repetidas_sao_reservadas_em_ordem():
+    indice = IndiceTexto(TEXTO)
+    primeira, segunda = indice.localizar("precisa agir"), indice.localizar("precisa agir")
+    assert primeira.sentenca == 0 and segunda.sentenca == 1
+
+
+def test_trecho_aproximado_cai_no_alinhamento():
+    local = IndiceTexto(TEXTO).localizar("o governo precisam agir")
+    assert local is not None and not local.exata and local.sentenca == 1
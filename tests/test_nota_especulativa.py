@@ -0,0 +1,76 @@
+import multiprocessing
+
+import analysis_function as af
+import nota_especulativa
+
+
+def erro_coesao():
+    return {"trecho": "Além disso, porém", "descrição": "Conectivos em conflito",
+            "explicação": "Os conectivos indicam relações lógicas opostas.", "sugestão": "Além disso"}
+
+
+def faixa_com(detectados, confirmados=None):
+    especulacao = nota_especulativa.Especulacao(["competency4"])
+    especulacao.deteccao_concluida("competency4", detectados, confirmados)
+    return especulacao, especulacao.faixa("competency4")
+
+
+def test_faixa_acompanha_numero_de_erros():
+    provaveis = [faixa_com([erro_coesao() for _ in range(n)])[1]["provavel"] for n in (0, 1, 3, 5, 8)]
+    assert provaveis == [200, 160, 120, 80, 0]
+
+
+def test_revisao_rejeitada_sobe_a_faixa():
+    detectados = [erro_coesao() for _ in range(3)]
+    especulacao, inicial = faixa_com(detectados)
+    assert inicial == {"minimo": 80, "provavel": 120, "maximo": 200, "provisoria": True}
+    for erro in list(detectados):
+        especulacao.revisao_concluida("competency4", erro, confirmado=False)
+    assert especulacao.faixa("competency4")["provavel"] == 200
+
+
+def test_nota_final_fecha_a_faixa(tmp_path, monkeypatch):
+    monkeypatch.setattr(nota_especulativa, "ARQUIVO_PLACAR", str(tmp_path / "especulacao.json"))
+    especulacao, _ = faixa_com([erro_coesao()])
+    especulacao.nota_concluida("competency4", 160)
+    assert especulacao.faixa("competency4") == {"minimo": 160, "provavel": 160, "maximo": 160, "provisoria": False}
+
+
+def erro_concordancia():
+    return {"trecho": "os aluno", "descrição": "Erro de concordância nominal",
+            "explicação": "O substantivo deve concordar com o artigo plural.", "sugestão": "os alunos"}
+
+
+def test_contagem_competency1_le_explicacao_e_descricao():
+    sem_explicacao = {"trecho": "x", "descrição": "Erro de pontuação"}
+    contagem = af.contar_erros_competency1([erro_concordancia(), sem_explicacao])
+    assert contagem["concordancia"] == 1
+    assert contagem["pontuacao"] == 1
+
+
+def test_faixa_competency1_acompanha_numero_de_erros():
+    regras = {"competency1": lambda erros: af.calcular_nota_base_competency1(af.contar_erros_competency1(erros))}
+    provaveis = []
+    for quantidade in (0, 4, 9, 13, 16):
+        especulacao = nota_especulativa.Especulacao(["competency1"], regras=regras)
+        especulacao.deteccao_concluida("competency1", [erro_concordancia() for _ in range(quantidade)])
+        provaveis.append(especulacao.faixa("competency1")["provavel"])
+    assert provaveis == [200, 160, 80, 40, 0]
+
+
+def registrar_varios(caminho, quantidade):
+    for _ in range(quantidade):
+        nota_especulativa.registrar_acerto("competency2", 160, 160, caminho)
+
+
+def test_placar_nao_perde_acertos_entre_processos(tmp_path):
+    caminho = str(tmp_path / "especulacao.json")
+    contexto = multiprocessing.get_context("fork")
+    processos = [contexto.Process(target=registrar_varios, args=(caminho, 25)) for _ in range(4)]
+    for processo in processos:
+        processo.start()
+    for processo in processos:
+        processo.join(60)
+
+    assert nota_especulativa.carregar_placar(caminho)["competency2"] == {"especulacoes": 100, "exatas": 100,
+                                                                        "uma_faixa": 100}
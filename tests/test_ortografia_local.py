@@ -0,0 +1,51 @@
+import pytest
+
+import ortografia_local
+
+PALAVRAS = ["o", "é", "um", "país", "pais", "grande", "Brasil", "São", "Paulo", "ele", "sabia", "sábia",
+            "a", "análise", "analise", "critica", "crítica", "fazê", "lo", "casa"]
+
+
+@pytest.fixture
+def verificador(tmp_path):
+    lista = tmp_path / "palavras.txt"
+    lista.write_text("\n".join(PALAVRAS), encoding="utf-8")
+    destino = str(tmp_path / "lexico.txt")
+    ortografia_local.construir_lexico(str(lista), destino)
+    lexico = ortografia_local.LexicoMapeado(destino)
+    yield ortografia_local.VerificadorOrtografia(lexico)
+    lexico.fechar()
+
+
+def test_formas_flexionadas_nao_viram_erro_de_acentuacao(verificador):
+    resultado = verificador.verificar("Ele sabia a critica. A analise é grande.")
+    assert resultado.erros == [] and resultado.ambiguas == []
+
+
+def test_nome_proprio_em_minuscula(verificador):
+    resultado = verificador.verificar("O brasil é um país grande.")
+    assert [(e["trecho"], e["sugestão"]) for e in resultado.erros] == [("brasil", "Brasil")]
+
+
+def test_inicio_de_sentenca_em_minuscula(verificador):
+    resultado = verificador.verificar("O Brasil é grande. ele sabia.")
+    assert [(e["trecho"], e["sugestão"]) for e in resultado.erros] == [("ele", "Ele")]
+
+
+def test_acentuacao_mantem_maiuscula_do_lexico(verificador):
+    resultado = verificador.verificar("Ele sabia: sao Paulo é grande.")
+    assert [(e["trecho"], e["sugestão"]) for e in resultado.erros] == [("sao", "São")]
+    assert "Erro de acentuação" in resultado.erros[0]["descrição"]
+
+
+def test_desconhecida_fica_ambigua(verificador):
+    resultado = verificador.verificar("O pais é grande, vc sabia? Fazê-lo é grande.")
+    assert resultado.erros == []
+    assert [p for p, _, _ in resultado.ambiguas] == ["vc"]
+
+
+def test_lista_com_afixos_do_hunspell_e_recusada(tmp_path):
+    lista = tmp_path / "pt_BR.dic"
+    lista.write_text("2\nanalisar/XYZ\ncasa/B\n", encoding="utf-8")
+    with pytest.raises(ValueError, match="unmunch"):
+        ortografia_local.construir_lexico(str(lista), str(tmp_path / "lexico.txt"))
@@ -0,0 +1,112 @@
+import json
+import time
+
+from persistencia import EscritorMemoria, FilaPersistencia
+
+
+def ler_spool(caminho):
+    try:
+        with open(caminho, encoding="utf-8") as arquivo:
+            return [json.loads(linha) for linha in arquivo]
+    except FileNotFoundError:
+        return []
+
+
+def aguardar(condicao, timeout=5.0):
+    limite = time.monotonic() + timeout
+    while not condicao():
+        assert time.monotonic() < limite, "condição não atingida"
+        time.sleep(0.02)
+
+
+def anotar(caminho, registros):
+    with open(caminho, "w", encoding="utf-8") as arquivo:
+        for registro in registros:
+            arquivo.write(json.dumps(registro) + "\n")
+
+
+def test_confirmacao_grava_em_todos_os_destinos(tmp_path):
+    spool = str(tmp_path / "spool.jsonl")
+    es, supabase = EscritorMemoria("es"), EscritorMemoria("supabase")
+    fila = FilaPersistencia([es, supabase], spool, intervalo_s=0.05)
+    ids = [fila.enfileirar({"redacao_texto": f"texto {i}"}) for i in range(3)]
+
+    assert fila.esvaziar(timeout=5)
+    fila.encerrar()
+    assert [doc["id"] for doc in es.documentos] == ids
+    assert [doc["id"] for doc in supabase.documentos] == ids
+    assert ler_spool(spool) == []
+
+
+def test_spool_reenfileira_o_que_nao_foi_confirmado(tmp_path):
+    spool = str(tmp_path / "spool.jsonl")
+    documentos = [{"id": f"d{i}", "redacao_texto": f"texto {i}"} for i in range(3)]
+    anotar(spool, [{"op": "pendente", "escritor": "es", "id": doc["id"], "documento": doc} for doc in documentos]
+           + [{"op": "confirmado", "escritor": "es", "id": "d1"}])
+    with open(spool, "a", encoding="utf-8") as arquivo:
+        arquivo.write('{"op": "confirm')  # linha truncada por queda do processo
+
+    es = EscritorMemoria("es")
+    fila = FilaPersistencia([es], spool, intervalo_s=0.05)
+    assert fila.esvaziar(timeout=5)
+    fila.encerrar()
+    assert sorted(doc["id"] for doc in es.documentos) == ["d0", "d2"]
+    assert ler_spool(spool) == []
+
+
+def test_falha_reagenda_com_backoff(tmp_path):
+    spool = str(tmp_path / "spool.jsonl")
+    es = EscritorMemoria("es", falhas=1)
+    fila = FilaPersistencia([es], spool, intervalo_s=0.05)
+    inicio = time.monotonic()
+    id_doc = fila.enfileirar({"redacao_texto": "texto"})
+
+    aguardar(lambda: es.falhas == 0)
+    assert fila.pendentes() == 1
+    assert fila._proxima_tentativa["es"] > time.monotonic()
+    assert fila.esvaziar(timeout=5)
+    fila.encerrar()
+    assert time.monotonic() - inicio >= 1.0
+    assert [doc["id"] for doc in es.documentos] == [id_doc]
+    assert es.lotes == 1
+
+
+def test_tentativas_esgotadas_ficam_no_spool(tmp_path):
+    spool = str(tmp_path / "spool.jsonl")
+    es = EscritorMemoria("es", falhas=1)
+    fila = FilaPersistencia([es], spool, intervalo_s=0.05, max_tentativas=1)
+    id_doc = fila.enfileirar({"redacao_texto": "texto"})
+
+    assert fila.esvaziar(timeout=5)
+    fila.encerrar()
+    assert es.documentos == []
+    assert [(r["op"], r["id"]) for r in ler_spool(spool)] == [("pendente", id_doc)]
+
+    recuperado = EscritorMemoria("es")
+    fila = FilaPersistencia([recuperado], spool, intervalo_s=0.05)
+    assert fila.esvaziar(timeout=5)
+    fila.encerrar()
+    assert [doc["id"] for doc in recuperado.documentos] == [id_doc]
+
+
+def test_fila_ociosa_compacta_o_spool(tmp_path):
+    spool = str(tmp_path / "spool.jsonl")
+    es = EscritorMemoria("es")
+    fila = FilaPersistencia([es], spool, intervalo_s=0.05)
+    fila.enfileirar({"redacao_texto": "texto"})
+
+    aguardar(lambda: es.documentos and ler_spool(spool) == [])
+    fila.encerrar()
+
+
+def test_spool_acima_do_limite_compacta_com_destino_fora_do_ar(tmp_path):
+    spool = str(tmp_path / "spool.jsonl")
+    es, supabase = EscritorMemoria("es"), EscritorMemoria("supabase", falhas=1000)
+    fila = FilaPersistencia([es, supabase], spool, intervalo_s=0.05, max_tentativas=1000, limite_spool_bytes=1)
+    id_doc = fila.enfileirar({"redacao_texto": "texto"})
+
+    # O supabase continua pendente em backoff (fila não ociosa); o limite de tamanho compacta mesmo assim
+    aguardar(lambda: [(r["op"], r["escritor"]) for r in ler_spool(spool)] == [("pendente", "supabase")])
+    assert [doc["id"] for doc in es.documentos] == [id_doc]
+    assert fila.pendentes() == 1
+    fila.encerrar(timeout=0.1)
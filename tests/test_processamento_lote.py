@@ -0,0 +1,74 @@
+import pytest
+from openai import OpenAI
+
+import analysis_function as af
+import processamento_lote
+from benchmark_correcao import CORPUS_REDACOES, TEMA_BENCHMARK, metricas_textuais
+from processamento_lote import BackendLote, ClienteLoteLocal
+from servidor_openai_mock import ConfiguracaoMock, ServidorOpenAIMock
+
+COMPETENCIAS = ["competency1", "competency2", "competency3", "competency4", "competency5"]
+
+
+@pytest.fixture
+def mock(monkeypatch):
+    monkeypatch.setattr(af, "competencies", {comp: "" for comp in COMPETENCIAS}, raising=False)
+    with ServidorOpenAIMock(ConfiguracaoMock(semente=7)) as servidor:
+        yield servidor
+
+
+def redacoes(quantidade):
+    return [{"texto": texto, "tema": TEMA_BENCHMARK, "cohmetrix": metricas_textuais(texto)}
+            for texto in CORPUS_REDACOES[:quantidade]]
+
+
+def backend(mock, empacotar=False):
+    cliente = OpenAI(base_url=mock.base_url, api_key="mock", max_retries=0)
+    lote = BackendLote(ClienteLoteLocal(cliente), intervalo_polling=0, empacotar=empacotar,
+                       recuperar_documentos=lambda consulta: [])
+    enviados = []
+    executar = lote.executar
+    lote.executar = lambda requisicoes: enviados.append(sorted(requisicoes)) or executar(requisicoes)
+    return lote, enviados
+
+
+def conferir(resultados, quantidade):
+    assert len(resultados) == quantidade
+    for resultado in resultados:
+        assert "erro" not in resultado
+        assert set(resultado["notas"]) == set(COMPETENCIAS)
+        assert resultado["nota_total"] == sum(resultado["notas"].values())
+
+
+def test_quatro_etapas_em_lote(mock):
+    lote, enviados = backend(mock)
+    resultados = lote.processar_redacoes(redacoes(3))
+
+    conferir(resultados, 3)
+    # Detecção, revisão, análise/notas e nota da Competência 1: um lote por etapa
+    assert len(enviados) == 4
+    assert all(cid.endswith(":competency1:nota") for cid in enviados[3])
+    assert len(enviados[3]) == 3
+
+
+def test_pacote_ilegivel_e_refeito_item_a_item(mock, monkeypatch):
+    desempacotar = processamento_lote._desempacotar_resposta
+    falhou = []
+
+    def desempacotar_falhando_uma_vez(conteudo, quantidade):
+        if not falhou:
+            falhou.append(quantidade)
+            return None
+        return desempacotar(conteudo, quantidade)
+
+    monkeypatch.setattr(processamento_lote, "_desempacotar_resposta", desempacotar_falhando_uma_vez)
+    lote, enviados = backend(mock, empacotar=True)
+    resultados = lote.processar_redacoes(redacoes(3))
+
+    conferir(resultados, 3)
+    assert falhou == [3]
+    assert any(cid.startswith("pacote:") for cid in enviados[0])
+    # O pacote que não pôde ser separado volta num lote à parte, um item por redação
+    refeitos = enviados[1]
+    assert len(refeitos) == 3 and not any(cid.startswith("pacote:") for cid in refeitos)
+    assert len({cid.split(":", 1)[1] for cid in refeitos}) == 1
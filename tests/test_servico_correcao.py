@@ -0,0 +1,95 @@
+import os
+import sqlite3
+import time
+
+import pytest
+from openai import OpenAI
+
+import armazem_resultados
+import benchmark_correcao
+import servico_correcao
+import tarefas_correcao
+from servidor_openai_mock import ConfiguracaoMock, ServidorOpenAIMock
+
+TEXTO = benchmark_correcao.CORPUS_REDACOES[0]
+TEMA = benchmark_correcao.TEMA_BENCHMARK
+QUESTOES = [{"texto": "Leia o poema e identifique o eu lírico.", "habilidades": ["H16"]}]
+
+
+def preparar():
+    """Inicializador do servidor e dos processos do pool: mock da OpenAI e armazéns num só diretório."""
+    cliente = OpenAI(base_url=os.environ["TESTE_MOCK_URL"], api_key="mock", max_retries=0)
+    benchmark_correcao.preparar_ambiente(cliente)
+    dados = os.environ["TESTE_DADOS"]
+    armazem_resultados.configurar(os.path.join(dados, "resultados.sqlite3"))
+    tarefas_correcao.configurar(os.path.join(dados, "tarefas.sqlite3"))
+
+
+@pytest.fixture(scope="module")
+def servico(tmp_path_factory):
+    dados = tmp_path_factory.mktemp("servico")
+    with ServidorOpenAIMock(ConfiguracaoMock(latencia_ms=20, semente=3)) as mock:
+        ambiente = {"TESTE_MOCK_URL": mock.base_url, "TESTE_DADOS": str(dados)}
+        anteriores = {chave: os.environ.get(chave) for chave in ambiente}
+        os.environ.update(ambiente)
+        try:
+            with servico_correcao.ServicoCorrecao(processos=2, inicializador="test_servico_correcao:preparar") as s:
+                yield s
+        finally:
+            for chave, valor in anteriores.items():
+                os.environ.pop(chave) if valor is None else os.environ.__setitem__(chave, valor)
+
+
+def aguardar(tarefa, timeout=60.0):
+    # O resultado do futuro sai antes do callback que monta o da tarefa
+    tarefa.futuro.result(timeout=timeout)
+    while tarefa.concluida_em is None:
+        time.sleep(0.01)
+    return tarefa
+
+
+def checkpoints_restantes():
+    with sqlite3.connect(os.path.join(os.environ["TESTE_DADOS"], "tarefas.sqlite3")) as conexao:
+        return conexao.execute("SELECT COUNT(*) FROM checkpoints").fetchone()[0]
+
+
+def test_materiais_iguais_simultaneos_compartilham_a_execucao(servico):
+    parametros = {"tema": "Poesia modernista", "questoes": QUESTOES}
+    primeira = servico.submeter("material_estudo", parametros)
+    segunda = servico.submeter("material_estudo", dict(parametros))
+
+    assert segunda.origem == primeira.id
+    for tarefa in (aguardar(primeira), aguardar(segunda)):
+        assert tarefa.erro is None
+        assert tarefa.resultado
+    assert segunda.resultado == primeira.resultado
+
+
+def test_correcoes_iguais_simultaneas_tem_resultado_por_aluno(servico):
+    primeira = servico.submeter("correcao", {"texto": TEXTO, "tema": TEMA, "user_id": "aluno1"})
+    segunda = servico.submeter("correcao", {"texto": TEXTO, "tema": TEMA, "user_id": "aluno2"})
+
+    assert segunda.origem == primeira.id
+    aguardar(primeira)
+    aguardar(segunda)
+    assert primeira.erro is None and segunda.erro is None
+    assert primeira.resultado["nota_total"] == segunda.resultado["nota_total"]
+    assert primeira.resultado["rastro"] and segunda.resultado["rastro"]
+    # Só a que executou consolida o uso; a outra é cópia exata enviada por outro aluno
+    assert not primeira.resultado.get("coalescida")
+    assert segunda.resultado["coalescida"]
+    assert segunda.resultado["duplicata"]["exata"]
+    assert segunda.resultado["duplicata"]["suspeita_copia"]
+    assert checkpoints_restantes() == 0
+
+
+def test_cliente_http_acompanha_a_tarefa(servico):
+    cliente = servico_correcao.ClienteServico([servico.base_url])
+    url = cliente.submeter("dicas_resolucao", {"questao": {"id": "q1", **QUESTOES[0]}})
+    estados = []
+    resultado = cliente.aguardar(url, ao_atualizar=estados.append, intervalo_s=0.05)
+
+    assert resultado
+    assert cliente.estado(url)["status"] == servico_correcao.CONCLUIDA
+    with pytest.raises(servico_correcao.ErroServico):
+        cliente.submeter("desconhecido", {})
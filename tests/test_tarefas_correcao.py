@@ -0,0 +1,74 @@
+import threading
+from collections import Counter
+
+import pytest
+from openai import OpenAI
+
+import analysis_function as af
+import benchmark_correcao
+import tarefas_correcao
+from servidor_openai_mock import ConfiguracaoMock, ServidorOpenAIMock
+
+TEXTO = benchmark_correcao.CORPUS_REDACOES[0]
+TEMA = benchmark_correcao.TEMA_BENCHMARK
+
+
+@pytest.fixture
+def armazem(tmp_path):
+    with ServidorOpenAIMock(ConfiguracaoMock(semente=5)) as mock:
+        benchmark_correcao.preparar_ambiente(OpenAI(base_url=mock.base_url, api_key="mock", max_retries=0))
+        yield tarefas_correcao.ArmazemTarefas(str(tmp_path / "tarefas.sqlite3"))
+
+
+class ModeloInstavel:
+    """Registra os prompts enviados ao modelo e, com `limite`, derruba as chamadas a partir dele."""
+
+    def __init__(self, requisitar, limite=None):
+        self.requisitar = requisitar
+        self.limite = limite
+        self.prompts = Counter()
+        self._trava = threading.Lock()
+
+    def __call__(self, modelo, prompt, temperature, etapa, **kwargs):
+        with self._trava:
+            if self.limite is not None and sum(self.prompts.values()) >= self.limite:
+                raise RuntimeError("rede caiu")
+            self.prompts[prompt] += 1
+        return self.requisitar(modelo, prompt, temperature, etapa, **kwargs)
+
+
+def test_execucao_retoma_dos_checkpoints_apos_falha(armazem, monkeypatch):
+    requisitar = af._requisitar_modelo
+    identificador = tarefas_correcao.id_tarefa(TEXTO, TEMA, "aluno")
+    armazem.criar(identificador, {"texto": TEXTO, "tema": TEMA, "user_id": "aluno"})
+
+    interrompida = ModeloInstavel(requisitar, limite=6)
+    monkeypatch.setattr(af, "_requisitar_modelo", interrompida)
+    tarefas_correcao.executar_tarefa(identificador, armazem)
+    tarefa = armazem.carregar(identificador)
+    assert tarefa["status"] == tarefas_correcao.FALHOU and "rede caiu" in tarefa["erro"]
+    assert sum(interrompida.prompts.values()) == 6
+
+    retomada = ModeloInstavel(requisitar)
+    monkeypatch.setattr(af, "_requisitar_modelo", retomada)
+    assert armazem.devolver(identificador)
+    tarefas_correcao.executar_tarefa(identificador, armazem)
+    tarefa = armazem.carregar(identificador)
+    assert tarefa["status"] == tarefas_correcao.CONCLUIDA and tarefa["resultado"]["nota_total"] is not None
+    # Nenhuma resposta já paga foi pedida de novo
+    assert not set(interrompida.prompts) & set(retomada.prompts)
+    assert armazem._conexao.execute("SELECT COUNT(*) FROM checkpoints").fetchone()[0] == 0
+
+
+def test_reivindicacao_e_lease(armazem):
+    armazem.criar("t", {"texto": TEXTO})
+    assert armazem.reivindicar("t", dono="a")
+    assert not armazem.reivindicar("t", dono="b")
+    assert not armazem.renovar_lease("t", dono="b")
+    # Lease vivo: a tarefa continua com o dono
+    assert not armazem.devolver("t") and armazem.interrompidas() == []
+
+    armazem.atualizar("t", lease_ate=0)
+    assert armazem.interrompidas() == ["t"]
+    assert armazem.devolver("t") and armazem.reivindicar("t", dono="b")
+    assert not armazem.renovar_lease("t", dono="a") and armazem.renovar_lease("t", dono="b")
@@ -1,6 +1,8 @@
 import json
 import logging
-from typing import Any, Dict, List
+import sqlite3
+import time
+from typing import Any, Dict, List, Optional
 
 # Verifique se o Streamlit está instalado antes de importar
 try:
@@ -10,6 +12,14 @@ try:
 except ModuleNotFoundError as e:
     raise RuntimeError("O módulo Streamlit não está instalado no ambiente. Certifique-se de que Streamlit esteja disponível antes de executar o código.")
 
+import orcamento_tokens
+import prompts
+import rastreamento
+import servico_correcao
+import tarefas_correcao
+from armazem_resultados import chave_redacao, obter_armazem
+from duplicatas import Duplicata
+
 # Configuração de logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("Trilha de Competências")
@@ -18,6 +28,9 @@ logger = logging.getLogger("Trilha de Competências")
 if 'trilha' not in st.session_state:
     st.session_state.trilha = {}
 
+# Intervalo entre consultas ao andamento da correção
+INTERVALO_ATUALIZACAO_S = 1.0
+
 COMPETENCIAS = {
     "competencia1": "Domínio da Norma Culta",
     "competencia2": "Compreensão do Tema",
@@ -55,26 +68,136 @@ def finalizar_competencia(competencia: str, progresso: Dict[str, any]):
     st.session_state.trilha[competencia] = progresso
     st.success(f"A competência {COMPETENCIAS[competencia]} foi concluída com sucesso!")
 
-def processar_redacao(competencia: str, texto_redacao: str) -> List[str]:
-    """Chama a função de análise correspondente para processar a redação."""
+def buscar_resultado_local(texto_redacao: str, tema: str) -> Optional[Dict[str, Any]]:
+    """Busca a correção já feita desta redação e repõe os resultados no estado da sessão."""
     try:
-        from analysis_function import processar_redacao_completa
-        resultados = processar_redacao_completa(texto_redacao, competencia)
-        return resultados.get('erros', [])
-    except ImportError as e:
-        st.error("Erro ao importar a função de análise. Verifique se o arquivo 'analysis_function.py' está correto.")
-        logger.error(f"Erro ao importar função de análise: {e}")
-        return []
+        encontrado = obter_armazem().buscar_com_autor(texto_redacao, tema)
+    except sqlite3.Error as e:
+        logger.error(f"Erro ao consultar resultados locais: {e}")
+        return None
+    if encontrado is None:
+        return None
+    resultados, autor = encontrado
+    if not prompts.mesma_versao(resultados):
+        logger.info("Resultado local gerado com outra versão dos prompts; pipeline executado de novo")
+        return None
+    logger.info("Resultado encontrado no armazém local; pipeline não executado")
+    # A mesma redação enviada por outro aluno é marcada como suspeita de cópia
+    duplicata = Duplicata(chave_redacao(texto_redacao, tema), 1.0, True, autor)
+    if duplicata.suspeita_copia(st.session_state.get('user_id')):
+        resultados['duplicata'] = duplicata.para_dict(st.session_state.get('user_id'))
+    st.session_state.analise_realizada = True
+    st.session_state.resultados = resultados
+    st.session_state.redacao_texto = texto_redacao
+    st.session_state.tema_redacao = tema
+    st.session_state.erros_especificos_todas_competencias = resultados.get('erros_especificos', {})
+    st.session_state.notas_atualizadas = dict(resultados.get('notas', {}))
+    return resultados
+
+def exibir_nota_provisoria(espaco, resumo: Dict[str, Any]):
+    """Mostra a faixa de nota enquanto as revisões terminam; a nota final substitui a provisória."""
+    total = resumo["total"]
+    if not total["provisoria"]:
+        espaco.success(f"Nota final: {total['provavel']}")
+        return
+    provavel = f" (provável: {total['provavel']})" if total["provavel"] is not None else ""
+    linhas = [f"**Nota provisória:** entre {total['minimo']} e {total['maximo']}{provavel}",
+              "_Estimativa pelas regras de correção; refinada à medida que as revisões confirmam ou descartam erros._"]
+    for comp, faixa in resumo["competencias"].items():
+        if faixa["provavel"] is not None:
+            marcador = "provisória" if faixa["provisoria"] else "final"
+            linhas.append(f"- {comp}: {faixa['minimo']}–{faixa['maximo']} ({marcador})")
+    espaco.info("\n".join(linhas))
+
+def iniciar_correcao(competencia: str, texto_redacao: str) -> Dict[str, Any]:
+    """
+    Inicia a correção em segundo plano e guarda a tarefa na sessão.
+
+    Redações já corrigidas com o mesmo tema são lidas do armazém local; as demais
+    vão à fila de tarefas (tarefas_correcao) ou, com SERVICO_CORRECAO_URL definida,
+    ao servico_correcao. Um novo clique na mesma redação acompanha a tarefa que
+    já está na sessão em vez de iniciar outra.
+    """
+    atual = st.session_state.get('correcao_trilha')
+    if (atual and atual["texto"] == texto_redacao and atual["competencia"] == competencia
+            and atual["status"] != tarefas_correcao.FALHOU):
+        return atual
+
+    tarefa = {"texto": texto_redacao, "competencia": competencia, "status": tarefas_correcao.PENDENTE,
+              "progresso": None, "resultados": buscar_resultado_local(texto_redacao, competencia), "erro": None}
+    if tarefa["resultados"] is not None:
+        tarefa["status"] = tarefas_correcao.CONCLUIDA
+    else:
+        user_id = st.session_state.get('user_id')
+        cliente = servico_correcao.obter_cliente()
+        if cliente is not None:
+            tarefa["url"] = cliente.submeter("correcao", {"texto": texto_redacao, "tema": competencia,
+                                                          "user_id": user_id}, chave=texto_redacao)
+        else:
+            tarefa["id"] = tarefas_correcao.obter_fila().submeter(texto_redacao, competencia, user_id)
+    st.session_state.correcao_trilha = tarefa
+    return tarefa
+
+def consultar_correcao(tarefa: Dict[str, Any]) -> Dict[str, Any]:
+    """Atualiza status, nota provisória e resultados da tarefa; ao concluir, publica os resultados na sessão."""
+    if tarefa["status"] in (tarefas_correcao.CONCLUIDA, tarefas_correcao.FALHOU):
+        return tarefa
+    if "url" in tarefa:
+        cliente = servico_correcao.obter_cliente()
+        estado = cliente.estado(tarefa["url"])
+        tarefa["progresso"] = estado.get("nota_provisoria")
+        if estado["status"] == servico_correcao.CONCLUIDA:
+            tarefa["resultados"] = cliente.resultado(tarefa["url"])
+    else:
+        estado = tarefas_correcao.obter_fila().estado(tarefa["id"])
+        tarefa["progresso"] = estado["progresso"]
+        tarefa["resultados"] = estado["resultado"]
+    tarefa["erro"] = estado.get("erro")
+    tarefa["status"] = estado["status"]
+    if tarefa["status"] == tarefas_correcao.CONCLUIDA:
+        from analysis_function import guardar_na_sessao
+        linhas_rastro = tarefa["resultados"].pop("rastro", None)
+        rastro = rastreamento.de_linhas(linhas_rastro) if linhas_rastro else None
+        guardar_na_sessao(tarefa["texto"], tarefa["competencia"], tarefa["resultados"], rastro)
+    return tarefa
+
+def exibir_correcao(tarefa: Dict[str, Any]):
+    """Mostra o andamento da correção (a página se atualiza sozinha) e, ao final, a trilha da competência."""
+    try:
+        tarefa = consultar_correcao(tarefa)
     except Exception as e:
-        st.error("Erro ao processar a redação. Tente novamente.")
-        logger.error(f"Erro ao processar redação: {e}")
-        return []
+        st.error("Erro ao consultar a correção. Tente novamente.")
+        logger.error(f"Erro ao consultar correção: {e}")
+        return
+    if tarefa["status"] == tarefas_correcao.FALHOU:
+        st.error("Erro ao processar a redação. Clique em Iniciar Análise para retomar a correção.")
+        logger.error(f"Erro ao processar redação: {tarefa['erro']}")
+        return
+    if tarefa["status"] != tarefas_correcao.CONCLUIDA:
+        if tarefa["progresso"]:
+            exibir_nota_provisoria(st.empty(), tarefa["progresso"])
+        st.info("Correção em andamento. Você pode continuar usando a página; ela se atualiza sozinha.")
+        time.sleep(INTERVALO_ATUALIZACAO_S)
+        st.rerun()
+        return
+
+    resultados = tarefa["resultados"]
+    competencia = tarefa["competencia"]
+    apresentar_competencia(competencia)
+    if resultados.get('truncamentos'):
+        secoes = sorted({reducao['secao'] for reducao in resultados['truncamentos']})
+        st.warning(f"Texto muito longo: partes ({', '.join(secoes)}) foram resumidas nos prompts da correção.")
+    erros_detectados = resultados.get('erros', [])
+    identificar_agrupamento_erros(competencia, erros_detectados)
+    teoria_exercicios_personalizados(erros_detectados)
+    finalizar_competencia(competencia, {"erros": erros_detectados, "texto": tarefa["texto"]})
 
 def trilha_de_competencias():
     """Interface principal para trilha de competências."""
     st.title("Trilha de Competências ENEM")
 
-    texto_redacao = st.text_area("Digite a redação para análise:", height=300)
+    texto_redacao = st.text_area("Digite a redação para análise:", height=300,
+                                 max_chars=orcamento_tokens.MAX_CARACTERES_REDACAO)
 
     if not texto_redacao.strip():
         st.warning("Por favor, insira o texto da redação para começar.")
@@ -82,13 +205,26 @@ def trilha_de_competencias():
 
     competencia_selecionada = st.selectbox("Escolha a competência para análise:", options=list(COMPETENCIAS.keys()), format_func=lambda x: COMPETENCIAS[x])
 
+    if st.sidebar.checkbox("Modo depuração") and st.session_state.get('ultimo_rastro'):
+        painel_depuracao()
+
     if st.button("Iniciar Análise"):
-        apresentar_competencia(competencia_selecionada)
-        erros_detectados = processar_redacao(competencia_selecionada, texto_redacao)
-        identificar_agrupamento_erros(competencia_selecionada, erros_detectados)
-        teoria_exercicios_personalizados(erros_detectados)
-        progresso = {"erros": erros_detectados, "texto": texto_redacao}
-        finalizar_competencia(competencia_selecionada, progresso)
+        try:
+            iniciar_correcao(competencia_selecionada, texto_redacao)
+        except Exception as e:
+            st.error("Erro ao iniciar a correção. Tente novamente.")
+            logger.error(f"Erro ao iniciar correção: {e}")
+
+    # A correção roda fora da thread do script: reruns não a interrompem
+    tarefa = st.session_state.get('correcao_trilha')
+    if tarefa and tarefa["texto"] == texto_redacao:
+        exibir_correcao(tarefa)
+
+def painel_depuracao():
+    """Mostra o waterfall de latência e tokens da última redação processada."""
+    from rastreamento import renderizar_painel_depuracao
+    with st.expander("🔍 Depuração: tempo e tokens por etapa", expanded=True):
+        renderizar_painel_depuracao(st.session_state.ultimo_rastro)
 
 if __name__ == "__main__":
     trilha_de_competencias()